@@ -1,47 +1,112 @@
-from typing import List, Dict, Any
+import hashlib
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Any, List
+
+
+def _choices_text(resp: Dict[str, Any]):
+    # Groq/OpenAI format
+    choice = resp['choices'][0]
+    if 'message' in choice:
+        return choice['message'].get('content', '')
+    return choice.get('text')
+
+
+def _candidates_text(resp: Dict[str, Any]):
+    # Gemini format
+    parts = resp['candidates'][0].get('content', {}).get('parts')
+    return parts[0].get('text', '') if parts else None
+
+
+def _output_text(resp: Dict[str, Any]):
+    # Fallback for other formats
+    output = resp['output']
+    return "\n".join(map(str, output)) if isinstance(output, list) else str(output)
+
+
+# (top-level key, extractor, needs a non-empty value) tried in order; the
+# first match wins. Any present output counts, even a falsy one like 0 or ""
+_EXTRACTORS = (
+    ("choices", _choices_text, True),
+    ("candidates", _candidates_text, True),
+    ("output", _output_text, False),
+)
 
 
 class Agent:
-    def __init__(self, llm_client, system_prompt: str = None):
+    # Number of memory lines kept and included in the prompt
+    HISTORY_WINDOW = 10
+
+    def __init__(self, llm_client, system_prompt: str = None, cache_size: int = 1024, disable_cache: bool = False):
         self.llm = llm_client
-        self.memory: List[str] = []
+        # LRU cache of raw LLM responses keyed by prompt hash; disable for sampled (temperature > 0) runs
+        self.cache_size = cache_size
+        self.disable_cache = disable_cache
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.memory: Deque[str] = deque(maxlen=self.HISTORY_WINDOW)
         self.system_prompt = system_prompt or "You are a helpful agent."
+        self._prefix = f"{self.system_prompt}\n\nConversation History:\n"
+        self._history_joined = ""  # "\n".join(self.memory), kept current by _remember
+
+    def _remember(self, line: str):
+        """Append a line to memory and update the joined history window."""
+        rotating = len(self.memory) == self.memory.maxlen
+        self.memory.append(line)  # deque evicts the oldest line once full
+        if rotating:
+            self._history_joined = "\n".join(self.memory)
+        else:
+            # Window hasn't rotated yet, so the joined string just grows
+            self._history_joined = f"{self._history_joined}\n{line}" if len(self.memory) > 1 else line
 
     def _build_prompt(self, user_input: str) -> str:
-        history = "\n".join(self.memory[-10:])
-        return f"{self.system_prompt}\n\nConversation History:\n{history}\n\nUser: {user_input}\nAgent:"
+        return f"{self._prefix}{self._history_joined}\n\nUser: {user_input}\nAgent:"
+
+    def _build_messages(self, user_input: str) -> List[Dict[str, str]]:
+        """
+        Chat-format version of the prompt.
+
+        The system prompt is sent byte-identical on every call as its own
+        message so provider prefix caching can reuse it; history and the new
+        user turn follow in the user message.
+        """
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": f"Conversation History:\n{self._history_joined}\n\nUser: {user_input}"}
+        ]
+
+    def _generate(self, prompt: str, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        """Call the LLM, reusing the cached response for an identical prompt."""
+        if self.disable_cache:
+            return self.llm.generate(prompt, messages=messages)
+
+        key = hashlib.sha256(prompt.encode()).hexdigest()
+        resp = self._cache.get(key)
+        if resp is not None:
+            self._cache.move_to_end(key)
+            return resp
+
+        resp = self.llm.generate(prompt, messages=messages)
+        self._cache[key] = resp
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return resp
 
     def step(self, user_input: str) -> Dict[str, Any]:
         prompt = self._build_prompt(user_input)
-        resp = self.llm.generate(prompt)
+        resp = self._generate(prompt, self._build_messages(user_input))
         
         # Normalize response extraction for different providers
         text = None
         if isinstance(resp, dict):
-            # Groq/OpenAI format
-            if 'choices' in resp and resp['choices']:
-                choice = resp['choices'][0]
-                if 'message' in choice:
-                    text = choice['message'].get('content', '')
-                elif 'text' in choice:
-                    text = choice['text']
-            # Gemini format
-            elif 'candidates' in resp and resp['candidates']:
-                candidate = resp['candidates'][0]
-                if 'content' in candidate:
-                    content = candidate['content']
-                    if 'parts' in content and content['parts']:
-                        text = content['parts'][0].get('text', '')
-            # Fallback for other formats
-            elif 'output' in resp:
-                output = resp.get('output')
-                text = str(output) if not isinstance(output, list) else "\n".join(map(str, output))
+            for key, extract, non_empty in _EXTRACTORS:
+                if key in resp and (resp[key] or not non_empty):
+                    text = extract(resp)
+                    break
         
         if text is None:
             text = str(resp)
 
         # Save to memory
-        self.memory.append(f"User: {user_input}")
-        self.memory.append(f"Agent: {text}")
+        self._remember(f"User: {user_input}")
+        self._remember(f"Agent: {text}")
 
         return {"text": text, "raw": resp}
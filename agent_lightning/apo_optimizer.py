@@ -3,11 +3,64 @@ APO (Automatic Prompt Optimization) implementation for Agent-Lightning.
 Uses evolutionary algorithms and Monte Carlo Tree Search to optimize prompts.
 """
 import json
+import os
 import random
-from typing import List, Dict, Any, Tuple
+import re
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Tuple, Callable, Optional
 from pathlib import Path
 import numpy as np
 
+from instrumentation.reward_functions import compute_combined_reward
+from llm_clients import extract_text
+
+
+# Matches "[index] answer" segments in a batch-prompted response
+_BATCH_ANSWER_RE = re.compile(r"\[(\d+)\]\s*(.*?)(?=\n\[|\Z)", re.S)
+
+# Lines appended by the add_constraint / add_example mutations
+_CONSTRAINT_LINES = [
+    "- Keep response under 150 words",
+    "- Always validate user emotions first",
+    "- Never use medical terminology",
+    "- Prioritize actionable advice"
+]
+_EXAMPLE_LINES = [
+    "Example: 'I understand that feels overwhelming...'",
+    "Good response: 'Let's take this one step at a time...'",
+    "Template: '[Validate] + [Normalize] + [Suggest]'"
+]
+
+# Empathy keywords that boost simulated rewards
+_EMPATHY_HINT_RE = re.compile("validate|understand", re.IGNORECASE)
+
+
+def _default_reward(text: str, trace: Dict[str, Any]) -> float:
+    """Score a re-generated response with the standard combined reward."""
+    return compute_combined_reward({
+        "response": {"choices": [{"message": {"content": text}}]},
+        "latency_ms": trace.get("latency_ms", 0),
+        "metadata": trace.get("metadata", {})
+    })
+
+
+def _eval_variant(content: str, base_rewards: np.ndarray, seed: int) -> np.ndarray:
+    """
+    Simulated rewards for one variant (pure function, safe to run in a worker process).
+    
+    Uses existing trace rewards as baseline and adds synthetic
+    variance based on prompt quality heuristics.
+    """
+    rng = np.random.default_rng(seed)
+    
+    # Heuristic: variants with more empathy keywords might score higher
+    empathy_boost = 0.05 if _EMPATHY_HINT_RE.search(content) else 0.0
+    
+    # Add noise (one vectorized draw for all traces)
+    noise = rng.normal(0.0, 0.1, base_rewards.shape[0])
+    return np.clip(base_rewards + empathy_boost + noise, 0.0, 1.0)
+
 
 class PromptVariant:
     """Represents a variant of a prompt with metadata."""
@@ -16,15 +69,33 @@ class PromptVariant:
         self.prompt_id = prompt_id
         self.content = content
         self.parent_id = parent_id
-        self.performance_scores = []
         self.avg_reward = 0.0
         self.num_evaluations = 0
+        self._sum = 0.0  # Running total so the average is O(1) per evaluation
+        self._scores = np.empty(0, dtype=np.float32)  # Score buffer; first num_evaluations slots are filled
+    
+    @property
+    def performance_scores(self) -> np.ndarray:
+        """All rewards recorded so far."""
+        return self._scores[:self.num_evaluations]
+    
+    def preallocate(self, n: int):
+        """Reserve room for n more evaluations so add_evaluation never reallocates."""
+        needed = self.num_evaluations + n
+        if needed > self._scores.shape[0]:
+            scores = np.empty(needed, dtype=np.float32)
+            scores[:self.num_evaluations] = self.performance_scores
+            self._scores = scores
     
     def add_evaluation(self, reward: float):
         """Add a performance evaluation."""
-        self.performance_scores.append(reward)
-        self.num_evaluations = len(self.performance_scores)
-        self.avg_reward = np.mean(self.performance_scores)
+        if self.num_evaluations == self._scores.shape[0]:
+            # Not preallocated: grow geometrically
+            self.preallocate(max(self.num_evaluations, 8))
+        self._scores[self.num_evaluations] = reward
+        self._sum += reward
+        self.num_evaluations += 1
+        self.avg_reward = self._sum / self.num_evaluations
     
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -33,7 +104,7 @@ class PromptVariant:
             "parent_id": self.parent_id,
             "avg_reward": self.avg_reward,
             "num_evaluations": self.num_evaluations,
-            "scores": self.performance_scores
+            "scores": self.performance_scores.tolist()
         }
 
 
@@ -56,13 +127,29 @@ class APOOptimizer:
         mutation_strategies: List[str] = None,
         population_size: int = 10,
         num_generations: int = 5,
-        mutation_rate: float = 0.3
+        mutation_rate: float = 0.3,
+        llm_client=None,
+        reward_fn: Optional[Callable[[str, Dict[str, Any]], float]] = None,
+        eval_max_tokens: int = 300,
+        eval_batch_size: int = 10,
+        n_jobs: int = 1,
+        seed: Optional[int] = None
     ):
         self.baseline_prompt = baseline_prompt
         self.population_size = population_size
         self.num_generations = num_generations
         self.mutation_rate = mutation_rate
         
+        # Optional LLM for re-running variants on trace inputs
+        self.llm = llm_client
+        self.reward_fn = reward_fn or _default_reward
+        self.eval_max_tokens = eval_max_tokens
+        self.eval_batch_size = eval_batch_size  # Trace inputs per batch-prompted call
+        
+        # Worker processes for simulated evaluation (-1 = all cores)
+        self.n_jobs = (os.cpu_count() or 1) if n_jobs == -1 else n_jobs
+        self._rng = np.random.default_rng(seed)  # Trace sampling
+        
         # Mutation strategies
         self.mutation_strategies = mutation_strategies or [
             "add_emphasis",
@@ -72,6 +159,15 @@ class APOOptimizer:
             "simplify"
         ]
         
+        # Strategy name -> line-list mutation
+        self._strategy_fns = {
+            "add_emphasis": self._s_emphasis,
+            "add_constraint": self._s_constraint,
+            "reorder_instructions": self._s_reorder,
+            "add_example": self._s_example,
+            "simplify": self._s_simplify
+        }
+        
         # Population tracking
         self.population: List[PromptVariant] = []
         self.generation = 0
@@ -84,9 +180,11 @@ class APOOptimizer:
         self.population.append(baseline)
         
         # Generate initial variants
-        for i in range(self.population_size - 1):
+        baseline_lines = self.baseline_prompt.split("\n")
+        strategies = random.choices(self.mutation_strategies, k=max(self.population_size - 1, 0))
+        for i, strategy in enumerate(strategies):
             variant_id = f"gen0_variant{i}"
-            variant_content = self._mutate_prompt(self.baseline_prompt, strategy=random.choice(self.mutation_strategies))
+            variant_content = "\n".join(self._mutate_lines(baseline_lines, strategy))
             variant = PromptVariant(variant_id, variant_content, parent_id="baseline_v0")
             self.population.append(variant)
     
@@ -97,101 +195,188 @@ class APOOptimizer:
         In production, this would use LLM-based rewriting or template-based changes.
         For now, using rule-based mutations.
         """
-        if strategy == "add_emphasis":
-            # Add emphasis markers
-            lines = prompt.split("\n")
-            if len(lines) > 3:
-                lines[random.randint(0, len(lines)-1)] = "**IMPORTANT**: " + lines[random.randint(0, len(lines)-1)]
-            return "\n".join(lines)
-        
-        elif strategy == "add_constraint":
-            # Add new constraint
-            constraints = [
-                "\n- Keep response under 150 words",
-                "\n- Always validate user emotions first",
-                "\n- Never use medical terminology",
-                "\n- Prioritize actionable advice"
-            ]
-            return prompt + random.choice(constraints)
-        
-        elif strategy == "reorder_instructions":
-            # Shuffle instruction order
-            lines = prompt.split("\n")
-            if len(lines) > 4:
-                # Shuffle middle lines (keep header/footer)
-                middle = lines[2:-2]
-                random.shuffle(middle)
-                lines[2:-2] = middle
-            return "\n".join(lines)
+        return "\n".join(self._mutate_lines(prompt.split("\n"), strategy))
+    
+    def _mutate_lines(self, lines: List[str], strategy: str) -> List[str]:
+        """Apply a mutation strategy to an already-split prompt; never modifies `lines`."""
+        mutate = self._strategy_fns.get(strategy)
+        if mutate is None:
+            return list(lines)  # Fallback: no change
+        return mutate(lines)
+    
+    def _s_emphasis(self, lines: List[str]) -> List[str]:
+        # Add emphasis markers
+        lines = list(lines)
+        if len(lines) > 3:
+            i = random.randrange(len(lines))
+            lines[i] = "**IMPORTANT**: " + lines[i]
+        return lines
+    
+    def _s_constraint(self, lines: List[str]) -> List[str]:
+        # Add new constraint
+        return lines + [random.choice(_CONSTRAINT_LINES)]
+    
+    def _s_reorder(self, lines: List[str]) -> List[str]:
+        # Shuffle instruction order
+        lines = list(lines)
+        if len(lines) > 4:
+            # Shuffle middle lines (keep header/footer)
+            middle = lines[2:-2]
+            random.shuffle(middle)
+            lines[2:-2] = middle
+        return lines
+    
+    def _s_example(self, lines: List[str]) -> List[str]:
+        # Add example after a blank line
+        return lines + ["", random.choice(_EXAMPLE_LINES)]
+    
+    def _s_simplify(self, lines: List[str]) -> List[str]:
+        # Remove some instructions
+        lines = list(lines)
+        if len(lines) > 5:
+            lines.pop(random.randint(1, len(lines)-2))
+        return lines
+    
+    def _build_batched_eval_prompt(
+        self,
+        variant: PromptVariant,
+        traces_slice: List[Dict[str, Any]]
+    ) -> str:
+        """Pack several trace inputs into one prompt with [index] markers."""
+        inputs = "\n".join(
+            f"[{i}] {trace.get('prompt', '')}"
+            for i, trace in enumerate(traces_slice, start=1)
+        )
+        return (
+            f"{variant.content}\n\n"
+            f"Respond to each of the following {len(traces_slice)} inputs separately. "
+            f"Start each answer on a new line with its [index] marker.\n\n"
+            f"{inputs}"
+        )
+    
+    @staticmethod
+    def _parse_batched_response(text: str, n: int) -> List[str]:
+        """Split a batch-prompted response into n answers (missing ones are empty)."""
+        answers = [""] * n
+        for match in _BATCH_ANSWER_RE.finditer(text):
+            idx = int(match.group(1)) - 1
+            if 0 <= idx < n:
+                answers[idx] = match.group(2).strip()
+        return answers
+    
+    def _trace_chunks(self, traces: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Split traces into groups of eval_batch_size."""
+        b = self.eval_batch_size
+        return [traces[i:i + b] for i in range(0, len(traces), b)]
+    
+    def _collect_eval_prompts(
+        self,
+        variants: List[PromptVariant],
+        traces: List[Dict[str, Any]]
+    ) -> List[str]:
+        """Materialize every batched evaluation prompt, variant-major."""
+        chunks = self._trace_chunks(traces)
+        return [
+            self._build_batched_eval_prompt(variant, chunk)
+            for variant in variants
+            for chunk in chunks
+        ]
+    
+    def _simulate_rewards(self, sample_traces: List[Dict[str, Any]]) -> List[np.ndarray]:
+        """
+        Simulate rewards when no LLM client is configured.
         
-        elif strategy == "add_example":
-            # Add example
-            examples = [
-                "\n\nExample: 'I understand that feels overwhelming...'",
-                "\n\nGood response: 'Let's take this one step at a time...'",
-                "\n\nTemplate: '[Validate] + [Normalize] + [Suggest]'"
-            ]
-            return prompt + random.choice(examples)
+        Variants are independent, so with n_jobs > 1 they are evaluated in
+        parallel worker processes. Each variant is seeded from its id and the
+        generation, so results don't depend on n_jobs.
+        """
+        base_rewards = np.fromiter(
+            (trace.get("reward", 0.5) for trace in sample_traces),
+            np.float64,
+            len(sample_traces)
+        )
+        contents = [variant.content for variant in self.population]
+        seeds = [
+            zlib.crc32(f"{variant.prompt_id}:{self.generation}".encode())
+            for variant in self.population
+        ]
         
-        elif strategy == "simplify":
-            # Remove some instructions
-            lines = prompt.split("\n")
-            if len(lines) > 5:
-                lines.pop(random.randint(1, len(lines)-2))
-            return "\n".join(lines)
+        if self.n_jobs > 1 and len(self.population) > 1:
+            with ProcessPoolExecutor(max_workers=self.n_jobs) as pool:
+                return list(pool.map(_eval_variant, contents, [base_rewards] * len(contents), seeds))
         
-        return prompt  # Fallback: no change
+        return [
+            _eval_variant(content, base_rewards, seed)
+            for content, seed in zip(contents, seeds)
+        ]
     
     def evaluate_population(self, traces: List[Dict[str, Any]]):
         """
         Evaluate each variant against traces.
         
-        Simulates running each prompt on the inputs from traces
-        and comparing rewards.
+        With an LLM client, each variant answers eval_batch_size trace inputs
+        per generation, all of those prompts are submitted as a single batch,
+        and the parsed answers are scored with ``reward_fn``. Otherwise rewards
+        are simulated from the stored trace rewards.
         """
         print(f"\nEvaluating Generation {self.generation}...")
         
-        for variant in self.population:
-            # In production: re-run agent with this prompt on trace inputs
-            # For now: use existing trace rewards as baseline
-            # and add synthetic variance based on prompt quality heuristics
+        # Same sample for every variant so rewards are comparable
+        sample_idx = self._rng.choice(len(traces), min(len(traces), 20), replace=False)
+        sample_traces = [traces[i] for i in sample_idx]
+        
+        if self.llm is not None:
+            chunks = self._trace_chunks(sample_traces)
+            prompts = self._collect_eval_prompts(self.population, sample_traces)
+            responses = self.llm.generate_batch(
+                prompts,
+                max_tokens=self.eval_max_tokens * self.eval_batch_size
+            )
             
-            sample_traces = random.sample(traces, min(len(traces), 20))
+            answers = []
+            for response, chunk in zip(responses, chunks * len(self.population)):
+                answers.extend(self._parse_batched_response(extract_text(response), len(chunk)))
             
-            for trace in sample_traces:
-                # Simulate evaluation (in production, would re-run agent)
-                base_reward = trace.get("reward", 0.5)
-                
-                # Heuristic: variants with more empathy keywords might score higher
-                empathy_boost = 0.0
-                if "validate" in variant.content.lower() or "understand" in variant.content.lower():
-                    empathy_boost = 0.05
-                
-                # Add noise
-                noise = random.gauss(0, 0.1)
-                simulated_reward = max(0, min(1, base_reward + empathy_boost + noise))
-                
-                variant.add_evaluation(simulated_reward)
+            flat_rewards = [
+                self.reward_fn(answer, trace)
+                for answer, trace in zip(answers, sample_traces * len(self.population))
+            ]
+            rewards = np.array(flat_rewards).reshape(len(self.population), len(sample_traces))
+        else:
+            rewards = self._simulate_rewards(sample_traces)
+        
+        for variant, row in zip(self.population, rewards):
+            variant.preallocate(len(sample_traces))
+            for reward in row:
+                variant.add_evaluation(float(reward))
             
             print(f"  {variant.prompt_id}: avg_reward={variant.avg_reward:.3f} (n={variant.num_evaluations})")
     
     def select_best(self, top_k: int = 3) -> List[PromptVariant]:
         """Select top-k performing variants."""
-        sorted_pop = sorted(self.population, key=lambda v: v.avg_reward, reverse=True)
-        return sorted_pop[:top_k]
+        n = len(self.population)
+        rewards = np.fromiter((v.avg_reward for v in self.population), np.float64, n)
+        if top_k < n:
+            # O(n) partition, then sort only the k winners
+            idx = np.argpartition(-rewards, top_k)[:top_k]
+        else:
+            idx = np.arange(n)
+        idx = idx[np.argsort(-rewards[idx], kind="stable")]
+        return [self.population[i] for i in idx]
     
     def evolve(self, parents: List[PromptVariant]) -> List[PromptVariant]:
         """Generate new variants from best performers."""
         new_population = parents.copy()  # Keep elites
+        num_children = max(self.population_size - len(new_population), 0)
         
-        while len(new_population) < self.population_size:
-            # Select random parent
-            parent = random.choice(parents)
-            
-            # Mutate
-            strategy = random.choice(self.mutation_strategies)
+        # Split each parent once and draw all parents/strategies up front
+        parent_lines = {parent.prompt_id: parent.content.split("\n") for parent in parents}
+        chosen_parents = random.choices(parents, k=num_children)
+        strategies = random.choices(self.mutation_strategies, k=num_children)
+        
+        for parent, strategy in zip(chosen_parents, strategies):
             variant_id = f"gen{self.generation+1}_variant{len(new_population)}"
-            variant_content = self._mutate_prompt(parent.content, strategy)
+            variant_content = "\n".join(self._mutate_lines(parent_lines[parent.prompt_id], strategy))
             variant = PromptVariant(variant_id, variant_content, parent_id=parent.prompt_id)
             
             new_population.append(variant)
@@ -3,10 +3,28 @@ RL training using PPO (Proximal Policy Optimization).
 Trains the Controller to select better tool sequences.
 """
 import json
+import re
 import numpy as np
+from scipy.signal import lfilter
 from typing import List, Dict, Any, Tuple
 from pathlib import Path
 
+try:
+    from numba import njit
+except ImportError:  # numba is optional; compute_advantages falls back to lfilter
+    njit = None
+
+
+# Emotion keywords used as policy features, in feature-vector order
+EMOTION_WORDS = ["sad", "angry", "anxious", "hopeless", "happy", "excited"]
+
+# Single case-insensitive pass over the message finds every emotion keyword
+_EMOTION_RE = re.compile("|".join(EMOTION_WORDS), re.IGNORECASE)
+
+_RISK_ENCODING = {"high": 1.0, "medium": 0.5, "none": 0.0}
+_EMOTION_COLUMN = {word: 3 + i for i, word in enumerate(EMOTION_WORDS)}
+NUM_FEATURES = 3 + len(EMOTION_WORDS)
+
 
 class PolicyState:
     """Represents a state in the RL environment."""
@@ -25,18 +43,67 @@ class PolicyState:
         features.append(len(self.user_message) / 500.0)
         
         # Risk level encoding
-        risk_encoding = {"high": 1.0, "medium": 0.5, "none": 0.0}
-        features.append(risk_encoding.get(self.risk_level, 0.0))
+        features.append(_RISK_ENCODING.get(self.risk_level, 0.0))
         
         # Has session history
         features.append(1.0 if self.session_summary else 0.0)
         
         # Emotion keywords
-        emotion_words = ["sad", "angry", "anxious", "hopeless", "happy", "excited"]
-        for word in emotion_words:
-            features.append(1.0 if word in self.user_message.lower() else 0.0)
+        found = {m.group(0).lower() for m in _EMOTION_RE.finditer(self.user_message)}
+        for word in EMOTION_WORDS:
+            features.append(1.0 if word in found else 0.0)
         
         return np.array(features, dtype=np.float32)
+    
+    @classmethod
+    def to_features_batch(cls, states: List["PolicyState"]) -> np.ndarray:
+        """
+        Convert many states into one (n_states, NUM_FEATURES) matrix.
+        
+        Same features as to_features(), written into a single preallocated
+        array instead of building one array per state.
+        """
+        n = len(states)
+        out = np.zeros((n, NUM_FEATURES), dtype=np.float32)
+        if n == 0:
+            return out
+        
+        out[:, 0] = np.fromiter((len(s.user_message) for s in states), np.float32, n) / 500.0
+        out[:, 1] = np.fromiter((_RISK_ENCODING.get(s.risk_level, 0.0) for s in states), np.float32, n)
+        out[:, 2] = np.fromiter((1.0 if s.session_summary else 0.0 for s in states), np.float32, n)
+        
+        for row, state in enumerate(states):
+            for match in _EMOTION_RE.finditer(state.user_message):
+                out[row, _EMOTION_COLUMN[match.group(0).lower()]] = 1.0
+        
+        return out
+
+
+def _gae_kernel(
+    rewards: np.ndarray,
+    values: np.ndarray,
+    gamma: float,
+    gae_lambda: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Reverse-time GAE loop over float32 arrays (JIT-compiled when numba is installed)."""
+    n = rewards.shape[0]
+    advantages = np.empty(n, dtype=np.float32)
+    returns = np.empty(n, dtype=np.float32)
+    running_return = 0.0
+    running_adv = 0.0
+    next_value = 0.0
+    for t in range(n - 1, -1, -1):
+        running_return = rewards[t] + gamma * running_return
+        returns[t] = running_return
+        delta = rewards[t] + gamma * next_value - values[t]
+        running_adv = delta + gamma * gae_lambda * running_adv
+        advantages[t] = running_adv
+        next_value = values[t]
+    return advantages, returns
+
+
+# Compiled lazily on first call; cache=True keeps the machine code across runs
+_gae_numba = njit(cache=True, fastmath=True)(_gae_kernel) if njit is not None else None
 
 
 class PolicyAction:
@@ -64,17 +131,26 @@ class PPOTrainer:
     based on reward signals.
     """
     
+    # Map component to action space
+    _ACTION_MAP = {
+        "Controller": "EmotionTool",  # Placeholder
+        "MasterResponder": "MasterResponderTool"
+    }
+    
     def __init__(
         self,
         action_space: List[str],
         learning_rate: float = 0.0003,
         gamma: float = 0.99,
         epsilon: float = 0.2,
-        num_epochs: int = 10
+        num_epochs: int = 10,
+        gae_lambda: float = 1.0
     ):
         self.action_space = action_space
+        self._default_action = action_space[0] if action_space else "unknown"
         self.learning_rate = learning_rate
         self.gamma = gamma  # Discount factor
+        self.gae_lambda = gae_lambda  # GAE lambda (1.0 = returns - values)
         self.epsilon = epsilon  # PPO clip parameter
         self.num_epochs = num_epochs
         
@@ -85,7 +161,8 @@ class PPOTrainer:
     def compute_advantages(
         self, 
         rewards: List[float], 
-        values: List[float]
+        values: List[float],
+        normalize: bool = True
     ) -> Tuple[np.ndarray, np.ndarray]:
         """
         Compute advantages using Generalized Advantage Estimation (GAE).
@@ -93,28 +170,56 @@ class PPOTrainer:
         Args:
             rewards: List of rewards for each step
             values: List of value estimates for each state
+            normalize: Standardize advantages within this episode
             
         Returns:
             advantages: Advantage estimates
             returns: Discounted returns
         """
-        advantages = np.zeros(len(rewards))
-        returns = np.zeros(len(rewards))
-        
-        # Compute returns
-        running_return = 0
-        for t in reversed(range(len(rewards))):
-            running_return = rewards[t] + self.gamma * running_return
-            returns[t] = running_return
+        rewards = np.asarray(rewards, dtype=np.float32)
+        values = np.asarray(values, dtype=np.float32)
         
-        # Compute advantages (returns - value estimates)
-        advantages = returns - np.array(values)
+        if _gae_numba is not None:
+            advantages, returns = _gae_numba(rewards, values, float(self.gamma), float(self.gae_lambda))
+        else:
+            # Discounted returns: r[t] + gamma*r[t+1] + ... as a reversed 1-pole IIR filter
+            returns = lfilter([1.0], [1.0, -self.gamma], rewards[::-1])[::-1].astype(np.float32)
+            
+            # GAE: discounted sum of TD residuals (terminal value is 0)
+            next_values = np.append(values[1:], 0.0)
+            deltas = rewards + self.gamma * next_values - values
+            advantages = lfilter([1.0], [1.0, -self.gamma * self.gae_lambda], deltas[::-1])[::-1]
         
         # Normalize advantages
-        advantages = (advantages - advantages.mean()) / (advantages.std() + 1e-8)
+        if normalize:
+            advantages = (advantages - advantages.mean()) / (advantages.std() + 1e-8)
         
         return advantages, returns
     
+    def _batch_advantages(self, episodes: List[List[Dict[str, Any]]]) -> np.ndarray:
+        """
+        Advantages for every step of every episode, flattened and normalized
+        across the whole batch.
+        """
+        n_steps = sum(len(episode) for episode in episodes)
+        rewards = np.fromiter((step['reward'] for ep in episodes for step in ep), np.float32, n_steps)
+        values = np.fromiter((step.get('value', 0.5) for ep in episodes for step in ep), np.float32, n_steps)  # Placeholder values
+        if n_steps == 0:
+            return rewards
+        
+        if all(len(episode) == 1 for episode in episodes):
+            # Single-step episodes: the return is the reward itself
+            advantages = rewards - values
+        else:
+            advantages = np.empty(n_steps, dtype=np.float32)
+            start = 0
+            for episode in episodes:
+                end = start + len(episode)
+                advantages[start:end], _ = self.compute_advantages(rewards[start:end], values[start:end], normalize=False)
+                start = end
+        
+        return (advantages - advantages.mean()) / (advantages.std() + 1e-8)
+    
     def train_on_traces(self, traces: List[Dict[str, Any]]):
         """
         Train policy on collected traces.
@@ -132,24 +237,19 @@ class PPOTrainer:
         episodes = self._traces_to_episodes(traces)
         print(f"Extracted {len(episodes)} episodes")
         
+        # Rewards and values don't change between epochs, so advantages are computed once
+        advantages = self._batch_advantages(episodes)
+        actions = [step['action'] for episode in episodes for step in episode]
+        
         # Train for multiple epochs
         for epoch in range(self.num_epochs):
             print(f"\nEpoch {epoch+1}/{self.num_epochs}")
             
-            epoch_loss = 0
-            for episode in episodes:
-                # Compute advantages
-                rewards = [step['reward'] for step in episode]
-                values = [step.get('value', 0.5) for step in episode]  # Placeholder values
-                
-                advantages, returns = self.compute_advantages(rewards, values)
-                
-                # Update statistics
-                for step, adv in zip(episode, advantages):
-                    action = step['action']
-                    if action in self.action_space:
-                        self.action_counts[action] += 1
-                        self.action_rewards[action].append(adv)
+            # Update statistics
+            for action, adv in zip(actions, advantages):
+                if action in self.action_space:
+                    self.action_counts[action] += 1
+                    self.action_rewards[action].append(adv)
             
             print(f"  Epoch {epoch+1} complete")
         
@@ -179,15 +279,7 @@ class PPOTrainer:
     
     def _extract_action(self, trace: Dict[str, Any]) -> str:
         """Extract action (tool used) from trace."""
-        component = trace.get('component', 'unknown')
-        
-        # Map component to action space
-        if component == "Controller":
-            return "EmotionTool"  # Placeholder
-        elif component == "MasterResponder":
-            return "MasterResponderTool"
-        else:
-            return self.action_space[0] if self.action_space else "unknown"
+        return self._ACTION_MAP.get(trace.get('component', 'unknown'), self._default_action)
     
     def _print_policy_summary(self):
         """Print learned policy statistics."""
@@ -2,19 +2,33 @@
 Prompt management system for A/B testing and rollout.
 """
 import json
+import os
+import textwrap
+import time
 from typing import Dict, Any, Optional
 from pathlib import Path
 from datetime import datetime
 
 
+def _nest(text: str, depth: int) -> str:
+    """Re-indent a JSON value so it can be embedded `depth` levels deep."""
+    return textwrap.indent(text, "  " * depth).lstrip()
+
+
 class PromptRegistry:
     """
     Manages different prompt versions and enables A/B testing.
     """
     
+    # Rewards are appended to an event log; the snapshot is compacted every
+    # this many rewards per variant
+    SAVE_EVERY = 50
+    
     def __init__(self, registry_file: str = "prompts/registry.json"):
         self.registry_file = Path(registry_file)
         self.registry_file.parent.mkdir(parents=True, exist_ok=True)
+        self.event_log_file = self.registry_file.with_suffix(".log.jsonl")
+        self._dirty = False
         
         # Load existing registry
         if self.registry_file.exists():
@@ -26,6 +40,22 @@ class PromptRegistry:
                 "active_variant": "baseline",
                 "ab_test": None
             }
+        
+        # Serialized JSON per component, refreshed only for dirty components
+        self._component_json: Dict[str, str] = {}
+        self._dirty_components = set(self.registry["prompts"])
+        
+        # Rewards recorded since the last snapshot; events at or below the
+        # snapshot's sequence number are already folded into it
+        self._seq = self.registry.get("event_seq", 0)
+        self._replay_event_log()
+        self._event_log = open(self.event_log_file, "a", buffering=1)
+        if self._event_log.tell() > 0:
+            # End a torn last line so the next event starts on a line of its own
+            with open(self.event_log_file, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._event_log.write("\n")
     
     def register_prompt(
         self, 
@@ -45,9 +75,11 @@ class PromptRegistry:
             "performance": {
                 "total_uses": 0,
                 "avg_reward": 0.0,
+                "sum": 0.0,
                 "rewards": []
             }
         }
+        self._dirty_components.add(component)
         
         self._save()
     
@@ -81,14 +113,94 @@ class PromptRegistry:
         variant_id: str,
         reward: float
     ):
-        """Record performance for a prompt variant."""
+        """
+        Record performance for a prompt variant.
+        
+        Each reward is appended as one line to the event log instead of
+        rewriting the registry; the snapshot is compacted every SAVE_EVERY
+        rewards for a variant, or on compact()/flush().
+        """
         if component in self.registry["prompts"] and variant_id in self.registry["prompts"][component]:
             perf = self.registry["prompts"][component][variant_id]["performance"]
-            perf["total_uses"] += 1
-            perf["rewards"].append(reward)
-            perf["avg_reward"] = sum(perf["rewards"]) / len(perf["rewards"])
+            self._apply_reward(perf, reward)
+            self._seq += 1
+            self._event_log.write(json.dumps({
+                "seq": self._seq,
+                "ts": time.time(),
+                "comp": component,
+                "vid": variant_id,
+                "r": reward
+            }) + "\n")
+            self._dirty = True
+            self._dirty_components.add(component)
             
-            self._save()
+            if perf["total_uses"] % self.SAVE_EVERY == 0:
+                self.compact()
+    
+    @staticmethod
+    def _apply_reward(perf: Dict[str, Any], reward: float):
+        """Fold one reward into a variant's performance stats."""
+        if "sum" not in perf:
+            # Registries written before running sums were tracked
+            perf["sum"] = float(sum(perf["rewards"]))
+        perf["sum"] += reward
+        perf["total_uses"] += 1
+        perf["rewards"].append(reward)
+        perf["avg_reward"] = perf["sum"] / perf["total_uses"]
+    
+    def _replay_event_log(self):
+        """
+        Apply rewards logged after the last snapshot to the in-memory registry.
+        
+        A crash between replacing the snapshot and truncating the log leaves
+        events the snapshot already covers; their seq is at or below the
+        snapshot's event_seq, so they are skipped. Events without a seq come
+        from logs written before sequence numbers and are always applied.
+        """
+        if not self.event_log_file.exists():
+            return
+        
+        snapshot_seq = self._seq
+        with open(self.event_log_file, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Torn write from an interrupted run
+                seq = event.get("seq")
+                if seq is not None:
+                    if seq <= snapshot_seq:
+                        continue
+                    self._seq = max(self._seq, seq)
+                variants = self.registry["prompts"].get(event["comp"], {})
+                if event["vid"] in variants:
+                    self._apply_reward(variants[event["vid"]]["performance"], event["r"])
+                    self._dirty = True
+                    self._dirty_components.add(event["comp"])
+    
+    def compact(self):
+        """Rewrite the registry snapshot and truncate the event log."""
+        self._save()
+    
+    def flush(self):
+        """Persist any performance records not yet compacted into the snapshot."""
+        if self._dirty:
+            self.compact()
+    
+    def close(self):
+        """Flush pending records and close the event log."""
+        if self._event_log.closed:
+            return
+        self.flush()
+        self._event_log.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
     
     def start_ab_test(
         self,
@@ -113,6 +225,7 @@ class PromptRegistry:
             "traffic_split": traffic_split,
             "started_at": datetime.now().isoformat()
         }
+        self._dirty = True
         
         self._save()
         print(f"✅ A/B Test started: {variant_a} vs {variant_b} ({traffic_split*100}% to B)")
@@ -142,12 +255,52 @@ class PromptRegistry:
                 print(f"✅ Winner: {winner} is now active")
             
             self.registry["ab_test"] = None
+            self._dirty = True
             self._save()
     
     def _save(self):
-        """Save registry to disk."""
-        with open(self.registry_file, "w") as f:
-            json.dump(self.registry, f, indent=2)
+        """
+        Save registry snapshot to disk; it now covers every logged reward.
+        
+        Written to a temp file and renamed into place so a crash never
+        leaves a torn registry. The snapshot records the last event sequence
+        number it covers, so replay never counts a reward twice if the log
+        truncate below is lost.
+        """
+        if not self._dirty and not self._dirty_components:
+            return
+        
+        self.registry["event_seq"] = self._seq
+        tmp_file = self.registry_file.with_suffix(".tmp")
+        with open(tmp_file, "w") as f:
+            f.write(self._serialize())
+        os.replace(tmp_file, self.registry_file)
+        self._event_log.truncate(0)
+        self._dirty = False
+    
+    def _serialize(self) -> str:
+        """
+        Same output as json.dumps(self.registry, indent=2), but only components
+        changed since the last save are re-serialized.
+        """
+        prompts = self.registry["prompts"]
+        for component in self._dirty_components & prompts.keys():
+            self._component_json[component] = _nest(json.dumps(prompts[component], indent=2), 2)
+        self._dirty_components.clear()
+        
+        if prompts:
+            prompts_json = "{\n" + ",\n".join(
+                f"    {json.dumps(component)}: {self._component_json[component]}"
+                for component in prompts
+            ) + "\n  }"
+        else:
+            prompts_json = "{}"
+        
+        fields = [
+            f"  {json.dumps(key)}: " + (prompts_json if key == "prompts" else _nest(json.dumps(value, indent=2), 1))
+            for key, value in self.registry.items()
+        ]
+        return "{\n" + ",\n".join(fields) + "\n}"
     
     def export_summary(self, output_file: str = "prompts/summary.md"):
         """Export prompt performance summary."""
@@ -3,109 +3,367 @@ Background psychological assessment system.
 Seamlessly integrates clinical assessment questions into natural conversation
 while tracking responses and generating diagnostic insights.
 """
-import json
+import mmap
 import os
+import re
+import sqlite3
+import string
+import time
+from collections import deque
+from itertools import chain
+from operator import itemgetter
 from typing import Dict, Any, List
 from datetime import datetime
 
+import numpy as np
+import orjson
+
+try:
+    import ahocorasick  # pyahocorasick; optional single-pass keyword matcher
+except ImportError:
+    ahocorasick = None
+
+
+# PHQ-9 Depression screening
+PHQ9_QUESTIONS = (
+    "little interest or pleasure in doing things",
+    "feeling down, depressed, or hopeless",
+    "trouble falling or staying asleep, or sleeping too much",
+    "feeling tired or having little energy",
+    "poor appetite or overeating",
+    "feeling bad about yourself or that you are a failure",
+    "trouble concentrating on things",
+    "moving or speaking slowly or being fidgety or restless",
+    "thoughts of being better off dead or hurting yourself"
+)
+
+# GAD-7 Anxiety screening
+GAD7_QUESTIONS = (
+    "feeling nervous, anxious, or on edge",
+    "not being able to stop or control worrying",
+    "worrying too much about different things",
+    "trouble relaxing",
+    "being so restless that it's hard to sit still",
+    "becoming easily annoyed or irritable",
+    "feeling afraid as if something awful might happen"
+)
+
+# Keywords for automatic detection
+SYMPTOM_KEYWORDS = {
+    'depression': ('sad', 'down', 'depressed', 'hopeless', 'worthless', 'empty', 'numb'),
+    'anxiety': ('anxious', 'worried', 'nervous', 'panic', 'fear', 'scared', 'tense'),
+    'sleep': ('sleep', 'insomnia', 'tired', 'exhausted', 'fatigue', 'rest'),
+    'appetite': ('appetite', 'eating', 'food', 'hungry', 'weight'),
+    'concentration': ('focus', 'concentrate', 'attention', 'distracted', 'memory'),
+    'energy': ('energy', 'motivation', 'tired', 'exhausted', 'fatigue'),
+    'irritability': ('irritable', 'angry', 'annoyed', 'frustrated'),
+    'suicidal': ('suicide', 'kill myself', 'end my life', 'better off dead', 'harm myself')
+}
+
+# Leading words of each question, used as its detection keywords
+PHQ9_PREFIXES = tuple(tuple(q.split()[:3]) for q in PHQ9_QUESTIONS)
+GAD7_PREFIXES = tuple(tuple(q.split()[:3]) for q in GAD7_QUESTIONS)
+
+# Symptom areas that feed the PHQ-9 and GAD-7 estimates
+DEPRESSION_SYMPTOMS = frozenset({'depression', 'sleep', 'energy', 'appetite', 'concentration'})
+ANXIETY_SYMPTOMS = frozenset({'anxiety', 'irritability'})
+
+# Estimated scores by number of symptom areas seen (rough estimate, capped)
+_PHQ9_SCORE_TABLE = tuple(min(n * 2, 27) for n in range(len(DEPRESSION_SYMPTOMS) + 1))
+_GAD7_SCORE_TABLE = tuple(min(n * 3, 21) for n in range(len(ANXIETY_SYMPTOMS) + 1))
+
+
+def _risk_level(phq9: int, gad7: int) -> tuple:
+    """(risk_level, concern or None) for estimated scores, without suicidality."""
+    if phq9 >= 15:
+        return 'moderate-high', 'Significant depression symptoms'
+    if gad7 >= 10:
+        return 'moderate', 'Significant anxiety symptoms'
+    return 'low-moderate', None
+
+
+# Risk levels folded over every (phq9_count, gad7_count) pair
+_RISK_TABLE = tuple(
+    tuple(_risk_level(phq9, gad7) for gad7 in _GAD7_SCORE_TABLE)
+    for phq9 in _PHQ9_SCORE_TABLE
+)
+
+# Mentions kept per symptom; older ones only count towards the total
+RECENT_MENTIONS = 32
+
+# Words/phrases that signal frequency or persistence
+SEVERITY_KEYWORDS = {
+    'high_frequency': ('very', 'extremely', 'always', 'constantly', 'severe'),
+    'persistent': ('every day', 'all the time', 'never stops')
+}
+
+
+# Fixed instructions appended to every background context
+_CONTEXT_GUIDANCE = """
+IMPORTANT:
+- DO NOT use clinical terms: "depression", "anxiety", "dissociation", "repression", "PTSD"
+- DO NOT diagnose or label
+- USE instead: "feeling down", "worried", "going through tough time", "sometimes numb"
+- If exploring these: use soft language like "Sometimes people feel numb after hurt. Does that fit for you?"
+[Continue natural, human conversation with this gentle awareness]
+"""
+
+# Session store: one row per symptom mention, one row per score field
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (symptom TEXT NOT NULL, ts REAL, context TEXT);
+CREATE TABLE IF NOT EXISTS scores (k TEXT PRIMARY KEY, v BLOB NOT NULL);
+"""
+
+# Bytes of each session database SQLite may memory-map for reads
+_MMAP_SIZE = 1 << 26
+
+_PUNCT_TABLE = str.maketrans({c: ' ' for c in string.punctuation})
+
+
+def _words(text: str) -> str:
+    """
+    Reduce text to space-separated words with a space at each end, so that
+    ' sad ' only matches the whole word (not 'saddle') and phrases still
+    match across punctuation and repeated whitespace.
+    """
+    return ' ' + ' '.join(text.translate(_PUNCT_TABLE).split()) + ' '
+
+
+def _build_keyword_tags() -> Dict[str, tuple]:
+    """
+    Invert the keyword tables into {keyword: tags}, where each tag is
+    ('symptom', name), ('phq9', i), ('gad7', i) or ('severity', label).
+    Keywords are stored in _words() form.
+    """
+    tags: Dict[str, list] = {}
+    for symptom, keywords in SYMPTOM_KEYWORDS.items():
+        for kw in keywords:
+            tags.setdefault(_words(kw), []).append(('symptom', symptom))
+    for i, prefix in enumerate(PHQ9_PREFIXES):
+        for kw in prefix:
+            tags.setdefault(_words(kw), []).append(('phq9', i))
+    for i, prefix in enumerate(GAD7_PREFIXES):
+        for kw in prefix:
+            tags.setdefault(_words(kw), []).append(('gad7', i))
+    for label, words in SEVERITY_KEYWORDS.items():
+        for word in words:
+            tags.setdefault(_words(word), []).append(('severity', label))
+    return {kw: tuple(kw_tags) for kw, kw_tags in tags.items()}
+
+
+def build_keyword_matcher(keyword_tags: Dict[str, tuple]):
+    """
+    Compile a {keyword: tags} table into a substring matcher for
+    scan_keywords(): an Aho-Corasick automaton when pyahocorasick is
+    installed, otherwise one fused regex.
+    """
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for kw, kw_tags in keyword_tags.items():
+            automaton.add_word(kw, kw_tags)
+        automaton.make_automaton()
+        return automaton
+    
+    # Zero-width lookahead so overlapping keywords all match; the
+    # longest-first alternation reports only the longest keyword at
+    # each position, so it also carries the tags of its prefixes.
+    keywords = sorted(keyword_tags, key=len, reverse=True)
+    pattern = re.compile('(?=(' + '|'.join(map(re.escape, keywords)) + '))')
+    closure = {
+        kw: tuple(t for p in keywords if kw.startswith(p) for t in keyword_tags[p])
+        for kw in keywords
+    }
+    return pattern, closure
+
+
+def scan_keywords(matcher, text: str) -> set:
+    """Return the set of tags fired by any keyword of matcher found in text."""
+    if isinstance(matcher, tuple):
+        pattern, closure = matcher
+        matched_tags = map(closure.__getitem__, pattern.findall(text))
+    else:
+        matched_tags = map(itemgetter(1), matcher.iter(text))
+    return set(chain.from_iterable(matched_tags))
+
+
+_KEYWORD_TAGS = _build_keyword_tags()
+_KEYWORD_CHARS = frozenset(''.join(_KEYWORD_TAGS).replace(' ', ''))
+# (tag, reported name) for every tag the matcher can fire, in report order
+_SYMPTOM_TAGS = tuple((('symptom', symptom), symptom) for symptom in SYMPTOM_KEYWORDS)
+_QUESTION_TAGS = tuple(
+    [(('phq9', i), f'phq9_{i}') for i in range(len(PHQ9_PREFIXES))]
+    + [(('gad7', i), f'gad7_{i}') for i in range(len(GAD7_PREFIXES))]
+)
+_SEVERITY_TAGS = tuple((('severity', label), label) for label in SEVERITY_KEYWORDS)
+_MATCHER = build_keyword_matcher(_KEYWORD_TAGS)
+
 
 class AssessmentTracker:
     """Tracks psychological assessment responses in the background."""
     
+    # Many sessions can be alive at once; skip the per-instance __dict__
+    __slots__ = (
+        'session_id', 'assessment_db', 'assessment_file',
+        '_responses', '_scores', '_db', '_dirty', '_pending',
+        '_responses_version', '_scores_version',
+        '_context_version', '_context_cached'
+    )
+    
+    phq9_questions = PHQ9_QUESTIONS
+    gad7_questions = GAD7_QUESTIONS
+    symptom_keywords = SYMPTOM_KEYWORDS
+    severity_keywords = SEVERITY_KEYWORDS
+    
     def __init__(self, session_id: str):
         self.session_id = session_id
-        self.responses = {}
-        self.scores = {}
-        self.assessment_file = f'sessions/{session_id}_assessment.json'
-        
-        # PHQ-9 Depression screening
-        self.phq9_questions = [
-            "little interest or pleasure in doing things",
-            "feeling down, depressed, or hopeless",
-            "trouble falling or staying asleep, or sleeping too much",
-            "feeling tired or having little energy",
-            "poor appetite or overeating",
-            "feeling bad about yourself or that you are a failure",
-            "trouble concentrating on things",
-            "moving or speaking slowly or being fidgety or restless",
-            "thoughts of being better off dead or hurting yourself"
-        ]
-        
-        # GAD-7 Anxiety screening
-        self.gad7_questions = [
-            "feeling nervous, anxious, or on edge",
-            "not being able to stop or control worrying",
-            "worrying too much about different things",
-            "trouble relaxing",
-            "being so restless that it's hard to sit still",
-            "becoming easily annoyed or irritable",
-            "feeling afraid as if something awful might happen"
-        ]
-        
-        # Keywords for automatic detection
-        self.symptom_keywords = {
-            'depression': ['sad', 'down', 'depressed', 'hopeless', 'worthless', 'empty', 'numb'],
-            'anxiety': ['anxious', 'worried', 'nervous', 'panic', 'fear', 'scared', 'tense'],
-            'sleep': ['sleep', 'insomnia', 'tired', 'exhausted', 'fatigue', 'rest'],
-            'appetite': ['appetite', 'eating', 'food', 'hungry', 'weight'],
-            'concentration': ['focus', 'concentrate', 'attention', 'distracted', 'memory'],
-            'energy': ['energy', 'motivation', 'tired', 'exhausted', 'fatigue'],
-            'irritability': ['irritable', 'angry', 'annoyed', 'frustrated'],
-            'suicidal': ['suicide', 'kill myself', 'end my life', 'better off dead', 'harm myself']
-        }
+        self._responses = {}
+        self._scores = {}
+        self.assessment_db = f'sessions/{session_id}_assessment.db'
+        self.assessment_file = f'sessions/{session_id}_assessment.json'  # Legacy, migrated on load
+        self._dirty = False  # Unsaved changes pending
+        self._pending = []  # (symptom, ts, context) rows not yet in the database
+        
+        # Scores and background context only change when responses do
+        self._responses_version = 0
+        self._scores_version = -1
+        self._context_version = -1
+        self._context_cached = ""
+        
+        # Opened, and the session loaded, on first access to responses/scores
+        self._db = None
+    
+    @property
+    def responses(self) -> Dict[str, Dict[str, Any]]:
+        """Per-symptom mention records; the session is loaded on first access."""
+        if self._db is None:
+            self._load_assessment()
+        return self._responses
+    
+    @property
+    def scores(self) -> Dict[str, Any]:
+        """Last calculated scores; the session is loaded on first access."""
+        if self._db is None:
+            self._load_assessment()
+        return self._scores
+    
+    @scores.setter
+    def scores(self, scores: Dict[str, Any]):
+        if self._db is None:
+            self._load_assessment()
+        self._scores = scores
+    
+    def _scan_batch(self, messages_words: List[str]) -> List[set]:
+        """
+        Scan several _words() strings in one pass over their concatenation
+        and return one tag set per string.
+        """
+        # Newlines never survive _words(), so no keyword can span two messages
+        text = '\n'.join(messages_words)
+        ends = np.cumsum([len(w) + 1 for w in messages_words])
+        
+        if isinstance(_MATCHER, tuple):
+            pattern, closure = _MATCHER
+            matches = [(m.start(), closure[m.group(1)]) for m in pattern.finditer(text)]
+        else:
+            matches = list(_MATCHER.iter(text))
         
-        self._load_assessment()
+        hits = [set() for _ in messages_words]
+        if matches:
+            offsets = np.fromiter((offset for offset, _ in matches), dtype=np.int64, count=len(matches))
+            owners = np.searchsorted(ends, offsets, side='right')
+            for owner, (_, kw_tags) in zip(owners.tolist(), matches):
+                hits[owner].update(kw_tags)
+        return hits
     
     def analyze_message(self, user_message: str) -> Dict[str, Any]:
         """Analyze user message for assessment indicators."""
         message_lower = user_message.lower()
+        
+        # No keyword can match if the message shares no letter with any of them
+        if _KEYWORD_CHARS.isdisjoint(message_lower):
+            hits = set()
+        else:
+            # One pass over the message fires every whole-word keyword match
+            hits = scan_keywords(_MATCHER, _words(message_lower))
+        
+        detected = self._detect(hits, user_message)
+        self._flush_if_dirty()
+        return detected
+    
+    def analyze_messages(self, messages: List[str]) -> List[Dict[str, Any]]:
+        """
+        Analyze several messages at once, e.g. to re-score a stored
+        conversation. Results match calling analyze_message on each in
+        order, but the keyword scan and the save happen once for the batch.
+        """
+        if not messages:
+            return []
+        
+        all_hits = self._scan_batch([_words(m.lower()) for m in messages])
+        results = [self._detect(hits, m) for hits, m in zip(all_hits, messages)]
+        self._flush_if_dirty()
+        return results
+    
+    def _detect(self, hits: set, user_message: str) -> Dict[str, Any]:
+        """Turn the tags fired by a message into its result, recording symptoms."""
         detected = {
             'symptoms': [],
             'severity_indicators': [],
             'assessment_relevance': {}
         }
         
+        if not hits:
+            return detected
+        
         # Detect symptoms
-        for symptom, keywords in self.symptom_keywords.items():
-            if any(keyword in message_lower for keyword in keywords):
+        for tag, symptom in _SYMPTOM_TAGS:
+            if tag in hits:
                 detected['symptoms'].append(symptom)
                 self._record_symptom(symptom, user_message)
         
-        # Check PHQ-9 indicators
-        for i, question_text in enumerate(self.phq9_questions):
-            keywords = question_text.split()[:3]  # First 3 words as keywords
-            if any(kw in message_lower for kw in keywords):
-                detected['assessment_relevance'][f'phq9_{i}'] = True
-        
-        # Check GAD-7 indicators
-        for i, question_text in enumerate(self.gad7_questions):
-            keywords = question_text.split()[:3]
-            if any(kw in message_lower for kw in keywords):
-                detected['assessment_relevance'][f'gad7_{i}'] = True
+        # Check PHQ-9 and GAD-7 indicators
+        for tag, key in _QUESTION_TAGS:
+            if tag in hits:
+                detected['assessment_relevance'][key] = True
         
         # Severity indicators
-        if any(word in message_lower for word in ['very', 'extremely', 'always', 'constantly', 'severe']):
-            detected['severity_indicators'].append('high_frequency')
-        if any(word in message_lower for word in ['every day', 'all the time', 'never stops']):
-            detected['severity_indicators'].append('persistent')
+        for tag, label in _SEVERITY_TAGS:
+            if tag in hits:
+                detected['severity_indicators'].append(label)
         
         return detected
     
     def _record_symptom(self, symptom: str, context: str):
         """Record symptom mention with context."""
-        if symptom not in self.responses:
-            self.responses[symptom] = []
+        entry = self.responses.get(symptom)
+        if entry is None:
+            entry = self.responses[symptom] = self._new_entry()
         
-        self.responses[symptom].append({
-            'timestamp': datetime.now().isoformat(),
-            'context': context[:200],  # Store snippet
-            'detected': True
-        })
+        ts = time.time()
+        snippet = context[:200]  # Store snippet
+        entry['timestamps'].append(ts)
+        entry['contexts'].append(snippet)
+        entry['count'] += 1
+        self._responses_version += 1
+        self._pending.append((symptom, ts, snippet))
         
-        self._save_assessment()
+        # Saved once per message by _flush_if_dirty, not once per symptom
+        self._dirty = True
+    
+    @staticmethod
+    def _new_entry(count: int = 0, timestamps=(), contexts=()) -> Dict[str, Any]:
+        """Per-symptom record: total mentions plus the most recent ones."""
+        return {
+            'count': count,
+            'timestamps': deque(timestamps, maxlen=RECENT_MENTIONS),
+            'contexts': deque(contexts, maxlen=RECENT_MENTIONS)
+        }
     
     def calculate_scores(self) -> Dict[str, Any]:
         """Calculate assessment scores based on detected symptoms."""
+        if self._scores_version == self._responses_version:
+            return self.scores
+        
         scores = {
             'phq9_estimated': 0,
             'gad7_estimated': 0,
@@ -113,36 +371,32 @@ class AssessmentTracker:
             'concerns': []
         }
         
-        # Estimate PHQ-9 score based on symptom mentions
-        depression_symptoms = ['depression', 'sleep', 'energy', 'appetite', 'concentration']
-        phq9_count = sum(1 for s in depression_symptoms if s in self.responses)
-        scores['phq9_estimated'] = min(phq9_count * 2, 27)  # Rough estimate
-        
-        # Estimate GAD-7 score
-        anxiety_symptoms = ['anxiety', 'worry', 'nervous', 'restless', 'irritability']
-        gad7_count = sum(1 for s in ['anxiety', 'irritability'] if s in self.responses)
-        scores['gad7_estimated'] = min(gad7_count * 3, 21)
+        # Estimate PHQ-9 and GAD-7 scores based on symptom mentions
+        phq9_count = len(DEPRESSION_SYMPTOMS & self.responses.keys())
+        gad7_count = len(ANXIETY_SYMPTOMS & self.responses.keys())
+        scores['phq9_estimated'] = _PHQ9_SCORE_TABLE[phq9_count]
+        scores['gad7_estimated'] = _GAD7_SCORE_TABLE[gad7_count]
         
         # Risk assessment
         if 'suicidal' in self.responses:
             scores['risk_level'] = 'high'
             scores['concerns'].append('Suicidal ideation detected - immediate intervention needed')
-        elif scores['phq9_estimated'] >= 15:
-            scores['risk_level'] = 'moderate-high'
-            scores['concerns'].append('Significant depression symptoms')
-        elif scores['gad7_estimated'] >= 10:
-            scores['risk_level'] = 'moderate'
-            scores['concerns'].append('Significant anxiety symptoms')
         else:
-            scores['risk_level'] = 'low-moderate'
+            risk_level, concern = _RISK_TABLE[phq9_count][gad7_count]
+            scores['risk_level'] = risk_level
+            if concern:
+                scores['concerns'].append(concern)
         
         # Additional insights
         if len(self.responses) >= 3:
             scores['concerns'].append(f'{len(self.responses)} different symptom areas identified')
         
-        self.scores = scores
-        self._save_assessment()
-        return scores
+        if scores != self.scores:
+            self.scores = scores
+            self._dirty = True
+        self._scores_version = self._responses_version
+        self._flush_if_dirty()
+        return self.scores
     
     def get_assessment_summary(self) -> str:
         """Get natural language assessment summary."""
@@ -165,6 +419,13 @@ class AssessmentTracker:
     
     def get_background_context(self) -> str:
         """Get gentle, non-diagnostic context for LLM (invisible to user)."""
+        if self._context_version != self._responses_version:
+            self._context_cached = self._build_background_context()
+            self._context_version = self._responses_version
+        return self._context_cached
+    
+    def _build_background_context(self) -> str:
+        """Render the background context from the current scores."""
         if not self.responses:
             return ""
         
@@ -186,38 +447,138 @@ class AssessmentTracker:
         if not gentle_observations:
             return ""
         
-        context = f"""[BACKGROUND OBSERVATIONS - Gentle, non-diagnostic language only]
-What user shared: {', '.join(self.responses.keys())}
-Observations: {', '.join(gentle_observations)}
-Risk Level: {scores['risk_level']}
-
-IMPORTANT:
-- DO NOT use clinical terms: "depression", "anxiety", "dissociation", "repression", "PTSD"
-- DO NOT diagnose or label
-- USE instead: "feeling down", "worried", "going through tough time", "sometimes numb"
-- If exploring these: use soft language like "Sometimes people feel numb after hurt. Does that fit for you?"
-[Continue natural, human conversation with this gentle awareness]
-"""
-        return context
-        return context
+        return ''.join([
+            "[BACKGROUND OBSERVATIONS - Gentle, non-diagnostic language only]\n",
+            "What user shared: ", ', '.join(self.responses.keys()), "\n",
+            "Observations: ", ', '.join(gentle_observations), "\n",
+            "Risk Level: ", scores['risk_level'], "\n",
+            _CONTEXT_GUIDANCE
+        ])
+    
+    def _flush_if_dirty(self):
+        """Save assessment data only if something changed since the last save."""
+        if self._dirty:
+            self._save_assessment()
     
     def _save_assessment(self):
-        """Save assessment data to disk."""
-        assessment_data = {
-            'session_id': self.session_id,
-            'responses': self.responses,
-            'scores': self.scores,
-            'last_updated': datetime.now().isoformat()
-        }
-        
-        os.makedirs('sessions', exist_ok=True)
-        with open(self.assessment_file, 'w', encoding='utf-8') as f:
-            json.dump(assessment_data, f, indent=2, ensure_ascii=False)
+        """Append new mentions and store the current scores in one transaction."""
+        self._dirty = False
+        rows, self._pending = self._pending, []
+        with self._db:
+            self._db.executemany("INSERT INTO responses VALUES (?, ?, ?)", rows)
+            self._db.executemany(
+                "INSERT OR REPLACE INTO scores VALUES (?, ?)",
+                [(k, orjson.dumps(v)) for k, v in self.scores.items()]
+            )
     
     def _load_assessment(self):
-        """Load existing assessment data."""
-        if os.path.exists(self.assessment_file):
-            with open(self.assessment_file, 'r', encoding='utf-8') as f:
-                assessment_data = json.load(f)
-                self.responses = assessment_data.get('responses', {})
-                self.scores = assessment_data.get('scores', {})
+        """Open the session database and load existing assessment data."""
+        os.makedirs('sessions', exist_ok=True)
+        self._db = _connect(self.assessment_db)
+        data = _read_database(self._db)
+        if data is None and os.path.exists(self.assessment_file):
+            data = _read_json(self.assessment_file)
+            self._migrate(data)
+        if data is None:
+            return
+        
+        self._responses = {
+            symptom: self._new_entry(saved['count'], saved['timestamps'], saved['contexts'])
+            for symptom, saved in data['responses'].items()
+        }
+        self._scores = data['scores']
+    
+    def _migrate(self, data: Dict[str, Any]):
+        """Copy a JSON session file into the (empty) database."""
+        rows = []
+        for symptom, saved in data['responses'].items():
+            # Mentions that fell out of the recent buffer keep only their count
+            rows.extend([(symptom, None, None)] * (saved['count'] - len(saved['contexts'])))
+            rows.extend((symptom, ts, ctx) for ts, ctx in zip(saved['timestamps'], saved['contexts']))
+        with self._db:
+            self._db.executemany("INSERT INTO responses VALUES (?, ?, ?)", rows)
+            self._db.executemany(
+                "INSERT OR REPLACE INTO scores VALUES (?, ?)",
+                [(k, orjson.dumps(v)) for k, v in data['scores'].items()]
+            )
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    """Open a session database, creating the schema if needed."""
+    db = sqlite3.connect(path, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    # Read pages straight from a shared memory map instead of copying them
+    db.execute(f"PRAGMA mmap_size={_MMAP_SIZE}")
+    db.executescript(_SCHEMA)
+    return db
+
+
+def _read_database(db: sqlite3.Connection):
+    """Read responses and scores from a session database; None if it is empty."""
+    responses: Dict[str, Dict[str, Any]] = {}
+    for symptom, ts, context in db.execute(
+        "SELECT symptom, ts, context FROM responses ORDER BY rowid"
+    ):
+        saved = responses.get(symptom)
+        if saved is None:
+            saved = responses[symptom] = {'count': 0, 'timestamps': [], 'contexts': []}
+        saved['count'] += 1
+        if context is not None:
+            saved['timestamps'].append(ts)
+            saved['contexts'].append(context)
+    scores = {k: orjson.loads(v) for k, v in db.execute("SELECT k, v FROM scores")}
+    
+    if not responses and not scores:
+        return None
+    for saved in responses.values():
+        del saved['timestamps'][:-RECENT_MENTIONS]
+        del saved['contexts'][:-RECENT_MENTIONS]
+    return {'responses': responses, 'scores': scores}
+
+
+def _read_json(path: str) -> Dict[str, Any]:
+    """Read a JSON session file written by older versions of the tracker."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return {'responses': {}, 'scores': {}}
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            assessment_data = orjson.loads(memoryview(mm))
+    
+    responses = {}
+    for symptom, saved in assessment_data.get('responses', {}).items():
+        if isinstance(saved, list):
+            # One dict per mention
+            saved = {
+                'count': len(saved),
+                'timestamps': [m['timestamp'] for m in saved],
+                'contexts': [m.get('context', '') for m in saved]
+            }
+        responses[symptom] = {
+            'count': saved.get('count', 0),
+            'timestamps': [datetime.fromisoformat(ts).timestamp() for ts in saved.get('timestamps', ())],
+            'contexts': list(saved.get('contexts', ()))
+        }
+    return {'responses': responses, 'scores': assessment_data.get('scores', {})}
+
+
+def load_assessment_data(session_id: str):
+    """
+    Read a session's assessment without opening it for writing.
+    
+    Returns {'responses': {symptom: {'count', 'timestamps', 'contexts'}},
+    'scores': {...}} with epoch timestamps, or None if there is no data.
+    """
+    db_path = f'sessions/{session_id}_assessment.db'
+    if os.path.exists(db_path):
+        db = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+        try:
+            data = _read_database(db)
+        finally:
+            db.close()
+        if data is not None:
+            return data
+    json_path = f'sessions/{session_id}_assessment.json'
+    if os.path.exists(json_path):
+        return _read_json(json_path)
+    return None
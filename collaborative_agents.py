@@ -2,38 +2,358 @@
 Multi-agent collaboration system where specialized agents help a master agent
 formulate the best response by contributing their expertise.
 """
-from typing import Dict, Any, List
-from knowledge_base import RAGAgent
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from itertools import chain
+from typing import Dict, Any, Iterator, List, Optional
+from knowledge_base import KnowledgeBase, RAGAgent
+from llm_clients import LLMClient, extract_text
 from conversation_memory import ConversationMemory
-from assessment_tracker import AssessmentTracker
+from assessment_tracker import AssessmentTracker, build_keyword_matcher, scan_keywords
 from nlp_enhancements import ConversationalContext
 from mood_tracker import MoodTracker
+from core.controller import _extract_json
+
+# Keywords that route a message to each expert (legacy keyword-based selection)
+AGENT_KEYWORDS = {
+    'crisis': ('suicide', 'kill myself', 'end my life', 'harm myself',
+               'want to die', 'self-harm', 'cutting', 'overdose', 'can\'t go on'),
+    'assessment': ('feeling', 'symptoms', 'depressed', 'anxious', 'stressed',
+                   'not sleeping', 'sleep', 'appetite', 'worried', 'sad', 'scared',
+                   'panic', 'how bad', 'severe', 'diagnosis'),
+    'therapy': ('help me', 'what can i do', 'cope', 'coping', 'manage', 'feel better',
+                'technique', 'strategy', 'exercise', 'relax', 'calm', 'meditation',
+                'breathing', 'mindfulness', 'deal with'),
+    'resource': ('therapist', 'counselor', 'psychiatrist', 'find help', 'professional',
+                 'support group', 'treatment', 'medication', 'doctor', 'insurance',
+                 'how do i find', 'where can i', 'who should i see')
+}
+
+# NLP topic -> expert that covers it
+TOPIC_AGENTS = {
+    'depression': 'assessment',
+    'anxiety': 'assessment',
+    'stress': 'assessment',
+    'coping': 'therapy',
+    'therapy': 'therapy',
+    'mindfulness': 'therapy',
+    'professional help': 'resource',
+    'medication': 'resource',
+    'support': 'resource',
+    'sleep': 'assessment',
+    'panic': 'assessment'
+}
+
+# Primary emotion -> experts to add, in order
+EMOTION_AGENTS = {
+    'crisis': ('crisis', 'assessment'),
+    'distressed': ('crisis', 'assessment'),
+    'struggling': ('therapy', 'assessment'),
+    'coping': ('therapy', 'assessment')
+}
+
+
+@lru_cache(maxsize=256)
+def _agents_for(topics: tuple, emotion: str) -> tuple:
+    """Experts for the topics and primary emotion, first occurrence order, no duplicates."""
+    return tuple(dict.fromkeys(chain(
+        (TOPIC_AGENTS[topic] for topic in topics if topic in TOPIC_AGENTS),
+        EMOTION_AGENTS.get(emotion, ())
+    )))
+
+
+# All agent keywords in one matcher, so a message is scanned once
+_AGENT_KEYWORD_TAGS: Dict[str, tuple] = {}
+for _agent, _keywords in AGENT_KEYWORDS.items():
+    for _keyword in _keywords:
+        _AGENT_KEYWORD_TAGS[_keyword] = _AGENT_KEYWORD_TAGS.get(_keyword, ()) + (_agent,)
+_AGENT_KEYWORD_MATCHER = build_keyword_matcher(_AGENT_KEYWORD_TAGS)
+
+# Repetition tracking: a tag applies to a response when every term group has a hit
+SUGGESTION_RULES = (
+    ('journaling', (('journal',),)),
+    ('walking/exercise', (('walk', 'exercise'),)),
+    ('breathing exercises', (('breath',),)),
+    ('professional help', (('therapist', 'counselor'),)),
+    ('talking to someone', (('friend', 'talk to'),)),
+    ('music/creative activities', (('music',),))
+)
+QUESTION_RULES = (
+    ('"what does X mean to you?"', (('what does',), ('mean to you',))),
+    ('"how do you feel?"', (('how',), ('feel',))),
+    ('"what has been happening?"', (('what',), ('been',))),
+    ('"can you tell me more?"', (('can you tell me',),))
+)
+_RESPONSE_TERM_MATCHER = build_keyword_matcher({
+    term: (term,)
+    for _, groups in SUGGESTION_RULES + QUESTION_RULES
+    for group in groups
+    for term in group
+})
+
+
+def _fired_rules(rules: tuple, terms: set) -> List[str]:
+    """Labels of the rules whose every term group has a term in terms."""
+    return [
+        label for label, groups in rules
+        if all(not terms.isdisjoint(group) for group in groups)
+    ]
+
+
+def _response_tags(response: str) -> tuple:
+    """(suggestion_tags, question_tags) for an assistant response, from one scan."""
+    terms = scan_keywords(_RESPONSE_TERM_MATCHER, response.lower())
+    return _fired_rules(SUGGESTION_RULES, terms), _fired_rules(QUESTION_RULES, terms)
+
+
+# Fixed reply when the NLP analysis detects a crisis; sent without any LLM call
+CRISIS_RESPONSE = """I'm really glad you told me, and I'm worried about your safety right now. You don't have to go through this alone.
+
+Please reach out for immediate help:
+• Call or text 988 (Suicide & Crisis Lifeline), available 24/7
+• Text HOME to 741741 (Crisis Text Line)
+• If you're in immediate danger, call 911 or go to your nearest emergency room
+
+I'm here with you. Are you safe right now?"""
+
+# Turn-independent rules appended to the master prompt to form the system
+# message; kept constant so providers with prefix caching reuse it every turn
+BANNED_PHRASES_GUIDANCE = """
+
+=== RESPONSE RULES ===
+🚫 NEVER USE: 'It sounds like', 'I can hear', 'When someone', 'It's normal', 'emotional state', 'vulnerability', 'process', 'therapeutic'
+🚫 NEVER DIAGNOSE: 'depression', 'anxiety', 'dissociation', 'repression', 'PTSD', 'trauma'
+✅ USE INSTEAD: 'Ouch', 'Damn', 'That's rough', 'I'd feel the same', 'going through tough time', 'feeling down', 'worried'
+✅ THERAPIST MICRO-SKILLS: 1) Label emotion 2) Normalize it 3) Gentle specific question"""
+
+EMOTION_GUIDANCE = """
+
+Emotion-specific guidance (apply when the emotion is detected):
+- Betrayal: Acknowledge trust violation directly, don't minimize
+- Shame: Normalize, de-stigmatize, validate experience
+- Hurt: Acknowledge pain, don't rush to fix
+- Anger: Validate as protective response to violation
+- Grief: Honor the loss, don't rush healing
+- Loneliness: Acknowledge isolation, be present"""
+
+# Context clues: trigger substrings -> guidance line, listed in this order
+CONTEXT_CLUES = (
+    (('broke', 'smashed'), "Physical destruction = anger release/overwhelm (NOT resilience metaphor)"),
+    (('dream',), "Dreams about person = unresolved attachment (address directly)"),
+    (('hate',), "'Hate' = deep hurt underneath (explore hurt, not hate)"),
+    (('secret', 'betray'), "Betrayal = trust wound (needs acknowledgment of violation)")
+)
+_CLUE_LINES = {word: line for words, line in CONTEXT_CLUES for word in words}
+_CLUE_RE = re.compile('|'.join(map(re.escape, _CLUE_LINES)), re.IGNORECASE)
+
+# Final task instructions for the master agent, picked by the user's message cues
+TASK_TEMPLATES = {
+    'first': """First message - be human.
+
+1-2 sentences max.
+Micro-empathy: "That sounds hard." "Ouch."
+One tiny question.
+
+NO: "It takes courage", "I hear you", formal validation
+
+Good: "That sounds hard. What's hitting you hardest?"
+
+Your response:""",
+    'high_emotion': """HIGH EMOTION - use therapist micro-skills.
+
+Structure (1-2 sentences):
+1. Emotion labeling: "That's [hurt/anger/betrayal]."
+2. Normalize: "Makes sense you'd feel that."
+3. Maybe pause, maybe tiny question.
+
+Good examples:
+"That's betrayal. Makes sense you'd feel that way."
+"Ouch. Anyone would be hurt by that."
+"Damn. That would hit me hard too."
+
+Your response:""",
+    'medium_emotion': """Medium emotion - therapist micro-skills.
+
+Structure (2-3 sentences):
+1. Emotion labeling + normalize: "That sounds like grief. It's normal to miss someone."
+2. Gentle validation: "Anyone would feel that."
+3. Specific gentle question: "What part do you miss most?"
+
+Good: "That sounds like grief. Missing someone you connected with - that's normal. What do you miss most?"
+
+NO clinical terms, NO templates.
+
+Your response:""",
+    'low_emotion': """Low emotion - you can explore a bit.
+
+2-3 sentences.
+Stay conversational.
+No templates.
+
+Your response:""",
+    'rejected': """User rejected advice - acknowledge simply.
+
+"Fair. What would help?"
+
+That's it. No apologies, no essays.
+
+Your response:""",
+    'help': """User wants ideas - give them.
+
+1. One line about their situation
+2. One specific idea for THEIR context
+3. Why it might help
+
+2-3 sentences total.
+No generic advice.
+Use their words and situation.
+
+Example: "Seeing her daily while healing - that's hard. Could you shift your route to cross paths less? Even small distance helps."
+
+Your response:""",
+    'general': """Keep it real.
+
+1-2 sentences.
+Stay human.
+No templates.
+
+Your response:"""
+}
+
+# Cue categories in the user's message, one bit each
+CUE_HELP, CUE_REJECT, CUE_EMOTION, CUE_HIGH, CUE_MEDIUM, CUE_ESTABLISHED = 1, 2, 4, 8, 16, 32
+CUE_KEYWORDS = (
+    (CUE_HELP, ('what should i do', 'what can i do', 'help me', 'any advice', 'suggestions',
+                'what do you think')),
+    (CUE_REJECT, ('tried that', 'doesn\'t work', 'not helping', 'already doing', 'i dont like',
+                  'better suggestions')),
+    (CUE_EMOTION, ('feel', 'miss', 'hurt', 'pain', 'sad', 'scared', 'alone', 'lost', 'empty',
+                   'dream')),
+    (CUE_HIGH, ('hate', 'rage', 'furious', 'can\'t take it', 'breaking', 'destroyed', 'betray')),
+    (CUE_MEDIUM, ('hurt', 'pain', 'sad', 'miss', 'alone', 'lost'))
+)
+_CUE_TAGS: Dict[str, tuple] = {}
+for _bit, _keywords in CUE_KEYWORDS:
+    for _keyword in _keywords:
+        _CUE_TAGS[_keyword] = _CUE_TAGS.get(_keyword, ()) + (_bit,)
+_CUE_MATCHER = build_keyword_matcher(_CUE_TAGS)
+
+
+def _task_for_cues(mask: int) -> str:
+    """Name of the task template for a cue bitmask (CUE_ESTABLISHED: 6+ messages)."""
+    if mask & CUE_EMOTION and not mask & CUE_HELP:  # User sharing feelings
+        if mask & CUE_HIGH:
+            return 'high_emotion'
+        return 'medium_emotion' if mask & CUE_MEDIUM else 'low_emotion'
+    if mask & CUE_REJECT:  # User rejected previous suggestions
+        return 'rejected'
+    if mask & CUE_HELP and mask & CUE_ESTABLISHED:  # User explicitly asking for help
+        return 'help'
+    return 'general'
+
+
+# Every cue combination resolved up front, so a turn needs one lookup
+_TASK_BY_CUES = tuple(TASK_TEMPLATES[_task_for_cues(mask)] for mask in range(64))
 
 
 class CollaborativeAgent(RAGAgent):
     """Agent that can contribute expertise to collaborative decision-making."""
     
-    def __init__(self, llm_client, agent_type: str, system_prompt: str):
-        super().__init__(llm_client, agent_type, system_prompt)
+    # Exact cache: reuse a contribution when the same message arrives for the same task
+    CACHE_SIZE = 512
     
-    def contribute(self, user_input: str, task_description: str) -> Dict[str, Any]:
-        """Contribute specialized knowledge to help formulate a response."""
-        # Retrieve relevant context
-        context_docs = self.knowledge_base.search(user_input, top_k=3)
+    # Token cap for one insight; pre-extracted NLP hints leave less to work out in the reply
+    MAX_TOKENS = 60
+    HINTED_MAX_TOKENS = 40
+    
+    def __init__(self, llm_client, agent_type: str, system_prompt: str,
+                 knowledge_base: KnowledgeBase = None):
+        super().__init__(llm_client, agent_type, system_prompt, knowledge_base)
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+    
+    def _cache_lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the contribution cached under key, or None."""
+        with self._cache_lock:
+            contribution = self._cache.get(key)
+            if contribution is None:
+                return None
+            self._cache.move_to_end(key)
+            return dict(contribution)
+    
+    def _cache_store(self, key: str, contribution: Dict[str, Any]):
+        """Remember a contribution, evicting the least recently used one when full."""
+        with self._cache_lock:
+            self._cache[key] = dict(contribution)
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+    
+    @staticmethod
+    def _cache_key(user_input: str, task_description: str) -> str:
+        """
+        Cache key for a request: the case- and whitespace-normalised message plus
+        the task, which carries the emotion and topics. Matching is exact on
+        purpose; a TF-IDF similarity over the knowledge base vocabulary drops
+        unknown words and negations, so different messages looked identical.
+        """
+        normalized = " ".join(user_input.lower().split())
+        return hashlib.blake2b(f"{normalized}\0{task_description}".encode(), digest_size=16).hexdigest()
+    
+    @staticmethod
+    def _knowledge_section(context_docs: List[Dict]) -> str:
+        """Retrieved documents formatted for a contribution prompt."""
+        section = "=== RELEVANT KNOWLEDGE FROM YOUR DOMAIN ===\n"
+        for i, doc in enumerate(context_docs, 1):
+            section += f"\n[Knowledge {i}] {doc['title']}\n{doc['content']}\n"
+        return section
+    
+    @staticmethod
+    def _hints_section(nlp_hints: Optional[Dict[str, Any]]) -> str:
+        """Compact block of cues already extracted by the NLP analysis ('' without hints)."""
+        if not nlp_hints:
+            return ""
+        hints = [f"Emotion: {nlp_hints['emotion']}"] if nlp_hints.get('emotion') else []
+        if nlp_hints.get('topics'):
+            hints.append(f"Topics: {', '.join(nlp_hints['topics'])}")
+        return f"=== HINTS ===\n{' | '.join(hints)}\n\n" if hints else ""
+    
+    def build_contribution_block(self, context_docs: List[Dict]) -> str:
+        """Role-specific part of a contribution prompt: expertise plus retrieved knowledge."""
+        return f"{self.system_prompt}\n\n{self._knowledge_section(context_docs)}"
+    
+    def _finish_contribution(self, text: str, context_docs: List[Dict],
+                             cache_key: str) -> Dict[str, Any]:
+        """Trim generated text into a contribution and remember it."""
+        # Clean up verbose responses - keep only first 1-2 sentences
+        sentences = text.split('. ')
+        if len(sentences) > 2:
+            text = '. '.join(sentences[:2]) + '.'
         
-        # Build prompt for contribution
-        prompt = f"""{self.system_prompt}
+        contribution = {
+            "agent_type": self.agent_type,
+            "contribution": text,
+            "context_used": [doc['title'] for doc in context_docs],
+            "relevance_scores": [doc.get('relevance_score', 0) for doc in context_docs]
+        }
+        self._cache_store(cache_key, contribution)
+        return contribution
+    
+    def build_contribution_prompt(self, user_input: str, task_description: str,
+                                  context_docs: List[Dict],
+                                  nlp_hints: Optional[Dict[str, Any]] = None) -> str:
+        """Full prompt for a single-expert contribution."""
+        return f"""{self.system_prompt}
 
 === TASK ===
 {task_description}
 
-=== RELEVANT KNOWLEDGE FROM YOUR DOMAIN ===
-"""
-        if context_docs:
-            for i, doc in enumerate(context_docs, 1):
-                prompt += f"\n[Knowledge {i}] {doc['title']}\n{doc['content']}\n"
-        
-        prompt += f"""
+{self._hints_section(nlp_hints)}{self._knowledge_section(context_docs)}
 === USER MESSAGE ===
 {user_input}
 
@@ -41,22 +361,33 @@ class CollaborativeAgent(RAGAgent):
 Provide ONE brief insight (1 sentence max) from your expertise.
 No explanations, no lists, no advice - just the key point.
 """
+    
+    def max_tokens_for(self, nlp_hints: Optional[Dict[str, Any]]) -> int:
+        """Token cap for one insight."""
+        return self.HINTED_MAX_TOKENS if nlp_hints else self.MAX_TOKENS
+    
+    def contribute(self, user_input: str, task_description: str,
+                   nlp_hints: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Contribute specialized knowledge to help formulate a response.
+        nlp_hints ({'emotion', 'topics'}) lets the insight build on cues the
+        master agent already extracted.
+        """
+        # Repeated requests reuse an earlier contribution (skips search + LLM)
+        cache_key = self._cache_key(user_input, task_description)
+        cached = self._cache_lookup(cache_key)
+        if cached is not None:
+            return cached
         
-        # Generate contribution - brief, focused insight only
-        resp = self.llm.generate(prompt, max_tokens=60, temperature=0.8)
-        text = self._extract_text(resp)
+        # Retrieve relevant context
+        context_docs = self.knowledge_base.search(user_input, top_k=3)
         
-        # Clean up verbose responses - keep only first 1-2 sentences
-        sentences = text.split('. ')
-        if len(sentences) > 2:
-            text = '. '.join(sentences[:2]) + '.'
+        # Build prompt for contribution
+        prompt = self.build_contribution_prompt(user_input, task_description, context_docs, nlp_hints)
         
-        return {
-            "agent_type": self.agent_type,
-            "contribution": text,
-            "context_used": [doc['title'] for doc in context_docs],
-            "relevance_scores": [doc.get('relevance_score', 0) for doc in context_docs]
-        }
+        # Generate contribution - brief, focused insight only
+        resp = self.llm.generate(prompt, max_tokens=self.max_tokens_for(nlp_hints), temperature=0.8)
+        return self._finish_contribution(extract_text(resp), context_docs, cache_key)
 
 
 class AssessmentCollaborator(CollaborativeAgent):
@@ -107,7 +438,11 @@ class MasterAgent:
     Uses larger LLM for better synthesis while expert agents use smaller models.
     """
     
-    def __init__(self, llm_client, master_llm_client=None):
+    # Estimated tokens of conversation history sent with each synthesis call
+    HISTORY_TOKEN_BUDGET = 3000
+    
+    def __init__(self, llm_client, master_llm_client=None, max_parallel_agents: int = 4,
+                 fuse_contributions: bool = True):
         # Expert agents use smaller, faster models with RAG
         self.llm = llm_client
         # Master agent uses larger model for better synthesis (optional)
@@ -118,6 +453,11 @@ class MasterAgent:
         self.crisis_agent = CrisisCollaborator(llm_client)
         self.resource_agent = ResourceCollaborator(llm_client)
         
+        # Experts are independent LLM round-trips, so consult them concurrently,
+        # or (fuse_contributions) ask for every expert's insight in one call
+        self.max_parallel_agents = max_parallel_agents
+        self.fuse_contributions = fuse_contributions
+        
         # Conversation memory with auto-summarization
         self.memory = ConversationMemory(llm_client)
         
@@ -135,6 +475,9 @@ class MasterAgent:
         
         self.conversation_history = []
         
+        # Background bookkeeping of the last process_stream() turn, if still running
+        self._pending_turn: Optional[threading.Thread] = None
+        
         self.master_prompt = """You are a real friend having an emotional conversation.
 
 Your communication style:
@@ -167,40 +510,20 @@ Examples of BAD responses:
 "When someone betrays us, it's normal to feel..."
 
 You are NOT a therapist. You are a friend who gets it."""
+        
+        # System message, byte-identical every turn; per-turn context goes in the last user message
+        self._static_system = self.master_prompt + BANNED_PHRASES_GUIDANCE + EMOTION_GUIDANCE
     
     def _detect_relevant_agents(self, user_input: str) -> List[str]:
         """Determine which specialized agents should contribute (legacy - prefer _smart_expert_selection)."""
-        lower_input = user_input.lower()
-        relevant_agents = []
+        hits = scan_keywords(_AGENT_KEYWORD_MATCHER, user_input.lower())
         
         # Crisis - always check first
-        crisis_keywords = ['suicide', 'kill myself', 'end my life', 'harm myself', 
-                          'want to die', 'self-harm', 'cutting', 'overdose', 'can\'t go on']
-        if any(keyword in lower_input for keyword in crisis_keywords):
-            relevant_agents.append('crisis')
-            relevant_agents.append('assessment')  # Also need assessment for crisis
-            return relevant_agents  # Crisis takes priority
-        
-        # Assessment indicators
-        assessment_keywords = ['feeling', 'symptoms', 'depressed', 'anxious', 'stressed',
-                               'not sleeping', 'sleep', 'appetite', 'worried', 'sad', 'scared',
-                               'panic', 'how bad', 'severe', 'diagnosis']
-        if any(keyword in lower_input for keyword in assessment_keywords):
-            relevant_agents.append('assessment')
-        
-        # Therapy/coping indicators
-        therapy_keywords = ['help me', 'what can i do', 'cope', 'coping', 'manage', 'feel better',
-                           'technique', 'strategy', 'exercise', 'relax', 'calm', 'meditation',
-                           'breathing', 'mindfulness', 'deal with']
-        if any(keyword in lower_input for keyword in therapy_keywords):
-            relevant_agents.append('therapy')
+        if 'crisis' in hits:
+            return ['crisis', 'assessment']  # Crisis takes priority; also need assessment
         
-        # Resource indicators
-        resource_keywords = ['therapist', 'counselor', 'psychiatrist', 'find help', 'professional',
-                            'support group', 'treatment', 'medication', 'doctor', 'insurance',
-                            'how do i find', 'where can i', 'who should i see']
-        if any(keyword in lower_input for keyword in resource_keywords):
-            relevant_agents.append('resource')
+        # Assessment, therapy/coping and resource indicators
+        relevant_agents = [agent for agent in ('assessment', 'therapy', 'resource') if agent in hits]
         
         # If unclear or general, include therapy (most versatile)
         if not relevant_agents:
@@ -211,64 +534,101 @@ You are NOT a therapist. You are a friend who gets it."""
     
     def _smart_expert_selection(self, sentiment: Dict, topics: List[str], user_input: str) -> List[str]:
         """Smart expert selection using NLP insights."""
-        relevant_agents = []
-        
         # Crisis detection using sentiment analysis
         if sentiment.get('crisis_detected') or sentiment.get('urgency') == 'high':
-            relevant_agents.append('crisis')
-            relevant_agents.append('assessment')
-            return relevant_agents  # Crisis takes priority
-        
-        # Topic-based selection
-        topic_to_agent = {
-            'depression': 'assessment',
-            'anxiety': 'assessment',
-            'stress': 'assessment',
-            'coping': 'therapy',
-            'therapy': 'therapy',
-            'mindfulness': 'therapy',
-            'professional help': 'resource',
-            'medication': 'resource',
-            'support': 'resource',
-            'sleep': 'assessment',
-            'panic': 'assessment'
-        }
+            return ['crisis', 'assessment']  # Crisis takes priority
         
-        for topic in topics:
-            if topic in topic_to_agent:
-                agent = topic_to_agent[topic]
-                if agent not in relevant_agents:
-                    relevant_agents.append(agent)
-        
-        # Emotion-based selection
-        emotion = sentiment.get('emotion', 'neutral')
-        if emotion in ['crisis', 'distressed']:
-            if 'crisis' not in relevant_agents:
-                relevant_agents.append('crisis')
-            if 'assessment' not in relevant_agents:
-                relevant_agents.append('assessment')
-        elif emotion in ['struggling', 'coping']:
-            if 'therapy' not in relevant_agents:
-                relevant_agents.append('therapy')
-            if 'assessment' not in relevant_agents:
-                relevant_agents.append('assessment')
+        # Topic- and emotion-based selection (memoized per NLP outcome)
+        relevant_agents = list(_agents_for(tuple(topics), sentiment.get('emotion', 'neutral')))
         
         # Fallback to keyword-based if no topics matched
         if not relevant_agents:
             relevant_agents = self._detect_relevant_agents(user_input)
         
         return relevant_agents
-        
-        return relevant_agents
     
     def process(self, user_input: str) -> Dict[str, Any]:
         """Process user input with collaborative multi-agent approach."""
+        self._wait_for_pending_turn()
+        turn = self._prepare_turn(user_input)
         
-        # Get conversation history for NLP analysis
-        conversation_history = [
-            {'role': msg['role'], 'content': msg['content']} 
-            for msg in self.memory.get_recent_messages()
-        ]
+        if turn['crisis_detected']:
+            final_response, resp = CRISIS_RESPONSE, None
+        else:
+            # Generate final response - ULTRA SHORT for human realism
+            resp = self.master_llm.generate(
+                turn['synthesis_prompt'], 
+                max_tokens=120,  # Ultra-short for natural human-like responses
+                messages=turn['conversation_messages'],
+                temperature=0.9
+            )
+            final_response = extract_text(resp)
+        
+        return self._finish_turn(turn, final_response, resp)
+    
+    def process_stream(self, user_input: str) -> Iterator[str]:
+        """
+        Like process(), but yield the response text as the master LLM produces it.
+        
+        Once the last piece is yielded, the turn's bookkeeping (learning record,
+        memory, history) runs in a background thread; the next process() or
+        process_stream() call waits for it before starting. If the caller stops
+        reading early, the reply received so far is recorded instead; if the
+        master stream fails, nothing is recorded, as with process().
+        """
+        self._wait_for_pending_turn()
+        turn = self._prepare_turn(user_input)
+        
+        pieces = []
+        try:
+            if turn['crisis_detected']:
+                pieces.append(CRISIS_RESPONSE)
+                yield CRISIS_RESPONSE
+            else:
+                stream = getattr(self.master_llm, 'stream', None)
+                if stream is None:  # Client without a streaming API: one piece
+                    resp = self.master_llm.generate(
+                        turn['synthesis_prompt'],
+                        max_tokens=120,
+                        messages=turn['conversation_messages'],
+                        temperature=0.9
+                    )
+                    stream_pieces = iter([extract_text(resp)])
+                else:
+                    stream_pieces = stream(
+                        turn['synthesis_prompt'],
+                        max_tokens=120,
+                        messages=turn['conversation_messages'],
+                        temperature=0.9
+                    )
+                for piece in stream_pieces:
+                    pieces.append(piece)
+                    yield piece
+        except GeneratorExit:
+            # Caller stopped reading: keep what they were shown
+            self._finish_turn_in_background(turn, "".join(pieces))
+            raise
+        self._finish_turn_in_background(turn, "".join(pieces))
+    
+    def _finish_turn_in_background(self, turn: Dict[str, Any], final_response: str):
+        """Run a streamed turn's bookkeeping on a thread the next turn waits for."""
+        self._pending_turn = threading.Thread(
+            target=self._finish_turn,
+            args=(turn, final_response, None),
+            daemon=True
+        )
+        self._pending_turn.start()
+    
+    def _wait_for_pending_turn(self):
+        """Block until a streamed turn's background bookkeeping has finished."""
+        if self._pending_turn is not None:
+            self._pending_turn.join()
+            self._pending_turn = None
+    
+    def _prepare_turn(self, user_input: str) -> Dict[str, Any]:
+        """Everything before the master LLM call: analysis, tracking, experts, prompts."""
+        # Get conversation history for NLP analysis (read-only, so the stored dicts are passed as-is)
+        conversation_history = self.memory.get_recent_messages()
         
         # NLP analysis for analytical backend
         nlp_analysis = self.nlp_context.analyze_message(
@@ -280,20 +640,11 @@ You are NOT a therapist. You are a friend who gets it."""
         # Extract NLP insights
         sentiment = nlp_analysis['sentiment']
         topics = nlp_analysis['topics']
-        patterns = nlp_analysis['patterns']
-        personalization = nlp_analysis['personalization']
-        learned_recommendations = nlp_analysis['learned_recommendations']
         
         # Record mood for tracking
         self.mood_tracker.record_mood(sentiment, user_input)
         mood_guidance = self.mood_tracker.get_response_guidance()
         
-        # First message - give a warm greeting
-        if len(self.memory.messages) == 0:
-            greeting_added = True
-        else:
-            greeting_added = False
-        
         # Background assessment analysis (invisible to user)
         assessment_analysis = self.assessment_tracker.analyze_message(user_input)
         
@@ -306,11 +657,23 @@ You are NOT a therapist. You are a friend who gets it."""
             'urgency': sentiment.get('urgency')
         })
         
+        turn = {
+            'user_input': user_input,
+            'nlp_analysis': nlp_analysis,
+            'mood_guidance': mood_guidance,
+            'assessment_analysis': assessment_analysis,
+            'crisis_detected': bool(sentiment.get('crisis_detected')),
+            'relevant_agent_types': [],
+            'contributions': []
+        }
+        if turn['crisis_detected']:
+            # Genuine crisis: answer immediately with the fixed safety message, no LLM calls
+            return turn
+        
         # Smart expert selection using NLP insights
         relevant_agent_types = self._smart_expert_selection(sentiment, topics, user_input)
         
         # Collect contributions from relevant specialized agents with enhanced context
-        contributions = []
         enhanced_context = nlp_analysis['enhanced_context']
         task_description = f"Help formulate the best response to a user seeking mental health support. {enhanced_context}"
         
@@ -321,10 +684,15 @@ You are NOT a therapist. You are a friend who gets it."""
             'resource': self.resource_agent
         }
         
-        for agent_type in relevant_agent_types:
-            agent = agent_map[agent_type]
-            contribution = agent.contribute(user_input, task_description)
-            contributions.append(contribution)
+        # Cues the experts can build on instead of re-deriving them
+        nlp_hints = {'emotion': sentiment.get('emotion'), 'topics': topics[:3]}
+        
+        contributions = self._collect_contributions(
+            [agent_map[agent_type] for agent_type in relevant_agent_types],
+            user_input,
+            task_description,
+            nlp_hints
+        )
         
         # Master agent synthesizes all contributions with NLP insights and mood guidance
         synthesis_prompt = self._build_synthesis_prompt(
@@ -334,30 +702,38 @@ You are NOT a therapist. You are a friend who gets it."""
             mood_guidance
         )
         
-        # Build conversation messages for LLM (with full history)
-        conversation_messages = self._build_conversation_messages(synthesis_prompt)
-        
-        # Generate final response - ULTRA SHORT for human realism
-        resp = self.master_llm.generate(
-            synthesis_prompt, 
-            max_tokens=120,  # Ultra-short for natural human-like responses
-            messages=conversation_messages,
-            temperature=0.9
-        )
-        final_response = self._extract_text(resp)
+        turn.update({
+            'relevant_agent_types': relevant_agent_types,
+            'contributions': contributions,
+            'synthesis_prompt': synthesis_prompt,
+            # Build conversation messages for LLM (with full history)
+            'conversation_messages': self._build_conversation_messages(synthesis_prompt)
+        })
+        return turn
+    
+    def _finish_turn(self, turn: Dict[str, Any], final_response: str, resp: Any) -> Dict[str, Any]:
+        """Everything after the response is known: learning, memory, history, result."""
+        user_input = turn['user_input']
+        nlp_analysis = turn['nlp_analysis']
+        sentiment = nlp_analysis['sentiment']
+        relevant_agent_types = turn['relevant_agent_types']
         
-        # Record successful interaction for learning
-        self.nlp_context.record_success(
-            self.session_id,
-            user_input,
-            final_response,
-            sentiment,
-            topics,
-            relevant_agent_types
-        )
+        # Record successful interaction for learning (the crisis template isn't learned from)
+        if not turn['crisis_detected']:
+            self.nlp_context.record_success(
+                self.session_id,
+                user_input,
+                final_response,
+                sentiment,
+                nlp_analysis['topics'],
+                relevant_agent_types
+            )
         
-        # Add assistant response to memory
+        # Add assistant response to memory, tagged for later repetition checks
+        suggestion_tags, question_tags = _response_tags(final_response)
         self.memory.add_message('Assistant', final_response, metadata={
+            'suggestion_tags': suggestion_tags,
+            'question_tags': question_tags,
             'agents_consulted': relevant_agent_types,
             'assessment_scores': self.assessment_tracker.calculate_scores(),
             'sentiment_score': sentiment.get('score'),
@@ -376,18 +752,158 @@ You are NOT a therapist. You are a friend who gets it."""
             'text': final_response,
             'agents_consulted': relevant_agent_types,
             'nlp_analysis': nlp_analysis,  # Include for debug mode
-            'contributions': contributions,
+            'contributions': turn['contributions'],
             'assessment_summary': self.assessment_tracker.get_assessment_summary(),
-            'assessment_analysis': assessment_analysis,
-            'mood_guidance': mood_guidance,
+            'assessment_analysis': turn['assessment_analysis'],
+            'mood_guidance': turn['mood_guidance'],
             'mood_summary': self.mood_tracker.get_mood_summary(),
             'raw': resp
         }
     
+    def _collect_contributions(self, agents: List[CollaborativeAgent], user_input: str,
+                               task_description: str,
+                               nlp_hints: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Collect expert contributions, returned in the order of agents."""
+        if self.fuse_contributions and len(agents) > 1:
+            return self._fused_contribute(agents, user_input, task_description, nlp_hints)
+        
+        if len(agents) <= 1 or self.max_parallel_agents <= 1:
+            return [agent.contribute(user_input, task_description, nlp_hints) for agent in agents]
+        
+        if hasattr(self.llm, 'generate_batch'):
+            return self._batched_contribute(agents, user_input, task_description, nlp_hints)
+        
+        with ThreadPoolExecutor(max_workers=min(len(agents), self.max_parallel_agents)) as executor:
+            return list(executor.map(
+                lambda agent: agent.contribute(user_input, task_description, nlp_hints),
+                agents
+            ))
+    
+    @staticmethod
+    def _split_cached(agents: List[CollaborativeAgent], user_input: str,
+                      task_description: str) -> tuple:
+        """
+        ({agent_type: cached contribution}, [(agent, context_docs, cache_key)])
+        for the agents that still need an LLM call.
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        pending = []
+        for agent in agents:
+            cache_key = agent._cache_key(user_input, task_description)
+            cached = agent._cache_lookup(cache_key)
+            if cached is not None:
+                results[agent.agent_type] = cached
+            else:
+                context_docs = agent.knowledge_base.search(user_input, top_k=3)
+                pending.append((agent, context_docs, cache_key))
+        return results, pending
+    
+    def _batched_contribute(self, agents: List[CollaborativeAgent], user_input: str,
+                            task_description: str,
+                            nlp_hints: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Keep one prompt per expert but submit them together through
+        generate_batch, so a provider with batched inference can serve them
+        in one request; results are mapped back by position.
+        """
+        results, pending = self._split_cached(agents, user_input, task_description)
+        results.update(self._contribute_pending(pending, user_input, task_description, nlp_hints))
+        return [results[agent.agent_type] for agent in agents]
+    
+    def _contribute_pending(self, pending: List[tuple], user_input: str, task_description: str,
+                            nlp_hints: Optional[Dict[str, Any]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        One contribution prompt per (agent, context_docs, cache_key) from
+        _split_cached, all submitted together; {agent_type: contribution}.
+        """
+        if not pending:
+            return {}
+        
+        prompts = [
+            agent.build_contribution_prompt(user_input, task_description, context_docs, nlp_hints)
+            for agent, context_docs, _ in pending
+        ]
+        # Clients without generate_batch still get their calls overlapped
+        generate_batch = getattr(self.llm, 'generate_batch', None)
+        if generate_batch is None:
+            generate_batch = partial(LLMClient.generate_batch, self.llm)
+        responses = generate_batch(
+            prompts,
+            max_workers=self.max_parallel_agents,
+            max_tokens=max(agent.max_tokens_for(nlp_hints) for agent, _, _ in pending),
+            temperature=0.8
+        )
+        return {
+            agent.agent_type: agent._finish_contribution(extract_text(resp), context_docs, cache_key)
+            for (agent, context_docs, cache_key), resp in zip(pending, responses)
+        }
+    
+    def _fused_contribute(self, agents: List[CollaborativeAgent], user_input: str,
+                          task_description: str,
+                          nlp_hints: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Ask for every expert's insight in a single LLM call.
+        
+        The task and user message appear once, followed by one block per
+        role; the model answers with a JSON object keyed by role. Cached
+        experts are skipped, and roles missing from the answer are asked
+        again with their own prompts, submitted together as one batch.
+        """
+        results, pending = self._split_cached(agents, user_input, task_description)
+        
+        if len(pending) == 1:
+            agent = pending[0][0]
+            results[agent.agent_type] = agent.contribute(user_input, task_description, nlp_hints)
+        elif pending:
+            role_blocks = "".join(
+                f"\n### ROLE: {agent.agent_type}\n{agent.build_contribution_block(context_docs)}"
+                for agent, context_docs, _ in pending
+            )
+            roles = [agent.agent_type for agent, _, _ in pending]
+            prompt = f"""You are a panel of mental health experts. Each role below contributes separately.
+
+=== TASK ===
+{task_description}
+
+{CollaborativeAgent._hints_section(nlp_hints)}=== USER MESSAGE ===
+{user_input}
+{role_blocks}
+=== YOUR CONTRIBUTIONS ===
+For EACH role, provide ONE brief insight (1 sentence max) from that role's expertise.
+No explanations, no lists, no advice - just the key point.
+Reply with only a JSON object mapping each role to its insight, with keys: {', '.join(roles)}
+"""
+            per_role_tokens = max(agent.max_tokens_for(nlp_hints) for agent, _, _ in pending)
+            resp = self.llm.generate(prompt, max_tokens=per_role_tokens * len(pending), temperature=0.8)
+            insights = self._parse_fused_contributions(extract_text(resp))
+            
+            missing = []
+            for agent, context_docs, cache_key in pending:
+                text = insights.get(agent.agent_type)
+                if text:
+                    results[agent.agent_type] = agent._finish_contribution(text, context_docs, cache_key)
+                else:
+                    missing.append((agent, context_docs, cache_key))
+            results.update(self._contribute_pending(missing, user_input, task_description, nlp_hints))
+        
+        return [results[agent.agent_type] for agent in agents]
+    
+    @staticmethod
+    def _parse_fused_contributions(text: str) -> Dict[str, str]:
+        """Pull the {role: insight} object out of a fused reply; {} if unusable."""
+        try:
+            parsed = json.loads(_extract_json(text))
+        except ValueError:
+            return {}
+        if not isinstance(parsed, dict):
+            return {}
+        return {str(role): str(insight).strip() for role, insight in parsed.items()
+                if isinstance(insight, str) and insight.strip()}
+    
     def _build_synthesis_prompt(self, user_input: str, contributions: List[Dict], 
                                nlp_analysis: Dict = None, mood_guidance: Dict = None) -> str:
-        """Build prompt for master agent to synthesize contributions with NLP insights and mood tracking."""
-        prompt_parts = [self.master_prompt]
+        """Build the per-turn synthesis prompt; static instructions live in the system message."""
+        prompt_parts = []
         
         # Add conversation context from memory system
         context = self.memory.get_context_for_llm()
@@ -395,43 +911,23 @@ You are NOT a therapist. You are a friend who gets it."""
             prompt_parts.append(f"\n{context}")
         
         # Add repetition check - what suggestions AND questions were already made
-        recent_responses = [msg['content'] for msg in self.memory.get_recent_messages(6) if msg['role'] == 'Assistant']
+        recent_responses = self.memory.get_recent_tags(6)
         if recent_responses:
-            suggestions_made = []
-            questions_asked = []
-            
-            for resp in recent_responses:
-                resp_lower = resp.lower()
-                # Track suggestions
-                if 'journal' in resp_lower:
-                    suggestions_made.append('journaling')
-                if 'walk' in resp_lower or 'exercise' in resp_lower:
-                    suggestions_made.append('walking/exercise')
-                if 'breath' in resp_lower:
-                    suggestions_made.append('breathing exercises')
-                if 'therapist' in resp_lower or 'counselor' in resp_lower:
-                    suggestions_made.append('professional help')
-                if 'friend' in resp_lower or 'talk to' in resp_lower:
-                    suggestions_made.append('talking to someone')
-                if 'music' in resp_lower:
-                    suggestions_made.append('music/creative activities')
-                
-                # Track repeated question patterns
-                if 'what does' in resp_lower and 'mean to you' in resp_lower:
-                    questions_asked.append('"what does X mean to you?"')
-                if 'how' in resp_lower and 'feel' in resp_lower:
-                    questions_asked.append('"how do you feel?"')
-                if 'what' in resp_lower and 'been' in resp_lower:
-                    questions_asked.append('"what has been happening?"')
-                if 'can you tell me' in resp_lower:
-                    questions_asked.append('"can you tell me more?"')
+            # Tags are computed once when a response is stored; older sessions lack them
+            suggestions_made = {}
+            questions_asked = {}
+            for content, suggestion_tags, question_tags in recent_responses:
+                if suggestion_tags is None:
+                    suggestion_tags, question_tags = _response_tags(content)
+                suggestions_made.update(dict.fromkeys(suggestion_tags))
+                questions_asked.update(dict.fromkeys(question_tags))
             
             if suggestions_made or questions_asked:
                 repetition_warning = "\n=== AVOID REPETITION ==="
                 if suggestions_made:
-                    repetition_warning += f"\nAlready suggested: {', '.join(set(suggestions_made))}"
+                    repetition_warning += f"\nAlready suggested: {', '.join(suggestions_made)}"
                 if questions_asked:
-                    repetition_warning += f"\nAlready asked similar to: {', '.join(set(questions_asked))}"
+                    repetition_warning += f"\nAlready asked similar to: {', '.join(questions_asked)}"
                 repetition_warning += "\n⚠️ DO NOT repeat these. Ask NEW questions or shift the conversation."
                 prompt_parts.append(repetition_warning)
         
@@ -466,39 +962,10 @@ You are NOT a therapist. You are a friend who gets it."""
                 nlp_context += f"\nAll emotions detected: {', '.join(sentiment['emotions'])}"
             nlp_context += f"\nUrgency level: {sentiment.get('urgency', 'normal')}"
             
-            # Banned phrases enforcement
-            nlp_context += "\n\n🚫 NEVER USE: 'It sounds like', 'I can hear', 'When someone', 'It's normal', 'emotional state', 'vulnerability', 'process', 'therapeutic'"
-            nlp_context += "\n🚫 NEVER DIAGNOSE: 'depression', 'anxiety', 'dissociation', 'repression', 'PTSD', 'trauma'"
-            nlp_context += "\n✅ USE INSTEAD: 'Ouch', 'Damn', 'That's rough', 'I'd feel the same', 'going through tough time', 'feeling down', 'worried'"
-            nlp_context += "\n✅ THERAPIST MICRO-SKILLS: 1) Label emotion 2) Normalize it 3) Gentle specific question"
-            
-            # Context interpretation hints based on detected emotions
-            if sentiment.get('emotions'):
-                emotions = sentiment['emotions']
-                nlp_context += "\n\nEmotion-specific guidance:"
-                if 'betrayal' in emotions:
-                    nlp_context += "\n- Betrayal: Acknowledge trust violation directly, don't minimize"
-                if 'shame' in emotions:
-                    nlp_context += "\n- Shame: Normalize, de-stigmatize, validate experience"
-                if 'hurt' in emotions:
-                    nlp_context += "\n- Hurt: Acknowledge pain, don't rush to fix"
-                if 'anger' in emotions:
-                    nlp_context += "\n- Anger: Validate as protective response to violation"
-                if 'grief' in emotions:
-                    nlp_context += "\n- Grief: Honor the loss, don't rush healing"
-                if 'loneliness' in emotions:
-                    nlp_context += "\n- Loneliness: Acknowledge isolation, be present"
-            
             # Context clues from specific words
             nlp_context += "\n\nContext clues:"
-            if 'broke' in user_input.lower() or 'smashed' in user_input.lower():
-                nlp_context += "\n- Physical destruction = anger release/overwhelm (NOT resilience metaphor)"
-            if 'dream' in user_input.lower():
-                nlp_context += "\n- Dreams about person = unresolved attachment (address directly)"
-            if 'hate' in user_input.lower():
-                nlp_context += "\n- 'Hate' = deep hurt underneath (explore hurt, not hate)"
-            if 'secret' in user_input.lower() or 'betray' in user_input.lower():
-                nlp_context += "\n- Betrayal = trust wound (needs acknowledgment of violation)"
+            clue_lines = {_CLUE_LINES[m.group().lower()] for m in _CLUE_RE.finditer(user_input)}
+            nlp_context += "".join(f"\n- {line}" for _, line in CONTEXT_CLUES if line in clue_lines)
             
             # Extract user's key phrases for mirroring
             recent_user_messages = [msg['content'] for msg in self.memory.get_recent_messages(3) if msg['role'] == 'User']
@@ -536,103 +1003,14 @@ You are NOT a therapist. You are a friend who gets it."""
         # Count how many messages in this conversation
         message_count = len(self.memory.messages)
         
-        # Detect if user is expressing deep emotion vs asking for help
-        user_lower = user_input.lower()
-        asking_for_help = any(phrase in user_lower for phrase in [
-            'what should i do', 'what can i do', 'help me', 'any advice', 'suggestions', 'what do you think'
-        ])
-        rejecting_advice = any(phrase in user_lower for phrase in [
-            'tried that', 'doesn\'t work', 'not helping', 'already doing', 'i dont like', 'better suggestions'
-        ])
-        expressing_emotion = any(phrase in user_lower for phrase in [
-            'feel', 'miss', 'hurt', 'pain', 'sad', 'scared', 'alone', 'lost', 'empty', 'dream'
-        ])
-        
         if message_count <= 2:  # First interaction
-            prompt_parts.append("""First message - be human.
-
-1-2 sentences max.
-Micro-empathy: "That sounds hard." "Ouch."
-One tiny question.
-
-NO: "It takes courage", "I hear you", formal validation
-
-Good: "That sounds hard. What's hitting you hardest?"
-
-Your response:""")
-        elif expressing_emotion and not asking_for_help:  # User sharing feelings
-            # Detect emotional intensity for mirroring
-            high_intensity_words = ['hate', 'rage', 'furious', 'can\'t take it', 'breaking', 'destroyed', 'betray']
-            medium_intensity_words = ['hurt', 'pain', 'sad', 'miss', 'alone', 'lost']
-            
-            high_intensity = any(word in user_lower for word in high_intensity_words)
-            medium_intensity = any(word in user_lower for word in medium_intensity_words)
-            
-            if high_intensity:
-                prompt_parts.append("""HIGH EMOTION - use therapist micro-skills.
-
-Structure (1-2 sentences):
-1. Emotion labeling: "That's [hurt/anger/betrayal]."
-2. Normalize: "Makes sense you'd feel that."
-3. Maybe pause, maybe tiny question.
-
-Good examples:
-"That's betrayal. Makes sense you'd feel that way."
-"Ouch. Anyone would be hurt by that."
-"Damn. That would hit me hard too."
-
-Your response:""")
-            elif medium_intensity:
-                prompt_parts.append("""Medium emotion - therapist micro-skills.
-
-Structure (2-3 sentences):
-1. Emotion labeling + normalize: "That sounds like grief. It's normal to miss someone."
-2. Gentle validation: "Anyone would feel that."
-3. Specific gentle question: "What part do you miss most?"
-
-Good: "That sounds like grief. Missing someone you connected with - that's normal. What do you miss most?"
-
-NO clinical terms, NO templates.
-
-Your response:""")
-            else:
-                prompt_parts.append("""Low emotion - you can explore a bit.
-
-2-3 sentences.
-Stay conversational.
-No templates.
-
-Your response:""")
-        elif rejecting_advice:  # User rejected previous suggestions
-            prompt_parts.append("""User rejected advice - acknowledge simply.
-
-"Fair. What would help?"
-
-That's it. No apologies, no essays.
-
-Your response:""")
-        elif asking_for_help and message_count >= 6:  # User explicitly asking for help
-            prompt_parts.append("""User wants ideas - give them.
-
-1. One line about their situation
-2. One specific idea for THEIR context
-3. Why it might help
-
-2-3 sentences total.
-No generic advice.
-Use their words and situation.
-
-Example: "Seeing her daily while healing - that's hard. Could you shift your route to cross paths less? Even small distance helps."
-
-Your response:""")
-        else:  # General conversation
-            prompt_parts.append("""Keep it real.
-
-1-2 sentences.
-Stay human.
-No templates.
-
-Your response:""")
+            prompt_parts.append(TASK_TEMPLATES['first'])
+        else:
+            # One scan ORs together the cue bits of every keyword found (bits are distinct)
+            cues = sum(scan_keywords(_CUE_MATCHER, user_input.lower()))
+            if message_count >= 6:
+                cues |= CUE_ESTABLISHED
+            prompt_parts.append(_TASK_BY_CUES[cues])
         
         return "".join(prompt_parts)
     
@@ -640,20 +1018,14 @@ Your response:""")
         """Build message list with conversation history for LLM."""
         messages = []
         
-        # Add system message with master prompt
+        # Add the constant system prefix so its prompt-cache entry is reused across turns
         messages.append({
             "role": "system",
-            "content": self.master_prompt
+            "content": self._static_system
         })
         
-        # Add conversation history (last 10 messages for context)
-        recent_messages = self.memory.get_recent_messages(count=10)
-        for msg in recent_messages:
-            role = "user" if msg['role'] == "User" else "assistant"
-            messages.append({
-                "role": role,
-                "content": msg['content']
-            })
+        # Add as much recent conversation history as fits the token budget
+        messages.extend(self.memory.get_recent_within_budget(self.HISTORY_TOKEN_BUDGET))
         
         # Add current synthesis prompt as user message
         messages.append({
@@ -662,20 +1034,3 @@ Your response:""")
         })
         
         return messages
-    
-    def _extract_text(self, resp: Dict[str, Any]) -> str:
-        """Extract text from LLM response."""
-        if isinstance(resp, dict):
-            if 'choices' in resp and resp['choices']:
-                choice = resp['choices'][0]
-                if 'message' in choice:
-                    return choice['message'].get('content', '')
-                elif 'text' in choice:
-                    return choice['text']
-            elif 'candidates' in resp and resp['candidates']:
-                candidate = resp['candidates'][0]
-                if 'content' in candidate:
-                    content = candidate['content']
-                    if 'parts' in content and content['parts']:
-                        return content['parts'][0].get('text', '')
-        return str(resp)
@@ -1,11 +1,26 @@
 """
 Conversation memory management with automatic summarization and storage.
 Maintains full chat history and creates summaries after every 10 messages.
+Once the history nears its token budget, older assistant replies are folded
+into one capped running summary while user messages stay verbatim.
+
+Sessions are stored as sessions/<id>.jsonl, one message per line, appended
+as messages arrive, next to a small sessions/<id>.meta.json holding the
+summaries, which is rewritten only when they change.
 """
-import json
 import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+
+import orjson
+
+from llm_clients import extract_text
+
+# Periodic summaries are written off the add_message path, one at a time
+_SUMMARY_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summary")
 
 
 class ConversationMemory:
@@ -19,12 +34,41 @@ class ConversationMemory:
         self.message_count = 0
         self.summary_interval = 10
         
+        # Column view of self.messages for hot scans (role, content, repetition tags)
+        self._roles: List[str] = []
+        self._contents: List[str] = []
+        self._suggestion_tags: List[Optional[tuple]] = []
+        self._question_tags: List[Optional[tuple]] = []
+        # Chat-API {'role', 'content'} dict per message, extended as messages arrive
+        self._llm_view: List[Dict[str, str]] = []
+        # get_context_for_llm() result, dropped whenever messages or summaries change
+        self._context_cache: Optional[str] = None
+        # Summary and assistant-history fold being written in the background, and the
+        # lock for the summaries, the assistant summary and the meta file
+        self._pending_summary: Optional[Future] = None
+        self._pending_compression: Optional[Future] = None
+        self._meta_lock = threading.RLock()
+        
+        # Asymmetric compression: user messages stay verbatim, assistant replies older
+        # than the last few turns collapse into one summary of bounded length
+        self.context_token_limit = 3000
+        self.compress_threshold = 0.8
+        self.keep_recent_turns = 6
+        self.min_compress_tokens = 300
+        self.max_assistant_summary_chars = 600
+        self.assistant_summary = ''
+        self.assistant_tokens_estimate = 0  # Assistant replies not yet folded into the summary
+        self._user_tokens_estimate = 0
+        self._assistant_compacted = 0  # Assistant replies before this index are summarized
+        
         # Create storage directory
         os.makedirs('sessions', exist_ok=True)
-        self.session_file = f'sessions/{self.session_id}.json'
+        self.session_file = _messages_path(self.session_id)
+        self.meta_file = _meta_path(self.session_id)
         
-        # Load existing session if present
+        # Load existing session if present, then keep the message log open for appends
         self._load_session()
+        self._log = _open_log(self.session_file)
     
     def add_message(self, role: str, content: str, metadata: Dict = None):
         """Add a message to conversation history."""
@@ -35,19 +79,97 @@ class ConversationMemory:
             'metadata': metadata or {}
         }
         self.messages.append(message)
+        self._index_message(message)
         self.message_count += 1
+        self._context_cache = None
+        self._log.write(_dump_line(message))
         
-        # Auto-summarize every 10 messages
+        # Auto-summarize every 10 messages, in the background; readers of the
+        # summaries wait for it, so it overlaps with the rest of the turn
         if self.message_count % self.summary_interval == 0:
-            self._create_summary()
+            self._pending_summary = _SUMMARY_POOL.submit(
+                self._create_summary, self.messages[-self.summary_interval:], len(self.messages)
+            )
         
-        self._save_session()
+        self._compress_assistant_history()
+    
+    def _index_message(self, message: Dict[str, Any]):
+        """Append a message to the column view."""
+        metadata = message.get('metadata') or {}
+        tagged = 'suggestion_tags' in metadata
+        self._roles.append(message['role'])
+        self._contents.append(message['content'])
+        self._suggestion_tags.append(tuple(metadata['suggestion_tags']) if tagged else None)
+        self._question_tags.append(tuple(metadata.get('question_tags', ())) if tagged else None)
+        if message['role'] == 'Assistant':
+            with self._meta_lock:  # A background fold subtracts from it
+                self.assistant_tokens_estimate += len(message['content']) // 4
+        else:
+            self._user_tokens_estimate += len(message['content']) // 4
     
-    def _create_summary(self):
-        """Create summary of recent conversation."""
-        # Get last 10 messages for summary
-        recent_messages = self.messages[-self.summary_interval:]
+    def _assistant_tokens(self, start: int, stop: int) -> int:
+        """Estimated tokens of the assistant messages in self.messages[start:stop]."""
+        return sum(
+            len(content) // 4
+            for role, content in zip(self._roles[start:stop], self._contents[start:stop])
+            if role == 'Assistant'
+        )
+    
+    def _compress_assistant_history(self):
+        """
+        Start folding assistant replies older than the recent turns into the
+        running summary, in the background so the turn does not wait on the LLM.
+        """
+        history_tokens = self._user_tokens_estimate + self.assistant_tokens_estimate
+        if history_tokens <= self.compress_threshold * self.context_token_limit:
+            return
+        if self._pending_compression is not None and not self._pending_compression.done():
+            return  # The previous fold has not landed yet
+        
+        # Never touch the last keep_recent_turns turns, however long early messages are
+        start = self._assistant_compacted
+        cutoff = max(0, len(self.messages) - 2 * self.keep_recent_turns)
+        if cutoff <= start:
+            return
+        old_tokens = self._assistant_tokens(start, cutoff)
+        if old_tokens < self.min_compress_tokens:
+            return  # Too little to be worth a summarization call yet
         
+        replies = [
+            content
+            for role, content in zip(self._roles[start:cutoff], self._contents[start:cutoff])
+            if role == 'Assistant'
+        ]
+        self._pending_compression = _SUMMARY_POOL.submit(
+            self._fold_assistant_replies, replies, old_tokens, cutoff
+        )
+    
+    def _fold_assistant_replies(self, replies: List[str], old_tokens: int, cutoff: int):
+        """Merge replies (the assistant messages before cutoff) into the running summary."""
+        replies_text = "\n".join(f"- {content}" for content in replies)
+        summary_prompt = f"""Update this running summary of what the assistant already said in a mental health conversation.
+Keep it under {self.max_assistant_summary_chars} characters.
+Focus on: suggestions offered, questions asked, reassurance or commitments given.
+
+Current summary:
+{self.assistant_summary or '(none yet)'}
+
+New assistant replies:
+{replies_text}
+
+Updated summary:"""
+        
+        resp = self.llm.generate(summary_prompt, max_tokens=150)
+        
+        with self._meta_lock:
+            # Hard cap so the summary cannot grow with the session
+            self.assistant_summary = extract_text(resp).strip()[:self.max_assistant_summary_chars]
+            self.assistant_tokens_estimate -= old_tokens
+            self._assistant_compacted = cutoff
+            self._save_meta()
+    
+    def _create_summary(self, recent_messages: List[Dict[str, Any]], end: int):
+        """Create summary of recent_messages, the last 10 of the first end messages."""
         conversation_text = "\n".join([
             f"{msg['role']}: {msg['content']}" 
             for msg in recent_messages
@@ -62,15 +184,30 @@ Conversation:
 Summary:"""
         
         resp = self.llm.generate(summary_prompt, max_tokens=150)
-        summary = self._extract_text(resp)
-        
-        self.summaries.append({
-            'timestamp': datetime.now().isoformat(),
-            'message_range': f"{len(self.messages) - self.summary_interval + 1}-{len(self.messages)}",
-            'summary': summary
-        })
+        summary = extract_text(resp)
         
-        self._save_session()
+        with self._meta_lock:
+            self.summaries.append({
+                'timestamp': datetime.now().isoformat(),
+                'message_range': f"{end - self.summary_interval + 1}-{end}",
+                'summary': summary
+            })
+            self._context_cache = None
+            self._save_meta()
+    
+    def wait_for_summary(self):
+        """Block until a summary started by add_message has been stored."""
+        pending = self._pending_summary
+        if pending is not None:
+            self._pending_summary = None
+            pending.result()
+    
+    def wait_for_compression(self):
+        """Block until an assistant-history fold started by add_message has been stored."""
+        pending = self._pending_compression
+        if pending is not None:
+            self._pending_compression = None
+            pending.result()
     
     def get_recent_messages(self, count: int = 6) -> List[Dict[str, Any]]:
         """Get recent messages for NLP analysis."""
@@ -79,8 +216,76 @@ Summary:"""
         recent_start = max(0, len(self.messages) - count)
         return self.messages[recent_start:]
     
+    def _sync_llm_view(self) -> List[Dict[str, str]]:
+        """Extend the chat-API view with any messages added since the last call."""
+        view = self._llm_view
+        for message in self.messages[len(view):]:
+            view.append({
+                'role': 'user' if message['role'] == 'User' else 'assistant',
+                'content': message['content']
+            })
+        return view
+    
+    def get_llm_view(self, count: int = 10) -> List[Dict[str, str]]:
+        """
+        Last count messages as chat-API {'role': 'user'|'assistant', 'content'} dicts.
+        Each dict is built once and shared between calls, so treat them as read-only.
+        """
+        view = self._sync_llm_view()
+        return view[max(0, len(view) - count):]
+    
+    def get_recent_within_budget(self, budget_tokens: int = 3000) -> List[Dict[str, str]]:
+        """
+        The most recent messages (as in get_llm_view) that fit in budget_tokens,
+        oldest first. Tokens are estimated as len(content) // 4. Summarized
+        assistant replies are skipped; the summary leads as one system message.
+        """
+        view = self._sync_llm_view()
+        # Read the summary and the replies it covers together, as a fold may land mid-call
+        with self._meta_lock:
+            assistant_summary, compacted = self.assistant_summary, self._assistant_compacted
+        summary_message = None
+        if assistant_summary:
+            summary_message = {
+                'role': 'system',
+                'content': f"Summary of your earlier replies: {assistant_summary}"
+            }
+            budget_tokens -= len(summary_message['content']) // 4
+        
+        recent = []
+        for i in range(len(view) - 1, -1, -1):
+            if i < compacted and self._roles[i] == 'Assistant':
+                continue
+            cost = len(view[i]['content']) // 4
+            if cost > budget_tokens:
+                break
+            budget_tokens -= cost
+            recent.append(view[i])
+        recent.reverse()
+        
+        return [summary_message] + recent if summary_message else recent
+    
+    def get_recent_tags(self, count: int = 6, role: str = 'Assistant') -> List[tuple]:
+        """
+        (content, suggestion_tags, question_tags) for role's messages among the last count.
+        Tags are None for messages stored without them (older sessions).
+        """
+        start = max(0, len(self._roles) - count)
+        return [
+            (content, suggestion_tags, question_tags)
+            for message_role, content, suggestion_tags, question_tags in zip(
+                self._roles[start:], self._contents[start:],
+                self._suggestion_tags[start:], self._question_tags[start:]
+            )
+            if message_role == role
+        ]
+    
     def get_context_for_llm(self) -> str:
         """Get optimized context for LLM (summaries + recent messages)."""
+        self.wait_for_summary()
+        if self._context_cache is not None:
+            return self._context_cache
+        
         context_parts = []
         
         # Add all summaries for long-term context
@@ -96,43 +301,133 @@ Summary:"""
             for msg in self.messages[recent_start:]:
                 context_parts.append(f"{msg['role']}: {msg['content'][:200]}")
         
-        return "\n".join(context_parts)
+        self._context_cache = "\n".join(context_parts)
+        return self._context_cache
     
-    def _save_session(self):
-        """Save session to disk."""
-        session_data = {
-            'session_id': self.session_id,
-            'messages': self.messages,
-            'summaries': self.summaries,
-            'message_count': self.message_count,
-            'last_updated': datetime.now().isoformat()
-        }
-        
-        with open(self.session_file, 'w', encoding='utf-8') as f:
-            json.dump(session_data, f, indent=2, ensure_ascii=False)
+    def _save_meta(self):
+        """Rewrite the session's summary file (messages are appended separately)."""
+        with self._meta_lock:
+            meta = {
+                'session_id': self.session_id,
+                'summaries': self.summaries,
+                'assistant_summary': self.assistant_summary,
+                'assistant_compacted': self._assistant_compacted
+            }
+            tmp_file = f"{self.meta_file}.tmp"
+            with open(tmp_file, 'wb') as f:
+                f.write(orjson.dumps(meta, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+            os.replace(tmp_file, self.meta_file)
     
     def _load_session(self):
-        """Load existing session from disk."""
-        if os.path.exists(self.session_file):
-            with open(self.session_file, 'r', encoding='utf-8') as f:
-                session_data = json.load(f)
-                self.messages = session_data.get('messages', [])
-                self.summaries = session_data.get('summaries', [])
-                self.message_count = session_data.get('message_count', 0)
-    
-    def _extract_text(self, resp: Dict[str, Any]) -> str:
-        """Extract text from LLM response."""
-        if isinstance(resp, dict):
-            if 'choices' in resp and resp['choices']:
-                choice = resp['choices'][0]
-                if 'message' in choice:
-                    return choice['message'].get('content', '')
-                elif 'text' in choice:
-                    return choice['text']
-            elif 'candidates' in resp and resp['candidates']:
-                candidate = resp['candidates'][0]
-                if 'content' in candidate:
-                    content = candidate['content']
-                    if 'parts' in content and content['parts']:
-                        return content['parts'][0].get('text', '')
-        return str(resp)
+        """Load existing session from disk, converting a legacy single-file session."""
+        session_data = load_session_data(self.session_id)
+        if session_data is None:
+            return
+        
+        self.messages = session_data['messages']
+        self.summaries = session_data['summaries']
+        self.message_count = session_data['message_count']
+        self.assistant_summary = session_data.get('assistant_summary', '')
+        # Clamped: sessions saved before the cutoff was clamped may hold a negative index
+        self._assistant_compacted = max(0, session_data.get('assistant_compacted', 0))
+        for message in self.messages:
+            self._index_message(message)
+        self.assistant_tokens_estimate -= self._assistant_tokens(0, self._assistant_compacted)
+        
+        if not os.path.exists(self.session_file):
+            self._migrate()
+    
+    def _migrate(self):
+        """Write a session loaded from a legacy sessions/<id>.json in the log format."""
+        with open(self.session_file, 'wb') as f:
+            f.write(b''.join(_dump_line(message) for message in self.messages))
+        self._save_meta()
+
+
+def _messages_path(session_id: str) -> str:
+    return f'sessions/{session_id}.jsonl'
+
+
+def _meta_path(session_id: str) -> str:
+    return f'sessions/{session_id}.meta.json'
+
+
+def _dump_line(message: Dict[str, Any]) -> bytes:
+    """One message as a JSONL record."""
+    return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) + b'\n'
+
+
+def _open_log(path: str):
+    """Open the message log for unbuffered appends, ending any torn last line first."""
+    log = open(path, 'ab', buffering=0)
+    if log.tell() > 0:
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                log.write(b'\n')
+    return log
+
+
+def _read_log(path: str, tail: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Messages from a JSONL log and how many it holds, skipping a record torn by
+    an interrupted write. With tail, only the last tail records are parsed;
+    the rest are counted line by line without being decoded.
+    """
+    with open(path, 'rb') as f:
+        if tail is None:
+            lines = f
+        else:
+            lines = deque(maxlen=tail)
+            complete = 0
+            for line in f:
+                # Counted without decoding; a torn record never ends its object
+                if line.endswith(b'}\n'):
+                    complete += 1
+                    lines.append(line)
+        
+        messages = []
+        for line in lines:
+            try:
+                messages.append(orjson.loads(line))
+            except orjson.JSONDecodeError:
+                continue  # Blank or partially written line
+    return messages, len(messages) if tail is None else complete
+
+
+def load_session_data(session_id: str, tail: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Read a stored session without opening it for writing; None if absent.
+    Returns session_id, messages, summaries, message_count and last_updated,
+    plus the assistant summary state. With tail, messages holds only the last
+    tail messages while message_count still covers the whole session.
+    """
+    messages_file = _messages_path(session_id)
+    if os.path.exists(messages_file):
+        messages, message_count = _read_log(messages_file, tail)
+        meta = {}
+        if os.path.exists(_meta_path(session_id)):
+            with open(_meta_path(session_id), 'rb') as f:
+                meta = orjson.loads(f.read())
+        return {
+            'session_id': session_id,
+            'messages': messages,
+            'summaries': meta.get('summaries', []),
+            'message_count': message_count,
+            'assistant_summary': meta.get('assistant_summary', ''),
+            'assistant_compacted': meta.get('assistant_compacted', 0),
+            'last_updated': messages[-1]['timestamp'] if messages else None
+        }
+    
+    legacy_file = f'sessions/{session_id}.json'
+    if os.path.exists(legacy_file):
+        with open(legacy_file, 'rb') as f:
+            session_data = orjson.loads(f.read())
+        session_data.setdefault('messages', [])
+        session_data.setdefault('summaries', [])
+        session_data.setdefault('message_count', len(session_data['messages']))
+        if tail is not None:
+            session_data['messages'] = session_data['messages'][-tail:] if tail else []
+        return session_data
+    
+    return None
@@ -1,6 +1,81 @@
-import json
-from typing import Dict, Any, List
-from tools import *
+from typing import Dict, Any
+
+import orjson
+from llm_clients import extract_text
+from instrumentation.agent_tracing import TracedLLMClient
+from tools.base import BaseTool
+
+
+def _extract_json(text: str) -> str:
+    """
+    Pull the first JSON object out of an LLM reply, skipping any markdown
+    fence or surrounding prose. Braces inside strings are ignored; if the
+    object is never closed the rest of the text is returned for the parser
+    to reject.
+    """
+    text = text.strip()
+    
+    # Remove markdown code blocks
+    fence = text.find("```")
+    if fence != -1:
+        body = text[fence + 3:]
+        body = body.removeprefix("json")
+        end = body.find("```")
+        text = (body if end == -1 else body[:end]).strip()
+    
+    start = text.find("{")
+    if start == -1:
+        return text
+    
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return text[start:]
+
+
+def _validate_plan(plan: Any) -> Dict[str, Any]:
+    """
+    Check a decoded plan in one pass and normalise it to the shape
+    ToolExecutionEngine relies on: every step a dict with a str "name"
+    and a dict "input". Malformed steps are dropped rather than failing
+    the whole plan; a malformed plan raises ValueError.
+    """
+    if not isinstance(plan, dict):
+        raise ValueError("plan must be a JSON object")
+    sequence = plan.get('tool_sequence')
+    if not isinstance(sequence, list):
+        raise ValueError("tool_sequence must be a list")
+    
+    steps = []
+    for step in sequence:
+        if not isinstance(step, dict) or not isinstance(step.get('name'), str):
+            continue
+        if not isinstance(step.get('input'), dict):
+            step['input'] = {}
+        steps.append(step)
+    plan['tool_sequence'] = steps
+    
+    if 'final_action' not in plan:
+        plan['final_action'] = 'MasterResponderTool'
+    return plan
+
 
 class Controller:
     """
@@ -29,9 +104,9 @@ AVAILABLE TOOLS:
 
 INPUT:
 {{
-"user_message": {{user_message_text}},
-"risk_level": {{risk_level}},
-"session_summary": {{session_summary}}
+"user_message": {user_message_text},
+"risk_level": {risk_level},
+"session_summary": {session_summary}
 }}
 
 TASK:
@@ -49,6 +124,16 @@ OUTPUT FORMAT (STRICT JSON, NO MARKDOWN):
 
 REMEMBER: Output ONLY the JSON object above. No ```json``` markers, no explanations.
 """
+        
+        # The registry is fixed after construction, so fill in the tool list once
+        # and split the prompt around the per-turn fields; decide() only joins
+        self._tool_desc = self._get_tool_descriptions()
+        template = self.system_prompt.replace(
+            "{tool_descriptions}", self._tool_desc.replace("{", "{{").replace("}", "}}")
+        )
+        self._prompt_parts = template.format(
+            user_message_text="\0", risk_level="\0", session_summary="\0"
+        ).split("\0")
 
     def _get_tool_descriptions(self) -> str:
         descriptions = []
@@ -60,51 +145,23 @@ REMEMBER: Output ONLY the JSON object above. No ```json``` markers, no explanati
         """
         Decide on the tool sequence.
         """
-        tool_desc = self._get_tool_descriptions()
-        prompt = self.system_prompt.format(
-            tool_descriptions=tool_desc,
-            user_message_text=json.dumps(user_input),
-            risk_level=risk_level,
-            session_summary=session_summary
-        )
-        
-        response = self.llm.generate(prompt, max_tokens=500, temperature=0.0) # Low temp for deterministic JSON
-        
-        text = ""
-        if isinstance(response, dict):
-             if 'choices' in response and response['choices']:
-                text = response['choices'][0]['message']['content']
-             elif 'candidates' in response and response['candidates']:
-                text = response['candidates'][0]['content']['parts'][0]['text']
-        else:
-            text = str(response)
-        
-        # Clean up and extract JSON
-        text = text.strip()
+        before_message, before_risk, before_summary, after_summary = self._prompt_parts
+        prompt = "".join((
+            before_message, orjson.dumps(user_input).decode(),
+            before_risk, orjson.dumps(risk_level).decode(),
+            before_summary, orjson.dumps(session_summary).decode(),
+            after_summary
+        ))
         
-        # Remove markdown code blocks
-        if "```json" in text:
-            text = text.split("```json")[1].split("```")[0].strip()
-        elif "```" in text:
-            text = text.split("```")[1].split("```")[0].strip()
+        # A traced client's semantic cache compares turns by the user message, not the shared template
+        cache_hint = {"cache_text": user_input} if isinstance(self.llm, TracedLLMClient) else {}
+        response = self.llm.generate(prompt, max_tokens=500, temperature=0.0, **cache_hint) # Low temp for deterministic JSON
         
-        # Try to extract JSON object if there's extra text
-        import re
-        json_match = re.search(r'\{[\s\S]*\}', text)
-        if json_match:
-            text = json_match.group(0)
+        text = _extract_json(extract_text(response))
         
         try:
-            plan = json.loads(text)
-            
-            # Validate plan structure
-            if not isinstance(plan.get('tool_sequence'), list):
-                raise ValueError("tool_sequence must be a list")
-            if 'final_action' not in plan:
-                plan['final_action'] = 'MasterResponderTool'
-            
-            return plan
-        except (json.JSONDecodeError, ValueError) as e:
+            return _validate_plan(orjson.loads(text))
+        except (orjson.JSONDecodeError, ValueError) as e:
             # Fallback plan if JSON fails
             print(f"⚠️  Error parsing JSON plan: {str(e)[:100]}")
             print(f"Raw response (first 200 chars): {text[:200]}")
@@ -1,39 +1,75 @@
-from typing import Dict, Any, List
-from tools import BaseTool
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+import orjson
+
+from tools.base import BaseTool
+
+# Shared by every engine; tools are mostly I/O-bound (LLM, retrieval)
+_TOOL_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tool")
+
+# Longest serialised tool result passed on to the Master Responder
+MAX_RESULT_CHARS = 2000
+
+_MASTER_TASK = """=== TASK ===
+Generate a supportive, empathetic response based on the above information.
+Keep it concise (under 150 words).
+Do not be prescriptive or diagnostic."""
 
 class ToolExecutionEngine:
     """
     Executes the tool sequence defined by the Controller.
     """
     
+    # Tools whose output depends only on their input, so a repeat call can be
+    # answered from memory. AssessmentTool records symptom history and
+    # MemoryWriteTool writes state, so both always run.
+    CACHEABLE_TOOLS = frozenset({
+        "EmotionTool", "SentimentTool", "PatternDetectorTool", "InterventionSelectorTool"
+    })
+    CACHE_SIZE = 256
+    
+    # Analysis tools that read the user's message when the plan gives no text
+    TEXT_INPUT_TOOLS = frozenset({"EmotionTool", "SentimentTool", "AssessmentTool"})
+    
+    # Tools with no side effects on shared state, safe to run side by side.
+    # MemoryWriteTool, AssessmentTool (it records symptoms in a tracker shared
+    # by every call) and the final MasterResponderTool always run serially.
+    PARALLEL_SAFE_TOOLS = frozenset({
+        "EmotionTool", "SentimentTool", "PatternDetectorTool",
+        "InterventionSelectorTool", "MemoryReadTool", "TherapyTool", "ResourceTool"
+    })
+    
     def __init__(self, tool_registry: Dict[str, BaseTool]):
         self.tool_registry = tool_registry
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_lock = threading.Lock()
 
     def execute_plan(self, plan: Dict[str, Any], user_input: str, context: Dict[str, Any]) -> Dict[str, Any]:
         """
         Execute the tools in the plan and aggregate results.
+        Expects a plan as returned by Controller.decide(): every step has
+        a "name" and an "input" dict.
         """
         results = {}
         tool_sequence = plan.get("tool_sequence", [])
         
-        # 1. Execute intermediate tools
+        # 1. Execute intermediate tools. Consecutive parallel-safe steps run
+        # concurrently; anything else waits for them and runs on its own, so
+        # results keep the plan's order.
+        batch = []
         for step in tool_sequence:
-            tool_name = step.get("name")
-            tool_input = step.get("input", {})
-            
-            # Inject text if missing and needed (common for analysis tools)
-            if "text" not in tool_input and tool_name in ["EmotionTool", "SentimentTool", "AssessmentTool"]:
-                tool_input["text"] = user_input
-            
-            if tool_name in self.tool_registry:
-                tool = self.tool_registry[tool_name]
-                try:
-                    output = tool.execute(tool_input)
-                    results[tool_name] = output
-                except Exception as e:
-                    results[tool_name] = {"error": str(e)}
-            else:
-                results[tool_name] = {"error": "Tool not found"}
+            if step["name"] in self.PARALLEL_SAFE_TOOLS:
+                batch.append(step)
+                continue
+            self._run_batch(batch, user_input, results)
+            batch = []
+            tool_name, output = self._run_step(step, user_input)
+            results[tool_name] = output
+        self._run_batch(batch, user_input, results)
                 
         # 2. Execute Final Action (MasterResponder)
         final_action = plan.get("final_action")
@@ -54,29 +90,84 @@ class ToolExecutionEngine:
             "final_response": final_response
         }
 
+    def _run_batch(self, steps: List[Dict[str, Any]], user_input: str, results: Dict[str, Any]):
+        """Run independent steps concurrently and record their outputs in plan order."""
+        if len(steps) == 1:
+            outputs = [self._run_step(steps[0], user_input)]
+        elif steps:
+            outputs = _TOOL_POOL.map(lambda s: self._run_step(s, user_input), steps)
+        else:
+            return
+        for tool_name, output in outputs:
+            results[tool_name] = output
+
+    def _run_step(self, step: Dict[str, Any], user_input: str) -> Tuple[str, Dict[str, Any]]:
+        """Execute one plan step, answering deterministic tools from the cache."""
+        tool_name = step["name"]
+        tool_input = step["input"]
+        
+        # Inject text if missing and needed (common for analysis tools)
+        if tool_name in self.TEXT_INPUT_TOOLS and "text" not in tool_input:
+            tool_input["text"] = user_input
+        
+        if tool_name not in self.tool_registry:
+            return tool_name, {"error": "Tool not found"}
+        
+        key = self._cache_key(tool_name, tool_input)
+        if key is not None:
+            with self._cache_lock:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    return tool_name, self._cache[key]
+        try:
+            output = self.tool_registry[tool_name].execute(tool_input)
+        except Exception as e:
+            return tool_name, {"error": str(e)}
+        if key is not None:
+            self._remember(key, output)
+        return tool_name, output
+
+    def _cache_key(self, tool_name: str, tool_input: Dict[str, Any]) -> Optional[bytes]:
+        """Hash a deterministic tool call, or return None if it must always run."""
+        if tool_name not in self.CACHEABLE_TOOLS:
+            return None
+        try:
+            payload = orjson.dumps(tool_input, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            return None  # Input not JSON-serialisable, so no stable key
+        return hashlib.blake2b(tool_name.encode() + b"\0" + payload, digest_size=16).digest()
+
+    def _remember(self, key: bytes, output: Dict[str, Any]):
+        """Store a tool result, evicting the least recently used one when full."""
+        with self._cache_lock:
+            self._cache[key] = output
+            if len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+
     def _build_master_context(self, user_input: str, tool_results: Dict[str, Any], context: Dict[str, Any]) -> str:
         """
         Construct the prompt context for the Master Responder.
         """
-        lines = []
-        lines.append("=== USER MESSAGE ===")
-        lines.append(user_input)
-        lines.append("")
-        
-        lines.append("=== CONTEXT ===")
-        lines.append(f"Risk Level: {context.get('risk_level', 'unknown')}")
-        lines.append(f"Session Summary: {context.get('session_summary', 'None')}")
-        lines.append("")
-        
-        lines.append("=== TOOL RESULTS ===")
+        parts = [
+            "=== USER MESSAGE ===",
+            user_input,
+            "",
+            "=== CONTEXT ===",
+            f"Risk Level: {context.get('risk_level', 'unknown')}",
+            f"Session Summary: {context.get('session_summary', 'None')}",
+            "",
+            "=== TOOL RESULTS ===",
+        ]
         for tool_name, result in tool_results.items():
-            lines.append(f"[{tool_name}]")
-            lines.append(str(result))
-            lines.append("")
-            
-        lines.append("=== TASK ===")
-        lines.append("Generate a supportive, empathetic response based on the above information.")
-        lines.append("Keep it concise (under 150 words).")
-        lines.append("Do not be prescriptive or diagnostic.")
+            parts.append(f"[{tool_name}]\n{_format_result(result)}\n")
+        parts.append(_MASTER_TASK)
         
-        return "\n".join(lines)
+        return "\n".join(parts)
+
+
+def _format_result(result: Any) -> str:
+    """A tool result as compact JSON, cut to MAX_RESULT_CHARS so one tool cannot flood the prompt."""
+    text = orjson.dumps(result, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS, default=str).decode()
+    if len(text) > MAX_RESULT_CHARS:
+        text = text[:MAX_RESULT_CHARS] + "…"
+    return text
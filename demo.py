@@ -29,9 +29,12 @@ print("  3. Output Safety (Stage 3)\n")
 # Import components
 from llm_clients import GroqClient, GeminiClient
 from safety import ImmediateCrisisDetector, ContentModeration, InputSanitizer, OutputSafetyScrubber
-from tools import *
+from tools import (
+    EmotionTool, SentimentTool, MemoryReadTool, MemoryWriteTool, PatternDetectorTool,
+    InterventionSelectorTool, AssessmentTool, TherapyTool, ResourceTool, MasterResponderTool
+)
 from core import Controller, ToolExecutionEngine
-from instrumentation import create_traced_client, TraceStore
+from instrumentation import create_traced_client, TraceStore, SemanticCache, PromptCache
 
 def select_llm():
     provider = os.getenv('LLM_PROVIDER', 'groq').lower()
@@ -138,9 +141,15 @@ def main():
     base_controller_llm = select_llm()
     base_master_llm = select_master_llm()
     
+    # Optional response caches shared by both clients (ENABLE_LLM_CACHE, ENABLE_PROMPT_CACHE)
+    llm_cache = SemanticCache() if os.getenv('ENABLE_LLM_CACHE', 'false').lower() == 'true' else None
+    prompt_cache = PromptCache() if os.getenv('ENABLE_PROMPT_CACHE', 'false').lower() == 'true' else None
+    
     # Enable tracing if configured
-    controller_llm = create_traced_client(base_controller_llm, "Controller", trace_store)
-    master_llm = create_traced_client(base_master_llm, "MasterResponder", trace_store)
+    controller_llm = create_traced_client(base_controller_llm, "Controller", trace_store,
+                                          cache=llm_cache, exact_cache=prompt_cache)
+    master_llm = create_traced_client(base_master_llm, "MasterResponder", trace_store,
+                                      cache=llm_cache, exact_cache=prompt_cache)
     
     # Safety components
     crisis_detector = ImmediateCrisisDetector()
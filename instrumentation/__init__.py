@@ -3,5 +3,7 @@ Instrumentation package for Agent-Lightning integration.
 """
 from .agent_tracing import TracedLLMClient, create_traced_client
 from .trace_store import TraceStore
+from .semantic_cache import SemanticCache
+from .prompt_cache import PromptCache
 
-__all__ = ["TracedLLMClient", "create_traced_client", "TraceStore"]
+__all__ = ["TracedLLMClient", "create_traced_client", "TraceStore", "SemanticCache", "PromptCache"]
@@ -3,13 +3,21 @@ Lightweight tracing wrapper for LLM clients.
 Integrates with Agent-Lightning for optimization and training.
 """
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, List, Optional
+from llm_clients import LLMClient, extract_text
 from instrumentation.trace_store import TraceStore
+from instrumentation.semantic_cache import SemanticCache
+from instrumentation.prompt_cache import PromptCache
+
+
+def _chat_response(text: str) -> Dict[str, Any]:
+    """Wrap streamed text in the chat completion shape generate() returns."""
+    return {"choices": [{"message": {"content": text}}]}
 
 
 class TracedLLMClient:
     """
-    Wraps an LLM client to trace all generate() calls.
+    Wraps an LLM client to trace all generate() and stream() calls.
     This enables Agent-Lightning to collect training data.
     """
     
@@ -18,7 +26,9 @@ class TracedLLMClient:
         base_client, 
         component_name: str,
         trace_store: Optional[TraceStore] = None,
-        enabled: bool = None
+        enabled: bool = None,
+        cache: Optional[SemanticCache] = None,
+        exact_cache: Optional[PromptCache] = None
     ):
         """
         Args:
@@ -26,10 +36,21 @@ class TracedLLMClient:
             component_name: Name of the component using this client (e.g., "Controller", "MasterResponder")
             trace_store: TraceStore instance for saving traces
             enabled: Whether tracing is enabled (defaults to env var ENABLE_TRACING)
+            cache: Optional SemanticCache answering near-duplicate prompts without an API call
+            exact_cache: Optional PromptCache replaying identical temperature-0 calls
         """
         self.client = base_client
         self.component_name = component_name
         self.trace_store = trace_store or TraceStore()
+        self.cache = cache
+        self.exact_cache = exact_cache
+        
+        # Copy the commonly read client settings so they resolve as plain
+        # attributes instead of falling through to __getattr__ each time
+        for attr in ("model", "api_key", "api_url", "timeout"):
+            value = getattr(base_client, attr, None)
+            if value is not None:
+                setattr(self, attr, value)
         
         # Check if tracing is enabled
         if enabled is None:
@@ -42,28 +63,113 @@ class TracedLLMClient:
         
         Args:
             prompt: The prompt to send to the LLM
-            **kwargs: Additional arguments (max_tokens, temperature, messages, etc.)
-            
+            **kwargs: Additional arguments (max_tokens, temperature, messages, etc.);
+                no_cache=True bypasses both caches for this call, and cache_text
+                names the per-turn part of the prompt (e.g. the user message)
+                that the semantic cache compares instead of the whole prompt
+        
         Returns:
             LLM response (same format as base client)
         """
-        # If tracing is disabled, just pass through
-        if not self.enabled:
-            return self.client.generate(prompt, **kwargs)
+        cache_text = kwargs.pop("cache_text", None)
+        if kwargs.pop("no_cache", False):
+            return self._generate(prompt, **kwargs)
         
-        # Start trace
+        cached = self._cache_lookup(prompt, cache_text, **kwargs)
+        if cached is not None:
+            return cached
+        
+        response = self._generate(prompt, **kwargs)
+        self._cache_insert(prompt, response, cache_text, **kwargs)
+        return response
+    
+    def stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        """
+        Yield the response text in pieces, traced and cached like generate().
+        
+        A cache hit is yielded as a single piece. A streamed reply is cached
+        only once it has been read to the end; one stopped early is traced
+        with the text received so far. Clients without a streaming API fall
+        back to generate().
+        """
+        cache_text = kwargs.pop("cache_text", None)
+        use_cache = not kwargs.pop("no_cache", False)
+        
+        if use_cache:
+            cached = self._cache_lookup(prompt, cache_text, **kwargs)
+            if cached is not None:
+                yield extract_text(cached)
+                return
+        
+        base_stream = getattr(self.client, "stream", None)
+        if base_stream is None:
+            response = self._generate(prompt, **kwargs)
+            if use_cache:
+                self._cache_insert(prompt, response, cache_text, **kwargs)
+            yield extract_text(response)
+            return
+        
+        trace_id = self._start_trace(prompt, kwargs, stream=True) if self.enabled else None
+        pieces = []
+        error = None
+        completed = False
+        try:
+            for piece in base_stream(prompt, **kwargs):
+                pieces.append(piece)
+                yield piece
+            completed = True
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if trace_id is not None:
+                if error is None:
+                    self.trace_store.end_trace(trace_id=trace_id, response=_chat_response("".join(pieces)), reward=None)
+                else:
+                    self.trace_store.end_trace(trace_id=trace_id, response={"error": str(error)}, reward=-1.0)
+        
+        if completed and use_cache:
+            self._cache_insert(prompt, _chat_response("".join(pieces)), cache_text, **kwargs)
+    
+    def _cache_lookup(self, prompt: str, cache_text: Optional[str], **kwargs) -> Optional[Dict[str, Any]]:
+        # Identical deterministic calls first (a hash lookup), then near-duplicates
+        if self.exact_cache is not None:
+            cached = self.exact_cache.lookup(prompt, **kwargs)
+            if cached is not None:
+                return cached
+        if self.cache is not None:
+            return self.cache.lookup(prompt, cache_text=cache_text, **kwargs)
+        return None
+    
+    def _cache_insert(self, prompt: str, response: Dict[str, Any], cache_text: Optional[str], **kwargs):
+        if self.exact_cache is not None:
+            self.exact_cache.insert(prompt, response, **kwargs)
+        if self.cache is not None:
+            self.cache.insert(prompt, response, cache_text=cache_text, **kwargs)
+    
+    def _start_trace(self, prompt: str, kwargs: Dict[str, Any], stream: bool = False) -> str:
         metadata = {
             "model": getattr(self.client, "model", "unknown"),
             "max_tokens": kwargs.get("max_tokens", None),
             "temperature": kwargs.get("temperature", None),
             "has_messages": "messages" in kwargs
         }
+        if stream:
+            metadata["stream"] = True
         
-        trace_id = self.trace_store.start_trace(
+        return self.trace_store.start_trace(
             component=self.component_name,
             prompt=prompt,
             metadata=metadata
         )
+    
+    def _generate(self, prompt: str, **kwargs) -> Dict[str, Any]:
+        # If tracing is disabled, just pass through
+        if not self.enabled:
+            return self.client.generate(prompt, **kwargs)
+        
+        # Start trace
+        trace_id = self._start_trace(prompt, kwargs)
         
         try:
             # Call actual LLM
@@ -77,7 +183,7 @@ class TracedLLMClient:
             )
             
             return response
-            
+        
         except Exception as e:
             # Log error in trace
             self.trace_store.end_trace(
@@ -87,6 +193,13 @@ class TracedLLMClient:
             )
             raise
     
+    def generate_batch(self, prompts: List[str], max_workers: int = 8, **kwargs) -> List[Dict[str, Any]]:
+        """
+        Generate responses for many prompts, preserving order. Each prompt goes
+        through generate() so batched calls are cached and traced too.
+        """
+        return LLMClient.generate_batch(self, prompts, max_workers=max_workers, **kwargs)
+    
     def __getattr__(self, name):
         """
         Proxy other attributes to the base client.
@@ -98,16 +211,22 @@ class TracedLLMClient:
 def create_traced_client(
     base_client,
     component_name: str,
-    trace_store: Optional[TraceStore] = None
+    trace_store: Optional[TraceStore] = None,
+    cache: Optional[SemanticCache] = None,
+    exact_cache: Optional[PromptCache] = None
 ):
     """
     Factory function to create a traced client.
     
     Usage:
         llm = create_traced_client(GroqClient(), "Controller")
+        llm = create_traced_client(GroqClient(), "Controller", cache=SemanticCache())
+        llm = create_traced_client(GroqClient(), "Controller", exact_cache=PromptCache())
     """
     return TracedLLMClient(
         base_client=base_client,
         component_name=component_name,
-        trace_store=trace_store
+        trace_store=trace_store,
+        cache=cache,
+        exact_cache=exact_cache
     )
@@ -0,0 +1,101 @@
+"""
+Exact-match response cache for deterministic LLM calls.
+Identical prompt + generation settings at temperature 0 always get the same answer.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+import orjson
+
+
+def prompt_key(prompt: str, kwargs: Dict[str, Any]) -> str:
+    """Stable hash of a prompt and its generation settings."""
+    payload = prompt.encode() + b"\0" + orjson.dumps(kwargs, option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def is_deterministic(kwargs: Dict[str, Any]) -> bool:
+    """Only temperature-0 calls are safe to replay; None means the provider default (0.85)."""
+    temperature = kwargs.get("temperature")
+    return temperature is not None and temperature <= 0
+
+
+class PromptCache:
+    """
+    Prompt-hash keyed LRU of responses, persisted as append-only JSONL.
+    """
+
+    def __init__(self, maxsize: int = 1024, path: Optional[str] = "data/prompt_cache.jsonl"):
+        """
+        Args:
+            maxsize: Maximum number of cached responses before LRU eviction
+            path: JSONL file to persist entries to (None keeps the cache in memory)
+        """
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+        if self.path:
+            self._load()
+
+    def lookup(self, prompt: str, **kwargs) -> Optional[Dict[str, Any]]:
+        """Return the stored response for this exact call, or None."""
+        if not is_deterministic(kwargs):
+            return None
+        key = prompt_key(prompt, kwargs)
+        with self._lock:
+            response = self._entries.get(key)
+            if response is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return response
+
+    def insert(self, prompt: str, response: Dict[str, Any], **kwargs):
+        """Store a deterministic call's response and append it to the persistence file."""
+        if not is_deterministic(kwargs):
+            return
+        key = prompt_key(prompt, kwargs)
+        with self._lock:
+            self._remember(key, response)
+            if self.path:
+                with open(self.path, "ab") as f:
+                    f.write(orjson.dumps({"key": key, "response": response}) + b"\n")
+
+    def _remember(self, key: str, response: Dict[str, Any]):
+        self._entries[key] = response
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _load(self):
+        """Replay the file into the LRU, compacting it if entries were evicted."""
+        if not os.path.exists(self.path):
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            return
+
+        records = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    entry = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue  # Torn write from an interrupted run
+                self._remember(entry["key"], entry["response"])
+                records += 1
+
+        if records != len(self._entries):
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.writelines(
+                    orjson.dumps({"key": key, "response": response}) + b"\n"
+                    for key, response in self._entries.items()
+                )
+            os.replace(tmp_path, self.path)
@@ -2,7 +2,64 @@
 Reward functions for Agent-Lightning training.
 These functions evaluate the quality of agent responses.
 """
-from typing import Dict, Any
+import re
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+
+try:
+    import ahocorasick  # pyahocorasick; optional single-pass phrase matcher
+except ImportError:
+    ahocorasick = None
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; the batch reward falls back to np.select
+    njit = None
+
+
+# Phrases that signal an empathetic tone, matched against lowercased text
+EMPATHETIC_PHRASES = (
+    "i understand", "i hear you", "that sounds difficult",
+    "it makes sense", "i'm here", "you're not alone",
+    "that must feel", "it's valid to feel"
+)
+
+
+def _build_empathy_matcher():
+    """
+    Single-pass matcher over EMPATHETIC_PHRASES: an Aho-Corasick automaton
+    when pyahocorasick is installed, otherwise one fused regex.
+    """
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for phrase in EMPATHETIC_PHRASES:
+            automaton.add_word(phrase, phrase)
+        automaton.make_automaton()
+        return automaton
+    # Zero-width lookahead so overlapping phrases all match
+    return re.compile('(?=(' + '|'.join(map(re.escape, EMPATHETIC_PHRASES)) + '))')
+
+
+def _count_empathetic_phrases(text_lower: str) -> int:
+    """Number of distinct EMPATHETIC_PHRASES found in lowercased text."""
+    if isinstance(_EMPATHY_MATCHER, re.Pattern):
+        return len(set(_EMPATHY_MATCHER.findall(text_lower)))
+    return len({phrase for _, phrase in _EMPATHY_MATCHER.iter(text_lower)})
+
+
+_EMPATHY_MATCHER = _build_empathy_matcher()
+
+
+def response_text(trace: Dict[str, Any]) -> str:
+    """Generated text of a trace's Groq/OpenAI or Gemini response ('' if there is none)."""
+    response = trace.get("response", {})
+    if isinstance(response, dict):
+        if 'choices' in response and response['choices']:
+            return response['choices'][0]['message']['content']
+        elif 'candidates' in response and response['candidates']:
+            return response['candidates'][0]['content']['parts'][0]['text']
+    return ""
 
 
 def compute_safety_reward(trace: Dict[str, Any]) -> float:
@@ -33,28 +90,16 @@ def compute_empathy_reward(trace: Dict[str, Any]) -> float:
     
     Could be replaced with LLM-as-judge in the future.
     """
-    response = trace.get("response", {})
-    
-    # Extract text from response
-    text = ""
-    if isinstance(response, dict):
-        if 'choices' in response and response['choices']:
-            text = response['choices'][0]['message']['content']
-        elif 'candidates' in response and response['candidates']:
-            text = response['candidates'][0]['content']['parts'][0]['text']
-    
+    return empathy_reward_for_text(response_text(trace))
+
+
+def empathy_reward_for_text(text: str) -> float:
+    """compute_empathy_reward() for an already extracted response text."""
     if not text:
         return 0.0
     
-    # Simple heuristic: check for empathetic phrases
-    empathetic_phrases = [
-        "I understand", "I hear you", "that sounds difficult",
-        "it makes sense", "I'm here", "you're not alone",
-        "that must feel", "it's valid to feel"
-    ]
-    
-    text_lower = text.lower()
-    matches = sum(1 for phrase in empathetic_phrases if phrase in text_lower)
+    # Simple heuristic: count the distinct empathetic phrases used
+    matches = _count_empathetic_phrases(text.lower())
     
     # Normalize to 0-1
     return min(matches / 3.0, 1.0)
@@ -68,16 +113,11 @@ def compute_length_reward(trace: Dict[str, Any]) -> float:
     Too long = overwhelming
     Sweet spot = 50-200 characters
     """
-    response = trace.get("response", {})
-    
-    # Extract text from response
-    text = ""
-    if isinstance(response, dict):
-        if 'choices' in response and response['choices']:
-            text = response['choices'][0]['message']['content']
-        elif 'candidates' in response and response['candidates']:
-            text = response['candidates'][0]['content']['parts'][0]['text']
-    
+    return length_reward_for_text(response_text(trace))
+
+
+def length_reward_for_text(text: str) -> float:
+    """compute_length_reward() for an already extracted response text."""
     if not text:
         return 0.0
     
@@ -129,14 +169,17 @@ def compute_combined_reward(trace: Dict[str, Any]) -> float:
     - Latency: 10%
     """
     safety = compute_safety_reward(trace)
-    empathy = compute_empathy_reward(trace)
-    length = compute_length_reward(trace)
-    latency = compute_latency_reward(trace)
     
     # If safety is 0 or negative, heavily penalize
     if safety <= 0:
         return safety
     
+    # Extract the response text once for both text-based rewards
+    text = response_text(trace)
+    empathy = empathy_reward_for_text(text)
+    length = length_reward_for_text(text)
+    latency = compute_latency_reward(trace)
+    
     # Weighted combination
     combined = (
         0.5 * safety +
@@ -146,3 +189,78 @@ def compute_combined_reward(trace: Dict[str, Any]) -> float:
     )
     
     return combined
+
+
+def _reward_ladders_kernel(lengths: np.ndarray, latency: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Length and latency rewards per trace in one loop (JIT-compiled when numba is installed)."""
+    n = lengths.shape[0]
+    length_reward = np.empty(n)
+    latency_reward = np.empty(n)
+    for i in range(n):
+        length = lengths[i]
+        if length == 0:
+            length_reward[i] = 0.0
+        elif length < 20:
+            length_reward[i] = 0.2
+        elif length < 50:
+            length_reward[i] = 0.6
+        elif length <= 200:
+            length_reward[i] = 1.0
+        elif length <= 300:
+            length_reward[i] = 0.8
+        else:
+            length_reward[i] = 0.5
+        
+        latency_ms = latency[i]
+        if latency_ms == 0:
+            latency_reward[i] = 0.0
+        elif latency_ms < 1000:
+            latency_reward[i] = 1.0
+        elif latency_ms < 3000:
+            latency_reward[i] = 0.7
+        elif latency_ms < 5000:
+            latency_reward[i] = 0.4
+        else:
+            latency_reward[i] = 0.1
+    return length_reward, latency_reward
+
+
+# Compiled lazily on first call; cache=True keeps the machine code across runs
+_reward_ladders_numba = njit(cache=True)(_reward_ladders_kernel) if njit is not None else None
+
+
+def compute_combined_reward_batch(traces: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    compute_combined_reward() for many traces at once.
+    
+    Each trace's fields are read and its text scanned once; the length and
+    latency ladders and the weighting then run over whole arrays.
+    
+    Returns:
+        Float array of rewards in trace order
+    """
+    n = len(traces)
+    safety = np.fromiter((compute_safety_reward(t) for t in traces), dtype=np.float64, count=n)
+    # Unsafe traces keep their penalty, so their text is never scored
+    texts = [response_text(t) if s > 0 else "" for t, s in zip(traces, safety.tolist())]
+    empathy = np.fromiter(map(empathy_reward_for_text, texts), dtype=np.float64, count=n)
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=n)
+    latency = np.fromiter((t.get("latency_ms", 0) for t in traces), dtype=np.float64, count=n)
+    
+    # Same ladders as length_reward_for_text() and compute_latency_reward()
+    if _reward_ladders_numba is not None:
+        length, latency_reward = _reward_ladders_numba(lengths, latency)
+    else:
+        length = np.select(
+            [lengths == 0, lengths < 20, lengths < 50, lengths <= 200, lengths <= 300],
+            [0.0, 0.2, 0.6, 1.0, 0.8],
+            default=0.5
+        )
+        latency_reward = np.select(
+            [latency == 0, latency < 1000, latency < 3000, latency < 5000],
+            [0.0, 1.0, 0.7, 0.4],
+            default=0.1
+        )
+    
+    combined = 0.5 * safety + 0.3 * empathy + 0.1 * length + 0.1 * latency_reward
+    return np.where(safety <= 0, safety, combined)
@@ -0,0 +1,200 @@
+"""
+Semantic response cache for LLM clients.
+Returns a stored response when a new turn's message is close enough to one seen
+before and everything else about the call (template, other fields, history,
+settings) is identical.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Dict, Any, Optional
+
+import numpy as np
+import orjson
+
+from instrumentation.prompt_cache import is_deterministic
+
+
+# ============================================================================
+# EMBEDDING
+# ============================================================================
+# Hashed bag of words and word pairs: cheap, deterministic across processes and
+# needs no model download, which is all a near-duplicate prompt detector needs.
+
+SKETCH_DIM = 1024
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+def embed_text(text: str, dim: int = SKETCH_DIM) -> np.ndarray:
+    """Embed text as an L2-normalised hashed sketch of its words and word pairs."""
+    words = _TOKEN_RE.findall(text.lower())
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    vec = np.zeros(dim, dtype=np.float32)
+    if not features:
+        return vec
+    buckets = [zlib.crc32(f.encode()) % dim for f in features]
+    vec += np.bincount(buckets, minlength=dim).astype(np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+def _turn_text(kwargs: Dict[str, Any]) -> Optional[str]:
+    """
+    The per-turn content to compare: the caller's cache_text (the user message
+    of a templated prompt) or the last user entry of a chat call. None when
+    the call has neither, as the whole prompt would be dominated by its template.
+    """
+    if kwargs.get("cache_text"):
+        return kwargs["cache_text"]
+    for message in reversed(kwargs.get("messages") or []):
+        if isinstance(message, dict) and message.get("role") in ("user", "User"):
+            return message.get("content") or None
+    return None
+
+
+def _context_key(prompt: str, turn_text: str, kwargs: Dict[str, Any]) -> str:
+    """Exact hash of everything in the call except the per-turn text."""
+    messages = list(kwargs.get("messages") or [])
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], dict) and messages[i].get("content") == turn_text:
+            messages[i] = {**messages[i], "content": None}
+            break
+    payload = orjson.dumps({
+        "prompt": (prompt or "").replace(turn_text, "\0"),
+        "messages": messages,
+        "max_tokens": kwargs.get("max_tokens"),
+        "temperature": kwargs.get("temperature")
+    }, option=orjson.OPT_SORT_KEYS, default=str)
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+class SemanticCache:
+    """
+    Embedding-keyed response cache with TTL and LRU eviction.
+
+    Only the per-turn text (see _turn_text) is compared fuzzily; the rest of
+    the call must match exactly, and only deterministic (temperature 0) calls
+    are cached. Entries live in a preallocated matrix so a lookup is one matrix-vector
+    product. Inserts are appended to a JSONL file and reloaded on start-up.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        capacity: int = 1024,
+        ttl_seconds: Optional[float] = 24 * 3600,
+        path: Optional[str] = "data/llm_cache.jsonl"
+    ):
+        """
+        Args:
+            threshold: Minimum cosine similarity for a hit
+            capacity: Maximum number of cached responses before LRU eviction
+            ttl_seconds: Age after which an entry is ignored (None keeps entries forever)
+            path: JSONL file to persist entries to (None keeps the cache in memory)
+        """
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._keys = np.zeros((capacity, SKETCH_DIM), dtype=np.float32)
+        self._created = np.full(capacity, -np.inf)
+        self._last_used = np.full(capacity, -np.inf)
+        self._params: list = [None] * capacity
+        self._responses: list = [None] * capacity
+        self._clock = 0
+
+        if self.path:
+            self._load()
+
+    def lookup(self, prompt: str, **kwargs) -> Optional[Dict[str, Any]]:
+        """Return a cached response for a similar request, or None on a miss."""
+        text = _turn_text(kwargs)
+        if text is None or not is_deterministic(kwargs):
+            return None
+        query = embed_text(text)
+        params = _context_key(prompt, text, kwargs)
+        with self._lock:
+            scores = self._keys @ query
+            scores[~self._live_mask()] = -1.0
+            candidates = np.flatnonzero(scores >= self.threshold)
+            for slot in candidates[np.argsort(-scores[candidates])]:
+                if self._params[slot] == params:
+                    self._clock += 1
+                    self._last_used[slot] = self._clock
+                    self.hits += 1
+                    return self._responses[slot]
+            self.misses += 1
+        return None
+
+    def insert(self, prompt: str, response: Dict[str, Any], **kwargs):
+        """Cache a response and append it to the persistence file."""
+        text = _turn_text(kwargs)
+        if text is None or not is_deterministic(kwargs):
+            return
+        entry = {
+            "text": text,
+            "params": _context_key(prompt, text, kwargs),
+            "response": response,
+            "created": time.time()
+        }
+        with self._lock:
+            self._store(embed_text(text), entry)
+            if self.path:
+                with open(self.path, "ab") as f:
+                    f.write(orjson.dumps(entry) + b"\n")
+
+    def clear(self):
+        """Drop every entry from memory and disk."""
+        with self._lock:
+            self._created[:] = -np.inf
+            self._last_used[:] = -np.inf
+            self._params = [None] * self.capacity
+            self._responses = [None] * self.capacity
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _live_mask(self) -> np.ndarray:
+        if self.ttl_seconds is None:
+            return np.isfinite(self._created)
+        return self._created >= time.time() - self.ttl_seconds
+
+    def _store(self, key: np.ndarray, entry: Dict[str, Any]):
+        # Reuse an expired or empty slot first, then evict the least recently used
+        live = self._live_mask()
+        slot = int(np.argmin(self._last_used)) if live.all() else int(np.argmin(live))
+        self._clock += 1
+        self._keys[slot] = key
+        self._created[slot] = entry["created"]
+        self._last_used[slot] = self._clock
+        self._params[slot] = entry["params"]
+        self._responses[slot] = entry["response"]
+
+    def _load(self):
+        """Load unexpired entries, compacting the file if anything was dropped."""
+        if not os.path.exists(self.path):
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            return
+
+        entries = []
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    entries.append(orjson.loads(line))
+                except orjson.JSONDecodeError:
+                    continue  # Torn write from an interrupted run
+
+        cutoff = time.time() - self.ttl_seconds if self.ttl_seconds is not None else -np.inf
+        kept = [e for e in entries if e.get("created", 0) >= cutoff][-self.capacity:]
+        for entry in kept:
+            self._store(embed_text(entry["text"]), entry)
+
+        if len(kept) != len(entries):
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.writelines(orjson.dumps(e) + b"\n" for e in kept)
+            os.replace(tmp_path, self.path)
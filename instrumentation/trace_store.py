@@ -2,22 +2,48 @@
 Trace storage for Agent-Lightning integration.
 Manages saving and loading conversation traces.
 """
-import json
+import atexit
+import gzip
 import os
+import queue
+import threading
+import time
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 from pathlib import Path
 
+import orjson
+
+
+# Traces larger than this are gzipped on disk (long prompts dominate the size)
+GZIP_THRESHOLD_BYTES = 64 * 1024
+
+# Finished traces buffered for the writer thread; end_trace() blocks once it is full
+WRITE_QUEUE_SIZE = 1024
+
+# Most traces the writer thread takes off the queue per wake-up
+WRITE_BATCH_SIZE = 64
+
 
 class TraceStore:
     """
     Stores and retrieves traces for Agent-Lightning training.
     """
     
-    def __init__(self, trace_dir: str = "traces"):
+    def __init__(self, trace_dir: str = "traces", background_writes: bool = True):
+        """
+        Args:
+            trace_dir: Directory traces are written to, one subdirectory per day
+            background_writes: Hand finished traces to a writer thread so end_trace()
+                does not block the LLM call on disk I/O
+        """
         self.trace_dir = Path(trace_dir)
         self.trace_dir.mkdir(parents=True, exist_ok=True)
         self.active_traces: Dict[str, Dict[str, Any]] = {}
+        self._started: Dict[str, float] = {}  # trace_id -> perf_counter() at start
+        self.background_writes = background_writes
+        self._write_queue: "queue.Queue[tuple]" = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self._writer: Optional[threading.Thread] = None
         
     def start_trace(
         self, 
@@ -36,12 +62,14 @@ class TraceStore:
         Returns:
             trace_id: Unique identifier for this trace
         """
-        trace_id = f"{component}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+        now = datetime.now()
+        trace_id = f"{component}_{now.strftime('%Y%m%d_%H%M%S_%f')}"
         
+        self._started[trace_id] = time.perf_counter()
         self.active_traces[trace_id] = {
             "trace_id": trace_id,
             "component": component,
-            "timestamp_start": datetime.now().isoformat(),
+            "timestamp_start": now.isoformat(),
             "prompt": prompt,
             "metadata": metadata,
             "response": None,
@@ -71,11 +99,10 @@ class TraceStore:
             return
         
         trace = self.active_traces[trace_id]
-        timestamp_end = datetime.now()
         
-        # Calculate latency
-        timestamp_start = datetime.fromisoformat(trace["timestamp_start"])
-        latency_ms = (timestamp_end - timestamp_start).total_seconds() * 1000
+        # Calculate latency on the monotonic clock rather than re-parsing the start time
+        latency_ms = (time.perf_counter() - self._started.pop(trace_id)) * 1000
+        timestamp_end = datetime.now()
         
         # Update trace
         trace["response"] = response
@@ -90,18 +117,72 @@ class TraceStore:
         del self.active_traces[trace_id]
     
     def _save_trace(self, trace: Dict[str, Any]):
-        """Save a completed trace to disk."""
-        # Organize by date
-        date_str = datetime.now().strftime("%Y%m%d")
+        """Save a completed trace to disk, in the background unless disabled."""
+        # Organize by date (the trace's end date, YYYYMMDD)
+        date_str = trace["timestamp_end"][:10].replace("-", "")
         date_dir = self.trace_dir / date_str
-        date_dir.mkdir(parents=True, exist_ok=True)
         
-        # Save as JSON
-        filename = f"{trace['trace_id']}.json"
-        filepath = date_dir / filename
+        # Serialise now so later changes to the trace's objects cannot leak in
+        buf = orjson.dumps(trace)
+        pretty = orjson.dumps(trace, option=orjson.OPT_INDENT_2) if os.getenv("DEBUG_PRETTY") == "1" else None
+        item = (date_dir, trace['trace_id'], buf, pretty)
+        
+        if not self.background_writes:
+            date_dir.mkdir(parents=True, exist_ok=True)
+            self._write_trace(*item)
+            return
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._writer_loop, name="trace-writer", daemon=True)
+            self._writer.start()
+            atexit.register(self.flush)
+        self._write_queue.put(item)
+    
+    def _writer_loop(self):
+        """Drain queued traces to disk for the life of the process, a batch per wake-up."""
+        made_dirs = set()
+        while True:
+            batch = [self._write_queue.get()]
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._write_queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            for item in batch:
+                try:
+                    if item[0] not in made_dirs:
+                        item[0].mkdir(parents=True, exist_ok=True)
+                        made_dirs.add(item[0])
+                    self._write_trace(*item)
+                except OSError as e:
+                    print(f"Warning: could not write trace {item[1]}: {e}")
+                finally:
+                    self._write_queue.task_done()
+    
+    @staticmethod
+    def _write_trace(date_dir: Path, trace_id: str, buf: bytes, pretty: Optional[bytes]):
+        """Write one serialised trace into its (existing) date directory."""
+        # Save as compact JSON, compressed when large
+        if len(buf) > GZIP_THRESHOLD_BYTES:
+            filepath = date_dir / f"{trace_id}.json.gz"
+            buf = gzip.compress(buf)
+        else:
+            filepath = date_dir / f"{trace_id}.json"
+        
+        with open(filepath, 'wb') as f:
+            f.write(buf)
         
-        with open(filepath, 'w') as f:
-            json.dump(trace, f, indent=2)
+        # Human-readable copy for debugging, kept out of load_traces()
+        if pretty is not None:
+            pretty_dir = date_dir / "pretty"
+            pretty_dir.mkdir(exist_ok=True)
+            with open(pretty_dir / f"{trace_id}.json", 'wb') as f:
+                f.write(pretty)
+    
+    def flush(self):
+        """Block until every finished trace has been written to disk."""
+        if self._writer is not None:
+            self._write_queue.join()
     
     def load_traces(
         self,
@@ -120,6 +201,7 @@ class TraceStore:
         Returns:
             List of trace dictionaries
         """
+        self.flush()
         traces = []
         
         # Iterate through date directories
@@ -136,9 +218,11 @@ class TraceStore:
                 continue
             
             # Load all JSON files in this date directory
-            for trace_file in date_dir.glob("*.json"):
-                with open(trace_file, 'r') as f:
-                    trace = json.load(f)
+            for trace_file in sorted(date_dir.glob("*.json*")):
+                if trace_file.suffix == ".gz":
+                    trace = orjson.loads(gzip.decompress(trace_file.read_bytes()))
+                else:
+                    trace = orjson.loads(trace_file.read_bytes())
                 
                 # Apply component filter
                 if component and trace.get("component") != component:
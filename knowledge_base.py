@@ -2,103 +2,286 @@
 Knowledge base and RAG (Retrieval-Augmented Generation) system for mental health agents.
 Provides semantic search over specialized knowledge for each agent type.
 """
-import json
+import hashlib
+import sqlite3
+import threading
 import numpy as np
-from typing import List, Dict, Any, Tuple
+from collections import OrderedDict
+from scipy.sparse import csc_matrix, csr_matrix, vstack
+from sklearn.feature_extraction.text import TfidfVectorizer
+from typing import List, Dict, Any, Optional, Tuple
 import os
 
+import orjson
+
+from llm_clients import extract_text
+
+try:
+    import sqlite_vec
+except ImportError:  # Optional: indexed KNN search, brute-force scan otherwise
+    sqlite_vec = None
+
+# Set MHC_USE_VEC_INDEX=false to force the brute-force scan (e.g. for benchmarking)
+USE_VEC_INDEX = os.getenv('MHC_USE_VEC_INDEX', 'true').lower() == 'true'
+
 
 class SimpleEmbedding:
-    """Simple TF-IDF based embedding for lightweight semantic search without heavy dependencies."""
+    """TF-IDF embedding for lightweight semantic search, backed by scikit-learn's TfidfVectorizer."""
     
     def __init__(self):
-        self.vocabulary = {}
-        self.idf = {}
-        self.doc_count = 0
+        self.vectorizer = TfidfVectorizer(lowercase=True, norm='l2', sublinear_tf=True, dtype=np.float32)
+        self.fitted = False
+    
+    @property
+    def vocabulary(self) -> Dict[str, int]:
+        """Word -> column index (empty until fitted)."""
+        return self.vectorizer.vocabulary_ if self.fitted else {}
     
     def fit(self, documents: List[str]):
         """Build vocabulary and IDF from documents."""
-        from collections import Counter
-        word_doc_freq = Counter()
-        
-        for doc in documents:
-            words = set(doc.lower().split())
-            for word in words:
-                word_doc_freq[word] += 1
-                if word not in self.vocabulary:
-                    self.vocabulary[word] = len(self.vocabulary)
-        
-        self.doc_count = len(documents)
-        for word, freq in word_doc_freq.items():
-            self.idf[word] = np.log(self.doc_count / (1 + freq))
+        self.fit_transform(documents)
+    
+    def fit_transform(self, documents: List[str]) -> csr_matrix:
+        """Build vocabulary and IDF from documents and return their L2-normalized TF-IDF rows."""
+        try:
+            matrix = self.vectorizer.fit_transform(documents)
+        except ValueError:
+            # No documents, or none containing a word: nothing can be matched
+            self.fitted = False
+            return csr_matrix((len(documents), 0), dtype=np.float32)
+        self.fitted = True
+        return matrix
+    
+    def transform(self, texts: List[str]) -> csr_matrix:
+        """TF-IDF vectors of texts as the rows of one sparse matrix, each row L2-normalized."""
+        if not self.fitted:
+            return csr_matrix((len(texts), 0), dtype=np.float32)
+        return self.vectorizer.transform(texts)
     
     def embed(self, text: str) -> np.ndarray:
-        """Convert text to TF-IDF vector."""
-        from collections import Counter
-        words = text.lower().split()
-        word_freq = Counter(words)
-        
-        vector = np.zeros(len(self.vocabulary))
-        for word, freq in word_freq.items():
-            if word in self.vocabulary:
-                idx = self.vocabulary[word]
-                tf = freq / len(words)
-                vector[idx] = tf * self.idf.get(word, 0)
-        
-        # Normalize
-        norm = np.linalg.norm(vector)
-        if norm > 0:
-            vector = vector / norm
-        return vector
+        """Convert text to a dense TF-IDF vector."""
+        return self.transform([text]).toarray()[0]
+    
+    def state(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(words in column order, IDF weights) of the fitted model, for restore()."""
+        return self.vectorizer.get_feature_names_out().astype(str), self.vectorizer.idf_
+    
+    def restore(self, terms: np.ndarray, idf: np.ndarray):
+        """Load a vocabulary and IDF saved with state() instead of fitting."""
+        self.vectorizer.vocabulary_ = {str(term): i for i, term in enumerate(terms)}
+        self.vectorizer.idf_ = idf
+        self.fitted = True
+
+
+def _load_embedding_cache(cache_path: str, digest: str) -> Optional[Tuple[SimpleEmbedding, csc_matrix]]:
+    """Fitted model and document matrix saved for a knowledge file with this digest, or None."""
+    try:
+        with np.load(cache_path, allow_pickle=False) as cache:
+            if str(cache['digest']) != digest:
+                return None
+            model = SimpleEmbedding()
+            model.restore(cache['terms'], cache['idf'])
+            matrix = csc_matrix(
+                (cache['data'], cache['indices'], cache['indptr']), shape=tuple(cache['shape'])
+            )
+    except (OSError, KeyError, ValueError):
+        # Missing, or written by an incompatible version: refit
+        return None
+    return model, matrix
+
+
+def _save_embedding_cache(cache_path: str, digest: str, model: SimpleEmbedding, matrix: csc_matrix):
+    """Write the fitted model and document matrix next to their knowledge file."""
+    terms, idf = model.state()
+    tmp_path = cache_path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f, digest=digest, terms=terms, idf=idf, data=matrix.data,
+                indices=matrix.indices, indptr=matrix.indptr, shape=np.array(matrix.shape)
+            )
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass  # Read-only checkout: fit again next time
+
+
+def _build_vec_index(doc_matrix: csc_matrix) -> Optional[sqlite3.Connection]:
+    """
+    In-memory sqlite-vec cosine KNN index over the document embeddings
+    (rowid = document index), or None when sqlite-vec can't be used.
+    """
+    if sqlite_vec is None or not USE_VEC_INDEX or doc_matrix.shape[0] == 0 or doc_matrix.shape[1] == 0:
+        return None
+    try:
+        db = sqlite3.connect(':memory:', check_same_thread=False)
+        db.enable_load_extension(True)
+        sqlite_vec.load(db)
+        db.enable_load_extension(False)
+        db.execute(
+            f"CREATE VIRTUAL TABLE vec_chunks USING vec0(embedding float[{doc_matrix.shape[1]}] distance_metric=cosine)"
+        )
+        vectors = doc_matrix.toarray()
+        db.executemany(
+            "INSERT INTO vec_chunks(rowid, embedding) VALUES (?, ?)",
+            ((i, vector.tobytes()) for i, vector in enumerate(vectors))
+        )
+        return db
+    except (AttributeError, sqlite3.Error):
+        # Python built without extension loading, or the extension failed to load
+        return None
+
+
+def _top_k(scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    """
+    (index, score) of the k highest scores, best first; ties go to the later
+    index, as with a reverse tuple sort. O(N) partition, then sorts only the top.
+    """
+    k = min(k, scores.size)
+    if k <= 0:
+        return []
+    # Everything tied with the k-th best stays a candidate so tie order is exact
+    kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+    candidates = np.flatnonzero(scores >= kth)
+    order = candidates[np.lexsort((-candidates, -scores[candidates]))][:k]
+    return [(int(idx), float(scores[idx])) for idx in order]
 
 
 class KnowledgeBase:
     """Knowledge base with semantic search capabilities."""
     
+    # Entries kept in each of the query embedding and search result caches
+    CACHE_SIZE = 2048
+    
+    # Documents appended against the current vocabulary, as a fraction of the
+    # corpus, before add_document() refits the whole model
+    REFIT_FRACTION = 0.1
+    
+    # Process-wide instances by agent type, handed out by shared()
+    _shared: Dict[str, "KnowledgeBase"] = {}
+    _shared_lock = threading.Lock()
+    
     def __init__(self, agent_type: str):
         self.agent_type = agent_type
         self.documents: List[Dict[str, Any]] = []
-        self.embeddings: List[np.ndarray] = []
+        # Document embeddings as the rows of a sparse (N, vocab) TF-IDF matrix, stored
+        # column-major so a query reads just the posting lists of its own terms
+        self._doc_matrix = csc_matrix((0, 0), dtype=np.float32)
+        self._vec_index: Optional[sqlite3.Connection] = None
         self.embedding_model = SimpleEmbedding()
+        self._appended = 0  # Documents added since the model was last fit
+        self._embed_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._search_cache: "OrderedDict[Tuple[str, int], List[Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()  # Shared instances are searched from several threads
         self._load_knowledge()
     
+    @classmethod
+    def shared(cls, agent_type: str) -> "KnowledgeBase":
+        """
+        The process-wide knowledge base for agent_type, loaded on first use.
+        Every agent of that type shares its embeddings and caches.
+        """
+        with cls._shared_lock:
+            kb = cls._shared.get(agent_type)
+            if kb is None:
+                kb = cls._shared[agent_type] = cls(agent_type)
+            return kb
+    
+    def _cache_get(self, cache: OrderedDict, key):
+        """LRU lookup: return the cached value (or None) and mark it recently used."""
+        with self._lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+    
+    def _cache_put(self, cache: OrderedDict, key, value):
+        """LRU insert, evicting the oldest entry once CACHE_SIZE is exceeded."""
+        with self._lock:
+            cache[key] = value
+            if len(cache) > self.CACHE_SIZE:
+                cache.popitem(last=False)
+    
+    def _clear_caches(self):
+        """Drop cached vectors and results; call whenever the corpus is refit."""
+        with self._lock:
+            self._embed_cache.clear()
+            self._search_cache.clear()
+    
+    def embed_with_cache(self, text: str) -> np.ndarray:
+        """Embed text, reusing the vector for text seen before."""
+        key = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        vector = self._cache_get(self._embed_cache, key)
+        if vector is None:
+            vector = self.embedding_model.embed(text)
+            self._cache_put(self._embed_cache, key, vector)
+        return vector
+    
     def _load_knowledge(self):
         """Load knowledge from JSON file for this agent type."""
         kb_path = f"knowledge/{self.agent_type}_knowledge.json"
         if os.path.exists(kb_path):
-            with open(kb_path, 'r', encoding='utf-8') as f:
-                self.documents = json.load(f)
+            with open(kb_path, 'rb') as f:
+                raw = f.read()
+            self.documents = orjson.loads(raw)
             
-            # Build embeddings
-            texts = [doc['content'] for doc in self.documents]
-            self.embedding_model.fit(texts)
-            self.embeddings = [self.embedding_model.embed(text) for text in texts]
+            # Reuse the embeddings from an earlier run while the file is unchanged
+            digest = hashlib.blake2b(raw, digest_size=16).hexdigest()
+            cache_path = kb_path + '.embcache.npz'
+            cached = _load_embedding_cache(cache_path, digest)
+            if cached is not None:
+                self.embedding_model, self._doc_matrix = cached
+            else:
+                texts = [doc['content'] for doc in self.documents]
+                self._doc_matrix = self.embedding_model.fit_transform(texts).tocsc()
+                if self.embedding_model.fitted:
+                    _save_embedding_cache(cache_path, digest, self.embedding_model, self._doc_matrix)
+            self._vec_index = _build_vec_index(self._doc_matrix)
+            self._clear_caches()
     
     def search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
         """Semantic search for relevant knowledge."""
         if not self.documents:
             return []
         
-        query_embedding = self.embedding_model.embed(query)
+        query_hash = hashlib.sha256(query.encode('utf-8')).hexdigest()
+        cached = self._cache_get(self._search_cache, (query_hash, top_k))
+        if cached is not None:
+            return [result.copy() for result in cached]
         
-        # Compute cosine similarity
-        similarities = []
-        for i, doc_embedding in enumerate(self.embeddings):
-            similarity = np.dot(query_embedding, doc_embedding)
-            similarities.append((similarity, i))
+        query_embedding = self.embed_with_cache(query)
         
-        # Sort by similarity
-        similarities.sort(reverse=True)
+        vec_index = self._vec_index
+        if vec_index is not None:
+            ranked = self._knn_search(vec_index, query_embedding, top_k)
+        else:
+            # Cosine similarity against every document; only the query's terms contribute
+            terms = np.flatnonzero(query_embedding)
+            similarities = self._doc_matrix[:, terms] @ query_embedding[terms]
+            
+            ranked = _top_k(similarities, top_k)
         
         # Return top-k results
         results = []
-        for similarity, idx in similarities[:top_k]:
+        for idx, similarity in ranked:
             if similarity > 0.1:  # Threshold
                 result = self.documents[idx].copy()
-                result['relevance_score'] = float(similarity)
+                result['relevance_score'] = similarity
                 results.append(result)
         
-        return results
+        self._cache_put(self._search_cache, (query_hash, top_k), results)
+        return [result.copy() for result in results]
+    
+    def _knn_search(self, vec_index: sqlite3.Connection, query_embedding: np.ndarray,
+                    top_k: int) -> List[Tuple[int, float]]:
+        """(document index, cosine similarity) of the top_k nearest documents."""
+        if not query_embedding.any():
+            return []  # Nothing in the vocabulary; cosine distance is undefined
+        with self._lock:
+            rows = vec_index.execute(
+                "SELECT rowid, distance FROM vec_chunks WHERE embedding MATCH ? AND k = ? ORDER BY distance",
+                (query_embedding.tobytes(), top_k)
+            ).fetchall()
+        return [(rowid, 1.0 - distance) for rowid, distance in rows]
     
     def add_document(self, title: str, content: str, metadata: Dict = None):
         """Add a new document to the knowledge base."""
@@ -107,29 +290,57 @@ class KnowledgeBase:
             'content': content,
             'metadata': metadata or {}
         }
-        self.documents.append(doc)
+        documents = self.documents + [doc]
+        if not self.embedding_model.fitted or self._appended + 1 > self.REFIT_FRACTION * len(documents):
+            self._refit(documents)
+            return
+        
+        # Embed only the new document with the current vocabulary and IDF; words
+        # it introduces become searchable at the next refit
+        row = self.embedding_model.transform([content])
+        doc_matrix = vstack([self._doc_matrix, row], format='csc')
         
-        # Update embeddings
-        texts = [d['content'] for d in self.documents]
-        self.embedding_model.fit(texts)
-        self.embeddings = [self.embedding_model.embed(text) for text in texts]
+        # Documents first: a search that sees the new row must find its document
+        self.documents, self._doc_matrix = documents, doc_matrix
+        with self._lock:
+            if self._vec_index is not None:
+                self._vec_index.execute(
+                    "INSERT INTO vec_chunks(rowid, embedding) VALUES (?, ?)",
+                    (len(documents) - 1, row.toarray()[0].tobytes())
+                )
+            self._search_cache.clear()
+        self._appended += 1
+    
+    def _refit(self, documents: List[Dict[str, Any]]):
+        """Fit a fresh model on documents and swap it in, so concurrent searches never see a half-fit index."""
+        embedding_model = SimpleEmbedding()
+        doc_matrix = embedding_model.fit_transform([d['content'] for d in documents]).tocsc()
+        
+        vec_index = _build_vec_index(doc_matrix)
+        
+        self.documents, self.embedding_model = documents, embedding_model
+        self._doc_matrix, self._vec_index = doc_matrix, vec_index
+        self._appended = 0
+        self._clear_caches()
     
     def save(self):
         """Save knowledge base to disk."""
         kb_path = f"knowledge/{self.agent_type}_knowledge.json"
         os.makedirs('knowledge', exist_ok=True)
-        with open(kb_path, 'w', encoding='utf-8') as f:
-            json.dump(self.documents, f, indent=2, ensure_ascii=False)
+        with open(kb_path, 'wb') as f:
+            f.write(orjson.dumps(self.documents, option=orjson.OPT_INDENT_2))
 
 
 class RAGAgent:
     """Base agent with RAG capabilities for context-aware responses."""
     
-    def __init__(self, llm_client, agent_type: str, system_prompt: str):
+    def __init__(self, llm_client, agent_type: str, system_prompt: str,
+                 knowledge_base: KnowledgeBase = None):
         self.llm = llm_client
         self.agent_type = agent_type
         self.system_prompt = system_prompt
-        self.knowledge_base = KnowledgeBase(agent_type)
+        # One index per domain for the whole process unless a specific one is injected
+        self.knowledge_base = knowledge_base or KnowledgeBase.shared(agent_type)
         self.memory: List[str] = []
     
     def _build_prompt(self, user_input: str, context_docs: List[Dict] = None) -> str:
@@ -165,7 +376,7 @@ class RAGAgent:
         resp = self.llm.generate(prompt, max_tokens=400)
         
         # Extract text from response
-        text = self._extract_text(resp)
+        text = extract_text(resp)
         
         # Save to memory
         self.memory.append(f"User: {user_input}")
@@ -177,22 +388,3 @@ class RAGAgent:
             "context_used": [doc['title'] for doc in context_docs],
             "relevance_scores": [doc.get('relevance_score', 0) for doc in context_docs]
         }
-    
-    def _extract_text(self, resp: Dict[str, Any]) -> str:
-        """Extract text from LLM response."""
-        if isinstance(resp, dict):
-            # Groq/OpenAI format
-            if 'choices' in resp and resp['choices']:
-                choice = resp['choices'][0]
-                if 'message' in choice:
-                    return choice['message'].get('content', '')
-                elif 'text' in choice:
-                    return choice['text']
-            # Gemini format
-            elif 'candidates' in resp and resp['candidates']:
-                candidate = resp['candidates'][0]
-                if 'content' in candidate:
-                    content = candidate['content']
-                    if 'parts' in content and content['parts']:
-                        return content['parts'][0].get('text', '')
-        return str(resp)
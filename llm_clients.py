@@ -1,6 +1,39 @@
+import json
 import os
 import requests
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, List
+
+
+def _openai_text(resp: Dict[str, Any]) -> str:
+    """Text of a Groq/OpenAI chat completion."""
+    choice = resp['choices'][0]
+    if 'message' in choice:
+        return choice['message'].get('content', '')
+    if 'text' in choice:
+        return choice['text']
+    return str(resp)
+
+
+def _gemini_text(resp: Dict[str, Any]) -> str:
+    """Text of a Gemini generateContent response."""
+    parts = resp['candidates'][0].get('content', {}).get('parts')
+    if parts:
+        return parts[0].get('text', '')
+    return str(resp)
+
+
+# Response shape -> extractor, keyed by the provider's top-level result field
+_TEXT_EXTRACTORS = {'choices': _openai_text, 'candidates': _gemini_text}
+
+
+def extract_text(resp: Any) -> str:
+    """Extract the generated text from any provider's response."""
+    if isinstance(resp, dict):
+        for key, extractor in _TEXT_EXTRACTORS.items():
+            if resp.get(key):
+                return extractor(resp)
+    return str(resp)
 
 
 class LLMClient:
@@ -8,6 +41,18 @@ class LLMClient:
     def generate(self, prompt: str, **kwargs) -> Dict[str, Any]:
         raise NotImplementedError()
 
+    def generate_batch(self, prompts: List[str], max_workers: int = 8, **kwargs) -> List[Dict[str, Any]]:
+        """
+        Generate responses for many prompts at once, preserving prompt order.
+
+        Providers without a native batch endpoint fan the requests out over a
+        thread pool so the round-trips overlap instead of running back to back.
+        """
+        if not prompts:
+            return []
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(prompts))) as pool:
+            return list(pool.map(lambda p: self.generate(p, **kwargs), prompts))
+
 
 class GroqClient(LLMClient):
     def __init__(self, api_key: str = None, api_url: str = None, model: str = None):
@@ -18,25 +63,45 @@ class GroqClient(LLMClient):
         if not self.api_key:
             raise ValueError("GROQ_API_KEY is required for GroqClient")
 
-    def generate(self, prompt: str, max_tokens: int = 512, messages: list = None, temperature: float = None) -> Dict[str, Any]:
-        url = f"{self.api_url}/chat/completions"
-        headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
-        
+    def _payload(self, prompt: str, max_tokens: int, messages: list, temperature: float) -> Dict[str, Any]:
         # Use messages if provided (for conversation history), otherwise use prompt
         if messages:
             message_list = messages
         else:
             message_list = [{"role": "user", "content": prompt}]
         
-        payload = {
+        return {
             "model": self.model,
             "messages": message_list,
             "max_tokens": max_tokens,
             "temperature": temperature if temperature is not None else 0.85
         }
+    
+    def generate(self, prompt: str, max_tokens: int = 512, messages: list = None, temperature: float = None) -> Dict[str, Any]:
+        url = f"{self.api_url}/chat/completions"
+        headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+        payload = self._payload(prompt, max_tokens, messages, temperature)
         resp = requests.post(url, json=payload, headers=headers, timeout=30)
         resp.raise_for_status()
         return resp.json()
+    
+    def stream(self, prompt: str, max_tokens: int = 512, messages: list = None, temperature: float = None) -> Iterator[str]:
+        """Yield the response text in pieces as the server-sent events arrive."""
+        url = f"{self.api_url}/chat/completions"
+        headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+        payload = {**self._payload(prompt, max_tokens, messages, temperature), "stream": True}
+        with requests.post(url, json=payload, headers=headers, timeout=30, stream=True) as resp:
+            resp.raise_for_status()
+            for line in resp.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data: "):
+                    continue
+                data = line[len("data: "):]
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
 
 
 class GeminiClient(LLMClient):
@@ -46,12 +111,7 @@ class GeminiClient(LLMClient):
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY is required for GeminiClient")
 
-    def generate(self, prompt: str, max_tokens: int = 512, messages: list = None, temperature: float = None) -> Dict[str, Any]:
-        # Gemini uses API key as query parameter
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model}:generateContent"
-        headers = {"Content-Type": "application/json"}
-        params = {"key": self.api_key}
-        
+    def _payload(self, prompt: str, max_tokens: int, messages: list, temperature: float) -> Dict[str, Any]:
         # Convert messages to Gemini format if provided
         if messages:
             contents = []
@@ -61,10 +121,33 @@ class GeminiClient(LLMClient):
         else:
             contents = [{"parts": [{"text": prompt}]}]
         
-        payload = {
+        return {
             "contents": contents,
             "generationConfig": {"maxOutputTokens": max_tokens, "temperature": temperature if temperature is not None else 0.85}
         }
+    
+    def generate(self, prompt: str, max_tokens: int = 512, messages: list = None, temperature: float = None) -> Dict[str, Any]:
+        # Gemini uses API key as query parameter
+        url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model}:generateContent"
+        headers = {"Content-Type": "application/json"}
+        params = {"key": self.api_key}
+        payload = self._payload(prompt, max_tokens, messages, temperature)
         resp = requests.post(url, json=payload, headers=headers, params=params, timeout=30)
         resp.raise_for_status()
         return resp.json()
+    
+    def stream(self, prompt: str, max_tokens: int = 512, messages: list = None, temperature: float = None) -> Iterator[str]:
+        """Yield the response text in pieces as the server-sent events arrive."""
+        url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model}:streamGenerateContent"
+        headers = {"Content-Type": "application/json"}
+        params = {"key": self.api_key, "alt": "sse"}
+        payload = self._payload(prompt, max_tokens, messages, temperature)
+        with requests.post(url, json=payload, headers=headers, params=params, timeout=30, stream=True) as resp:
+            resp.raise_for_status()
+            for line in resp.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data: "):
+                    continue
+                candidates = json.loads(line[len("data: "):]).get("candidates") or [{}]
+                for part in candidates[0].get("content", {}).get("parts", []):
+                    if part.get("text"):
+                        yield part["text"]
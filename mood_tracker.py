@@ -2,12 +2,13 @@
 Mood tracking agent that maintains emotional state history and adapts responses accordingly.
 Tracks sentiment trends, emotional patterns, and provides mood-aware context for response generation.
 """
-import json
 import os
 from datetime import datetime
 from typing import Dict, List, Any
 from collections import deque
 
+import orjson
+
 
 class MoodTracker:
     """Tracks user's mood, sentiment, and emotional state across conversation."""
@@ -22,8 +23,8 @@ class MoodTracker:
         """Load existing mood tracking data."""
         if os.path.exists(self.session_file):
             try:
-                with open(self.session_file, 'r') as f:
-                    data = json.load(f)
+                with open(self.session_file, 'rb') as f:
+                    data = orjson.loads(f.read())
                     self.mood_history = deque(data.get('mood_history', []), maxlen=20)
             except:
                 pass
@@ -31,12 +32,12 @@ class MoodTracker:
     def _save_mood_data(self):
         """Persist mood tracking data."""
         os.makedirs('sessions', exist_ok=True)
-        with open(self.session_file, 'w') as f:
-            json.dump({
+        with open(self.session_file, 'wb') as f:
+            f.write(orjson.dumps({
                 'session_id': self.session_id,
                 'mood_history': list(self.mood_history),
                 'last_updated': datetime.now().isoformat()
-            }, f, indent=2)
+            }, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
     
     def record_mood(self, sentiment_data: Dict, user_message: str):
         """Record mood point from sentiment analysis."""
@@ -10,7 +10,7 @@ from tools import *
 from core import Controller, ToolExecutionEngine
 
 # Agent-Lightning Instrumentation
-from instrumentation import create_traced_client, TraceStore
+from instrumentation import create_traced_client, TraceStore, SemanticCache, PromptCache
 
 def select_llm():
     provider = os.getenv('LLM_PROVIDER', 'groq').lower()
@@ -47,9 +47,15 @@ def main():
     base_controller_llm = select_llm()  # Fast model for controller
     base_master_llm = select_master_llm()  # Strong model for responder
     
+    # Optional semantic and exact response caches (ENABLE_LLM_CACHE, ENABLE_PROMPT_CACHE env vars)
+    llm_cache = SemanticCache() if os.getenv('ENABLE_LLM_CACHE', 'false').lower() == 'true' else None
+    prompt_cache = PromptCache() if os.getenv('ENABLE_PROMPT_CACHE', 'false').lower() == 'true' else None
+    
     # Wrap with tracing (controlled by ENABLE_TRACING env var)
-    controller_llm = create_traced_client(base_controller_llm, "Controller", trace_store)
-    master_llm = create_traced_client(base_master_llm, "MasterResponder", trace_store)
+    controller_llm = create_traced_client(base_controller_llm, "Controller", trace_store,
+                                          cache=llm_cache, exact_cache=prompt_cache)
+    master_llm = create_traced_client(base_master_llm, "MasterResponder", trace_store,
+                                      cache=llm_cache, exact_cache=prompt_cache)
     
     # Initialize Safety Components (Stage 1)
     crisis_detector = ImmediateCrisisDetector()
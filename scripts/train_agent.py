@@ -11,7 +11,7 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from instrumentation import TraceStore
-from instrumentation.reward_functions import compute_combined_reward
+from instrumentation.reward_functions import compute_combined_reward_batch
 
 
 def compute_rewards_for_traces(trace_store: TraceStore, start_date=None, end_date=None):
@@ -32,17 +32,17 @@ def compute_rewards_for_traces(trace_store: TraceStore, start_date=None, end_dat
         return []
     
     print("\nComputing rewards...")
+    rewards = compute_combined_reward_batch(traces)
     scored_traces = []
     
-    for trace in traces:
-        reward = compute_combined_reward(trace)
+    for trace, reward in zip(traces, rewards.tolist()):
         trace["reward"] = reward
         scored_traces.append(trace)
     
     # Print statistics
-    avg_reward = sum(t["reward"] for t in scored_traces) / len(scored_traces)
-    max_reward = max(t["reward"] for t in scored_traces)
-    min_reward = min(t["reward"] for t in scored_traces)
+    avg_reward = rewards.mean()
+    max_reward = rewards.max()
+    min_reward = rewards.min()
     
     print(f"\nReward Statistics:")
     print(f"  Average: {avg_reward:.3f}")
@@ -405,7 +405,7 @@ if prompt := st.chat_input("Type your message here..."):
                         if assessment.responses:
                             st.markdown("**Discussed Symptoms:**")
                             for symptom in assessment.responses.keys():
-                                mentions = len(assessment.responses[symptom])
+                                mentions = assessment.responses[symptom]['count']
                                 st.markdown(f"- {symptom}: {mentions}x mentioned")
                         
                         # Risk level and concerns
@@ -0,0 +1,42 @@
+"""
+Tests for Agent.step response extraction across provider formats.
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agent import Agent
+
+
+class FixedLLM:
+    """Fake client returning a fixed raw response."""
+    
+    def __init__(self, resp):
+        self.resp = resp
+    
+    def generate(self, prompt, **kwargs):
+        return self.resp
+
+
+def _text(resp):
+    return Agent(FixedLLM(resp), disable_cache=True).step("hi")["text"]
+
+
+def test_provider_formats():
+    assert _text({"choices": [{"message": {"content": "groq"}}]}) == "groq"
+    assert _text({"choices": [{"text": "completion"}]}) == "completion"
+    assert _text({"candidates": [{"content": {"parts": [{"text": "gemini"}]}}]}) == "gemini"
+    assert _text({"output": ["a", "b"]}) == "a\nb"
+
+
+def test_falsy_output_is_kept():
+    assert _text({"output": 0}) == "0"
+    assert _text({"output": ""}) == ""
+    # Empty choices fall through to output, as before
+    assert _text({"choices": [], "output": False}) == "False"
+
+
+def test_unknown_format_falls_back_to_str():
+    assert _text({"result": "x"}) == str({"result": "x"})
@@ -0,0 +1,92 @@
+"""
+Tests for AssessmentTracker's SQLite session store and the legacy JSON migration.
+"""
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import orjson
+
+from assessment_tracker import AssessmentTracker, load_assessment_data
+
+SCORES = {'phq9_estimated': 5, 'gad7_estimated': 0, 'risk_level': 'mild', 'concerns': []}
+
+
+def _write_legacy(session_id, responses):
+    Path("sessions").mkdir(exist_ok=True)
+    Path(f"sessions/{session_id}_assessment.json").write_bytes(orjson.dumps({
+        'responses': responses,
+        'scores': SCORES
+    }))
+
+
+def _epoch(iso):
+    return datetime.fromisoformat(iso).timestamp()
+
+
+def test_dict_format_json_session_is_migrated(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write_legacy("dict", {
+        # Five mentions, of which only the last two kept their context
+        'sleep_issues': {
+            'count': 5,
+            'timestamps': ['2024-01-01T10:00:00', '2024-01-02T10:00:00'],
+            'contexts': ["can't sleep", "up all night again"]
+        }
+    })
+    
+    tracker = AssessmentTracker("dict")
+    entry = tracker.responses['sleep_issues']
+    assert entry['count'] == 5
+    assert list(entry['contexts']) == ["can't sleep", "up all night again"]
+    assert list(entry['timestamps']) == [_epoch('2024-01-01T10:00:00'), _epoch('2024-01-02T10:00:00')]
+    assert tracker.scores == SCORES
+    
+    # The database now holds the session on its own
+    Path("sessions/dict_assessment.json").unlink()
+    data = load_assessment_data("dict")
+    assert data['responses']['sleep_issues']['count'] == 5
+    assert data['responses']['sleep_issues']['contexts'] == ["can't sleep", "up all night again"]
+    assert data['scores'] == SCORES
+
+
+def test_list_format_json_session_is_migrated(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write_legacy("list", {
+        # Oldest format: one dict per mention
+        'hopelessness': [
+            {'timestamp': '2024-01-01T10:00:00', 'context': "nothing will change"},
+            {'timestamp': '2024-01-01T11:00:00', 'context': "what's the point"}
+        ]
+    })
+    
+    tracker = AssessmentTracker("list")
+    entry = tracker.responses['hopelessness']
+    assert entry['count'] == 2
+    assert list(entry['contexts']) == ["nothing will change", "what's the point"]
+    
+    Path("sessions/list_assessment.json").unlink()
+    reloaded = AssessmentTracker("list")
+    assert reloaded.responses['hopelessness']['count'] == 2
+    assert list(reloaded.responses['hopelessness']['timestamps']) == [
+        _epoch('2024-01-01T10:00:00'), _epoch('2024-01-01T11:00:00')
+    ]
+    assert reloaded.scores == SCORES
+
+
+def test_new_mentions_are_appended_after_migration(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write_legacy("grow", {
+        'depression': [{'timestamp': '2024-01-01T10:00:00', 'context': "feeling really down"}]
+    })
+    
+    tracker = AssessmentTracker("grow")
+    detected = tracker.analyze_message("I feel hopeless about everything")
+    assert 'depression' in detected['symptoms']
+    
+    reloaded = AssessmentTracker("grow")
+    assert reloaded.responses['depression']['count'] == 2
+    assert list(reloaded.responses['depression']['contexts'])[-1] == "I feel hopeless about everything"
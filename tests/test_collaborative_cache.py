@@ -0,0 +1,72 @@
+"""
+Tests for the expert contribution cache in CollaborativeAgent.
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from collaborative_agents import CollaborativeAgent
+from knowledge_base import KnowledgeBase
+
+TASK = "Provide therapeutic insight. Emotion: stressed. Topics: work"
+
+
+class CountingLLM:
+    """Fake client answering with a numbered insight per call."""
+    
+    def __init__(self):
+        self.calls = 0
+    
+    def generate(self, prompt, **kwargs):
+        self.calls += 1
+        return {"choices": [{"message": {"content": f"Insight {self.calls}."}}]}
+
+
+def _agent():
+    llm = CountingLLM()
+    agent = CollaborativeAgent(llm, "therapy", "You are a therapist.", knowledge_base=KnowledgeBase("none"))
+    return agent, llm
+
+
+def test_different_messages_never_share_a_contribution():
+    pairs = [
+        ("my boss yelled at me", "my mom yelled at me"),
+        ("I feel so stressed about work", "I don't feel stressed about work anymore"),
+        ("I feel so stressed about work", "I feel happy about work")
+    ]
+    for first, second in pairs:
+        agent, llm = _agent()
+        a = agent.contribute(first, TASK)
+        b = agent.contribute(second, TASK)
+        assert llm.calls == 2
+        assert a["contribution"] != b["contribution"]
+
+
+def test_same_message_reuses_the_contribution():
+    agent, llm = _agent()
+    a = agent.contribute("I feel so stressed about work", TASK)
+    b = agent.contribute("  i feel so STRESSED about   work ", TASK)
+    
+    assert llm.calls == 1
+    assert a == b
+
+
+def test_task_is_part_of_the_key():
+    agent, llm = _agent()
+    agent.contribute("I feel so stressed about work", TASK)
+    agent.contribute("I feel so stressed about work", "Provide therapeutic insight. Emotion: angry.")
+    
+    assert llm.calls == 2
+
+
+def test_cache_is_bounded():
+    agent, llm = _agent()
+    agent.CACHE_SIZE = 2
+    for message in ("one", "two", "three"):
+        agent.contribute(message, TASK)
+    agent.contribute("one", TASK)
+    
+    assert len(agent._cache) == 2
+    assert llm.calls == 4
@@ -0,0 +1,145 @@
+"""
+Tests for ConversationMemory: assistant-history compression and JSONL session storage.
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import orjson
+
+from conversation_memory import ConversationMemory, load_session_data
+
+
+class FakeLLM:
+    """Fake client returning a fixed summary and remembering the fold prompts."""
+    
+    def __init__(self):
+        self.fold_prompts = []
+    
+    def generate(self, prompt, **kwargs):
+        if prompt.startswith("Update this running summary"):
+            self.fold_prompts.append(prompt)
+        return {"choices": [{"message": {"content": "Suggested breathing; asked about sleep."}}]}
+
+
+def _add_turns(memory, turns, start=0):
+    # ~300 tokens per message, so the 0.8 * 3000 threshold trips within a few turns
+    for i in range(start, start + turns):
+        memory.add_message('User', f"user {i} " + "u" * 1200)
+        memory.wait_for_compression()
+        memory.add_message('Assistant', f"reply {i} " + "a" * 1200)
+        memory.wait_for_compression()
+
+
+def test_long_early_messages_keep_recent_turns_verbatim(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    llm = FakeLLM()
+    memory = ConversationMemory(llm, session_id="early")
+    
+    # Over the token threshold, but every message is inside the last 6 turns
+    _add_turns(memory, 5)
+    assert memory.message_count == 10
+    assert llm.fold_prompts == []
+    assert memory._assistant_compacted == 0
+    assert memory.assistant_summary == ''
+    
+    _add_turns(memory, 5, start=5)
+    memory.wait_for_summary()
+    
+    assert llm.fold_prompts
+    assert 0 < memory._assistant_compacted <= len(memory.messages) - 2 * memory.keep_recent_turns
+    assert memory.assistant_summary
+    
+    recent = memory.get_recent_within_budget(budget_tokens=100000)
+    contents = [m['content'] for m in recent]
+    assert recent[0]['role'] == 'system'
+    # The last 6 turns are sent verbatim, folded replies only through the summary
+    for message in memory.messages[-2 * memory.keep_recent_turns:]:
+        assert message['content'] in contents
+    for i in range(memory._assistant_compacted):
+        if memory.messages[i]['role'] == 'Assistant':
+            assert memory.messages[i]['content'] not in contents
+    
+    # Folding keeps going as the session grows
+    compacted = memory._assistant_compacted
+    _add_turns(memory, 3, start=10)
+    assert memory._assistant_compacted > compacted
+
+
+def test_negative_compacted_index_is_clamped_on_load(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    memory = ConversationMemory(FakeLLM(), session_id="clamp")
+    _add_turns(memory, 2)
+    memory.wait_for_summary()
+    
+    # Meta as written by the unclamped cutoff: a summary plus a negative index
+    Path("sessions/clamp.meta.json").write_bytes(orjson.dumps({
+        'session_id': 'clamp',
+        'summaries': [],
+        'assistant_summary': 'Suggested breathing.',
+        'assistant_compacted': -3
+    }))
+    
+    reloaded = ConversationMemory(FakeLLM(), session_id="clamp")
+    assert reloaded._assistant_compacted == 0
+    # Summary first, then every message verbatim
+    assert len(reloaded.get_recent_within_budget(budget_tokens=100000)) == 5
+
+
+def test_session_log_survives_a_torn_last_line(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    memory = ConversationMemory(FakeLLM(), session_id="torn")
+    memory.add_message('User', "I can't sleep")
+    memory.add_message('Assistant', "That sounds exhausting.")
+    memory.wait_for_summary()
+    
+    # A crash mid-append leaves half a record at the end of the log
+    with open("sessions/torn.jsonl", "ab") as f:
+        f.write(b'{"role": "User", "content": "and the')
+    
+    reloaded = ConversationMemory(FakeLLM(), session_id="torn")
+    assert [m['content'] for m in reloaded.messages] == ["I can't sleep", "That sounds exhausting."]
+    assert reloaded.message_count == 2
+    
+    # New messages start on a line of their own and survive the next load
+    reloaded.add_message('User', "and the nights are long")
+    reloaded.wait_for_summary()
+    again = ConversationMemory(FakeLLM(), session_id="torn")
+    assert [m['content'] for m in again.messages][-1] == "and the nights are long"
+    assert again.message_count == 3
+    
+    data = load_session_data("torn", tail=1)
+    assert data['message_count'] == 3
+    assert [m['content'] for m in data['messages']] == ["and the nights are long"]
+
+
+def test_legacy_json_session_is_converted_to_the_log(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    Path("sessions").mkdir()
+    messages = [
+        {'role': 'User', 'content': "work is too much", 'timestamp': '2024-01-01T10:00:00'},
+        {'role': 'Assistant', 'content': "What part weighs most?", 'timestamp': '2024-01-01T10:00:05'}
+    ]
+    Path("sessions/legacy.json").write_bytes(orjson.dumps({
+        'session_id': 'legacy',
+        'messages': messages,
+        'summaries': [{'summary': 'Work stress.', 'message_range': '1-10'}],
+        'message_count': 2
+    }))
+    
+    memory = ConversationMemory(FakeLLM(), session_id="legacy")
+    assert memory.messages == messages
+    assert memory.summaries == [{'summary': 'Work stress.', 'message_range': '1-10'}]
+    
+    # The log and meta files now hold the session, and keep growing from it
+    assert Path("sessions/legacy.jsonl").exists()
+    memory.add_message('User', "mostly my manager")
+    memory.wait_for_summary()
+    
+    data = load_session_data("legacy")
+    assert [m['content'] for m in data['messages']] == [
+        "work is too much", "What part weighs most?", "mostly my manager"
+    ]
+    assert data['summaries'] == [{'summary': 'Work stress.', 'message_range': '1-10'}]
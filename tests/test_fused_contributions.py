@@ -0,0 +1,57 @@
+"""
+Tests for MasterAgent's fused expert contribution call.
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from collaborative_agents import MasterAgent
+
+TASK = "Help formulate the best response. Emotion: sad. Topics: family"
+
+
+class FusedLLM:
+    """Fake client answering the fused call with a fixed reply and counting every call."""
+    
+    def __init__(self, fused_reply):
+        self.fused_reply = fused_reply
+        self.generate_calls = 0
+        self.batches = []
+    
+    def generate(self, prompt, **kwargs):
+        self.generate_calls += 1
+        text = self.fused_reply if prompt.startswith("You are a panel") else "Single insight."
+        return {"choices": [{"message": {"content": text}}]}
+    
+    def generate_batch(self, prompts, **kwargs):
+        self.batches.append(len(prompts))
+        return [{"choices": [{"message": {"content": "Batched insight."}}]} for _ in prompts]
+
+
+def test_trailing_prose_with_braces_is_ignored():
+    parse = MasterAgent._parse_fused_contributions
+    
+    assert parse('{"therapy": "a"}\n\nNote: I kept it short {as requested}.') == {"therapy": "a"}
+    assert parse('Here you go: {"therapy": "name the {feeling}", "crisis": "b"}\nHope that helps }') == {
+        "therapy": "name the {feeling}", "crisis": "b"
+    }
+    assert parse('```json\n{"therapy": "a"}\n```') == {"therapy": "a"}
+    assert parse("no json here") == {}
+
+
+def test_missing_roles_are_batched_not_called_one_by_one(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    llm = FusedLLM('{"therapy": "Grief takes time."}\n\nNote: brief {as requested}.')
+    master = MasterAgent(llm)
+    agents = [master.therapy_agent, master.crisis_agent, master.resource_agent]
+    
+    contributions = master._collect_contributions(agents, "I miss my dad", TASK)
+    
+    assert [c["agent_type"] for c in contributions] == ["therapy", "crisis", "resource"]
+    assert contributions[0]["contribution"] == "Grief takes time."
+    assert [c["contribution"] for c in contributions[1:]] == ["Batched insight.", "Batched insight."]
+    # One fused call, then the two missing roles together
+    assert llm.generate_calls == 1
+    assert llm.batches == [2]
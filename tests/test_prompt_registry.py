@@ -0,0 +1,113 @@
+"""
+Tests for PromptRegistry's snapshot + event log persistence.
+"""
+import json
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agent_lightning.prompt_registry import PromptRegistry
+
+
+def _performance(registry, variant_id="baseline"):
+    return registry.registry["prompts"]["Controller"][variant_id]["performance"]
+
+
+def _reloaded_performance(registry_file):
+    with PromptRegistry(str(registry_file)) as reloaded:
+        return _performance(reloaded)
+
+
+def _registry(tmp_path):
+    registry = PromptRegistry(str(tmp_path / "registry.json"))
+    registry.register_prompt("baseline", "Controller", "You are the controller.")
+    return registry
+
+
+def test_rewards_are_replayed_from_the_event_log(tmp_path):
+    with _registry(tmp_path) as registry:
+        for reward in (1.0, 0.5, 0.0):
+            registry.record_performance("Controller", "baseline", reward)
+        
+        # Nothing compacted yet: the snapshot has no rewards, the log has all three
+        snapshot = json.loads(registry.registry_file.read_text())
+        assert snapshot["prompts"]["Controller"]["baseline"]["performance"]["total_uses"] == 0
+        assert len(registry.event_log_file.read_text().splitlines()) == 3
+        
+        performance = _reloaded_performance(registry.registry_file)
+        assert performance["rewards"] == [1.0, 0.5, 0.0]
+        assert performance["avg_reward"] == 0.5
+
+
+def test_compaction_folds_the_log_into_the_snapshot(tmp_path):
+    with _registry(tmp_path) as registry:
+        for _ in range(PromptRegistry.SAVE_EVERY):
+            registry.record_performance("Controller", "baseline", 1.0)
+        
+        assert registry.event_log_file.read_text() == ""
+        snapshot = json.loads(registry.registry_file.read_text())
+        assert snapshot["prompts"]["Controller"]["baseline"]["performance"]["total_uses"] == PromptRegistry.SAVE_EVERY
+        
+        assert _reloaded_performance(registry.registry_file)["total_uses"] == PromptRegistry.SAVE_EVERY
+
+
+def test_close_compacts_pending_rewards(tmp_path):
+    with _registry(tmp_path) as registry:
+        registry.record_performance("Controller", "baseline", 1.0)
+    
+    assert registry._event_log.closed
+    assert registry.event_log_file.read_text() == ""
+    snapshot = json.loads(registry.registry_file.read_text())
+    assert snapshot["prompts"]["Controller"]["baseline"]["performance"]["rewards"] == [1.0]
+    
+    # Closing twice is harmless
+    registry.close()
+
+
+def test_torn_last_line_is_skipped(tmp_path):
+    with _registry(tmp_path) as registry:
+        registry.record_performance("Controller", "baseline", 1.0)
+        with open(registry.event_log_file, "a") as f:
+            f.write('{"ts": 1, "comp": "Controller", "vi')
+        
+        with PromptRegistry(str(registry.registry_file)) as reloaded:
+            assert _performance(reloaded)["rewards"] == [1.0]
+            
+            # The next event must not be glued onto the torn line
+            reloaded.record_performance("Controller", "baseline", 0.0)
+            assert _reloaded_performance(registry.registry_file)["rewards"] == [1.0, 0.0]
+
+
+def test_events_covered_by_the_snapshot_are_not_counted_twice(tmp_path, monkeypatch):
+    with _registry(tmp_path) as registry:
+        for reward in (1.0, 0.0):
+            registry.record_performance("Controller", "baseline", reward)
+        
+        # Crash after the snapshot is replaced but before the log is truncated
+        monkeypatch.setattr(registry._event_log, "truncate", lambda size: None)
+        registry.compact()
+        assert len(registry.event_log_file.read_text().splitlines()) == 2
+        
+        with PromptRegistry(str(registry.registry_file)) as reloaded:
+            assert _performance(reloaded)["rewards"] == [1.0, 0.0]
+            
+            # Later events are still replayed on top of the snapshot
+            reloaded.record_performance("Controller", "baseline", 0.5)
+            assert _reloaded_performance(registry.registry_file)["rewards"] == [1.0, 0.0, 0.5]
+
+
+def test_save_is_skipped_when_nothing_changed(tmp_path):
+    with _registry(tmp_path) as registry:
+        registry.record_performance("Controller", "baseline", 1.0)
+        registry.compact()
+        
+        # A clean registry must not rewrite the snapshot
+        registry.registry_file.unlink()
+        registry.compact()
+        registry.flush()
+        assert not registry.registry_file.exists()
+        
+        registry.start_ab_test("Controller", "baseline", "baseline")
+        assert registry.registry_file.exists()
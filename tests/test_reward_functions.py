@@ -0,0 +1,61 @@
+"""
+Tests for the empathetic phrase matchers behind compute_empathy_reward().
+"""
+import random
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from instrumentation import reward_functions
+from instrumentation.reward_functions import EMPATHETIC_PHRASES, _build_empathy_matcher, compute_empathy_reward
+
+
+def _per_phrase_count(text_lower):
+    """The original matcher: one substring test per phrase."""
+    return sum(1 for phrase in EMPATHETIC_PHRASES if phrase in text_lower)
+
+
+def _texts():
+    rng = random.Random(0)
+    words = ["you", "i", "that", "feel", "sounds", "hear", "really", "so", "hard", "okay", "the", "a"]
+    texts = ["", "nothing empathetic here", " ".join(EMPATHETIC_PHRASES), EMPATHETIC_PHRASES[0] * 3]
+    for _ in range(500):
+        pieces = [rng.choice(words) for _ in range(rng.randint(0, 20))]
+        for _ in range(rng.randint(0, 3)):
+            pieces.insert(rng.randint(0, len(pieces)), rng.choice(EMPATHETIC_PHRASES))
+        # Glue some pieces together so phrases overlap and abut other words
+        texts.append(rng.choice([" ", ""]).join(pieces))
+    return texts
+
+
+def _regex_matcher(monkeypatch):
+    monkeypatch.setattr(reward_functions, "ahocorasick", None)
+    return _build_empathy_matcher()
+
+
+def test_regex_matcher_matches_per_phrase_count(monkeypatch):
+    monkeypatch.setattr(reward_functions, "_EMPATHY_MATCHER", _regex_matcher(monkeypatch))
+    for text in _texts():
+        assert reward_functions._count_empathetic_phrases(text) == _per_phrase_count(text), text
+
+
+def test_automaton_matches_regex(monkeypatch):
+    if reward_functions.ahocorasick is None:
+        pytest.skip("pyahocorasick not installed")
+    automaton = _build_empathy_matcher()
+    regex = _regex_matcher(monkeypatch)
+    for text in _texts():
+        monkeypatch.setattr(reward_functions, "_EMPATHY_MATCHER", automaton)
+        from_automaton = reward_functions._count_empathetic_phrases(text)
+        monkeypatch.setattr(reward_functions, "_EMPATHY_MATCHER", regex)
+        assert reward_functions._count_empathetic_phrases(text) == from_automaton, text
+
+
+def test_empathy_reward_uses_distinct_phrases():
+    text = " ".join(EMPATHETIC_PHRASES[:2] * 2).upper()
+    trace = {"response": {"choices": [{"message": {"content": text}}]}}
+    assert compute_empathy_reward(trace) == pytest.approx(min(2 / 3.0, 1.0))
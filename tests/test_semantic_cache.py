@@ -0,0 +1,98 @@
+"""
+Tests for the semantic LLM response cache.
+Turns must be compared by their own message, never by the shared prompt template.
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.controller import Controller
+from instrumentation import SemanticCache, TracedLLMClient
+
+
+class RecordingLLM:
+    """Fake client answering every call with a fixed plan and counting the calls."""
+    
+    def __init__(self):
+        self.prompts = []
+    
+    def generate(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        plan = '{"tool_sequence": [], "final_action": "MasterResponderTool", "overall_strategy": "%d"}'
+        return {"choices": [{"message": {"content": plan % len(self.prompts)}}]}
+
+
+def _controller(cache):
+    base = RecordingLLM()
+    llm = TracedLLMClient(base, "Controller", enabled=False, cache=cache)
+    return Controller(llm, {}), base
+
+
+def test_prompts_differing_only_in_user_message_do_not_collide():
+    controller, base = _controller(SemanticCache(path=None))
+    messages = [
+        "I want to kill myself tonight",
+        "I had a great day at work and feel happy",
+        "my dog died and I can't stop crying"
+    ]
+    
+    plans = [controller.decide(m, "low", "No summary") for m in messages]
+    
+    assert len(base.prompts) == 3
+    assert len({p["overall_strategy"] for p in plans}) == 3
+
+
+def test_repeated_turn_is_served_from_cache():
+    controller, base = _controller(SemanticCache(path=None))
+    
+    first = controller.decide("I feel anxious about my exam", "low", "No summary")
+    second = controller.decide("I feel anxious about my exam", "low", "No summary")
+    
+    assert len(base.prompts) == 1
+    assert first == second
+
+
+def test_other_prompt_fields_must_match_exactly():
+    controller, base = _controller(SemanticCache(path=None))
+    
+    controller.decide("I feel anxious about my exam", "low", "No summary")
+    controller.decide("I feel anxious about my exam", "high", "No summary")
+    
+    assert len(base.prompts) == 2
+
+
+def test_sampled_calls_bypass_the_cache():
+    cache = SemanticCache(path=None)
+    response = {"choices": [{"message": {"content": "hi"}}]}
+    
+    for temperature in (0.7, None):
+        cache.insert("prompt", response, cache_text="hello", temperature=temperature)
+        assert cache.lookup("prompt", cache_text="hello", temperature=temperature) is None
+    
+    cache.insert("prompt", response, cache_text="hello", temperature=0.0)
+    assert cache.lookup("prompt", cache_text="hello", temperature=0.0) == response
+
+
+def test_calls_without_turn_text_are_not_cached():
+    cache = SemanticCache(path=None)
+    cache.insert("whole prompt", {"text": "x"}, temperature=0.0)
+    
+    assert cache.lookup("whole prompt", temperature=0.0) is None
+
+
+def test_chat_calls_compare_the_last_user_message():
+    cache = SemanticCache(path=None)
+    history = [{"role": "system", "content": "You are a supportive listener."}]
+    response = {"choices": [{"message": {"content": "ok"}}]}
+    
+    cache.insert("", response, temperature=0.0,
+                 messages=history + [{"role": "user", "content": "I want to kill myself tonight"}])
+    
+    miss = cache.lookup("", temperature=0.0,
+                        messages=history + [{"role": "user", "content": "I had a great day at work"}])
+    hit = cache.lookup("", temperature=0.0,
+                       messages=history + [{"role": "user", "content": "I want to kill myself tonight"}])
+    assert miss is None
+    assert hit == response
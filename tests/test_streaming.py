@@ -0,0 +1,97 @@
+"""
+Tests for streamed responses: MasterAgent.process_stream() and TracedLLMClient.stream().
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from collaborative_agents import MasterAgent
+from instrumentation import PromptCache, TraceStore, TracedLLMClient
+
+
+class StreamingLLM:
+    """Fake client streaming a fixed reply in three pieces."""
+    
+    PIECES = ["Yeah, ", "that's ", "rough."]
+    
+    def __init__(self):
+        self.streams = 0
+    
+    def generate(self, prompt, **kwargs):
+        return {"choices": [{"message": {"content": "".join(self.PIECES)}}]}
+    
+    def stream(self, prompt, **kwargs):
+        self.streams += 1
+        yield from self.PIECES
+
+
+def test_stopping_early_still_records_the_reply(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    agent = MasterAgent(StreamingLLM())
+    
+    stream = agent.process_stream("I had a bad day at work")
+    assert next(stream) == "Yeah, "
+    stream.close()
+    agent._wait_for_pending_turn()
+    
+    assert agent.conversation_history[-1]['response'] == "Yeah, "
+    assert agent.memory.messages[-1]['role'] == 'Assistant'
+    assert agent.memory.messages[-1]['content'] == "Yeah, "
+
+
+class DroppingLLM(StreamingLLM):
+    """Fake client whose stream drops the connection after the first piece."""
+    
+    def stream(self, prompt, **kwargs):
+        yield "Hi "
+        raise ConnectionError("connection reset")
+
+
+def test_failed_stream_records_nothing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    agent = MasterAgent(DroppingLLM())
+    
+    stream = agent.process_stream("I had a bad day at work")
+    assert next(stream) == "Hi "
+    with pytest.raises(ConnectionError):
+        next(stream)
+    agent._wait_for_pending_turn()
+    
+    assert agent.conversation_history == []
+    assert agent.memory.messages[-1]['role'] == 'User'
+    assert all(m['role'] != 'Assistant' for m in agent.memory.messages)
+
+
+def test_traced_stream_is_traced_and_cached(tmp_path):
+    base = StreamingLLM()
+    store = TraceStore(str(tmp_path / "traces"), background_writes=False)
+    llm = TracedLLMClient(base, "MasterResponder", trace_store=store, enabled=True,
+                          exact_cache=PromptCache(path=None))
+    
+    assert "".join(llm.stream("hello", temperature=0.0)) == "Yeah, that's rough."
+    assert "".join(llm.stream("hello", temperature=0.0)) == "Yeah, that's rough."
+    assert base.streams == 1
+    
+    traces = store.load_traces(component="MasterResponder")
+    assert len(traces) == 1
+    assert traces[0]["response"]["choices"][0]["message"]["content"] == "Yeah, that's rough."
+
+
+def test_partial_traced_stream_is_not_cached(tmp_path):
+    base = StreamingLLM()
+    store = TraceStore(str(tmp_path / "traces"), background_writes=False)
+    llm = TracedLLMClient(base, "MasterResponder", trace_store=store, enabled=True,
+                          exact_cache=PromptCache(path=None))
+    
+    stream = llm.stream("hello", temperature=0.0)
+    assert next(stream) == "Yeah, "
+    stream.close()
+    assert "".join(llm.stream("hello", temperature=0.0)) == "Yeah, that's rough."
+    
+    assert base.streams == 2
+    partial = store.load_traces(component="MasterResponder")[0]
+    assert partial["response"]["choices"][0]["message"]["content"] == "Yeah, "
@@ -0,0 +1,48 @@
+"""
+Tests for ToolExecutionEngine's parallel execution of plan steps.
+"""
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.tool_engine import ToolExecutionEngine
+from tools.base import BaseTool
+
+
+class SlowTool(BaseTool):
+    """Fake tool that notes which other tools were running alongside it."""
+    
+    running = set()
+    overlaps = {}
+    lock = threading.Lock()
+    
+    def __init__(self, name):
+        super().__init__(name=name, description="test tool")
+    
+    def execute(self, input_data):
+        with self.lock:
+            self.overlaps.setdefault(self.name, set()).update(self.running)
+            for other in self.running:
+                self.overlaps.setdefault(other, set()).add(self.name)
+            self.running.add(self.name)
+        time.sleep(0.05)
+        with self.lock:
+            self.running.discard(self.name)
+        return {"tool": self.name}
+
+
+def test_assessment_tool_never_runs_alongside_other_tools():
+    names = ["EmotionTool", "AssessmentTool", "SentimentTool", "PatternDetectorTool"]
+    engine = ToolExecutionEngine({name: SlowTool(name) for name in names})
+    plan = {"tool_sequence": [{"name": name, "input": {}} for name in names]}
+    
+    result = engine.execute_plan(plan, "I can't sleep and feel hopeless", {})
+    
+    assert list(result["tool_results"]) == names
+    assert not SlowTool.overlaps.get("AssessmentTool")
+    # The analysis tools around it still run side by side
+    assert "PatternDetectorTool" in SlowTool.overlaps["SentimentTool"]
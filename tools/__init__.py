@@ -1,14 +1,30 @@
+from importlib import import_module
+
 from .base import BaseTool
-from .emotion_tool import EmotionTool
-from .sentiment_tool import SentimentTool
-from .memory_tool import MemoryReadTool
-from .pattern_tool import PatternDetectorTool
-from .intervention_tool import InterventionSelectorTool
-from .assessment_tool import AssessmentTool
-from .master_responder_tool import MasterResponderTool
-from .therapy_tool import TherapyTool
-from .resource_tool import ResourceTool
-from .memory_write_tool import MemoryWriteTool
+
+# Tool classes are imported on first access, so importing BaseTool (as core/
+# does) does not pull in every tool's NLP, retrieval and memory dependencies
+_TOOL_MODULES = {
+    'EmotionTool': '.emotion_tool',
+    'SentimentTool': '.sentiment_tool',
+    'MemoryReadTool': '.memory_tool',
+    'PatternDetectorTool': '.pattern_tool',
+    'InterventionSelectorTool': '.intervention_tool',
+    'AssessmentTool': '.assessment_tool',
+    'MasterResponderTool': '.master_responder_tool',
+    'TherapyTool': '.therapy_tool',
+    'ResourceTool': '.resource_tool',
+    'MemoryWriteTool': '.memory_write_tool',
+}
+
+
+def __getattr__(name):
+    if name in _TOOL_MODULES:
+        tool_class = getattr(import_module(_TOOL_MODULES[name], __name__), name)
+        globals()[name] = tool_class
+        return tool_class
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = [
     'BaseTool',
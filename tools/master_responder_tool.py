@@ -1,5 +1,6 @@
 from typing import Dict, Any
 from .base import BaseTool
+from llm_clients import extract_text
 
 class MasterResponderTool(BaseTool):
     def __init__(self, llm_client):
@@ -20,14 +21,7 @@ class MasterResponderTool(BaseTool):
         resp = self.llm.generate(prompt_context, max_tokens=150, temperature=0.7)
         
         # Handle different client response formats
-        text = ""
-        if isinstance(resp, dict):
-             if 'choices' in resp and resp['choices']:
-                text = resp['choices'][0]['message']['content']
-             elif 'candidates' in resp and resp['candidates']:
-                text = resp['candidates'][0]['content']['parts'][0]['text']
-        else:
-            text = str(resp)
+        text = extract_text(resp)
 
         return {
             "reply_text": text
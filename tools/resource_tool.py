@@ -1,5 +1,6 @@
 from typing import Dict, Any
 from .base import BaseTool
+from llm_clients import extract_text
 from knowledge_base import KnowledgeBase
 
 class ResourceTool(BaseTool):
@@ -9,7 +10,7 @@ class ResourceTool(BaseTool):
             description="Consult a resource expert for professional help options (uses RAG)"
         )
         self.llm = llm_client
-        self.knowledge_base = KnowledgeBase('resource')
+        self.knowledge_base = KnowledgeBase.shared('resource')
         self.system_prompt = """You are a mental health resource expert specializing in connecting people to professional help.
 Your expertise includes: types of mental health professionals, therapy modalities, insurance navigation,
 support groups, community resources, and treatment options.
@@ -38,12 +39,7 @@ Provide ONE brief insight (1-2 sentences max) based on your expertise.
         resp = self.llm.generate(prompt, max_tokens=100, temperature=0.7)
         
         # Extract text
-        text = str(resp)
-        if isinstance(resp, dict):
-             if 'choices' in resp and resp['choices']:
-                text = resp['choices'][0]['message']['content']
-             elif 'candidates' in resp and resp['candidates']:
-                text = resp['candidates'][0]['content']['parts'][0]['text']
+        text = extract_text(resp)
         
         return {
             "contribution": text,
@@ -1,5 +1,6 @@
 from typing import Dict, Any
 from .base import BaseTool
+from llm_clients import extract_text
 from knowledge_base import KnowledgeBase
 
 class TherapyTool(BaseTool):
@@ -9,7 +10,7 @@ class TherapyTool(BaseTool):
             description="Consult a therapy expert for coping strategies (uses RAG)"
         )
         self.llm = llm_client
-        self.knowledge_base = KnowledgeBase('therapy')
+        self.knowledge_base = KnowledgeBase.shared('therapy')
         self.system_prompt = """You are a supportive friend with expertise in coping strategies and mental wellness.
 Your role is to suggest helpful coping strategies in a friendly, accessible way.
 Share practical techniques people can try right away. Validate feelings and normalize struggles.
@@ -39,13 +40,8 @@ No lists, just the key point.
         # 3. Generate
         resp = self.llm.generate(prompt, max_tokens=100, temperature=0.7)
         
-        # Extract text (simplified helper)
-        text = str(resp)
-        if isinstance(resp, dict):
-             if 'choices' in resp and resp['choices']:
-                text = resp['choices'][0]['message']['content']
-             elif 'candidates' in resp and resp['candidates']:
-                text = resp['candidates'][0]['content']['parts'][0]['text']
+        # Extract text
+        text = extract_text(resp)
         
         return {
             "contribution": text,
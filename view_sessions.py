@@ -1,10 +1,15 @@
 """
 Session analyzer - View conversation history and assessment results.
 """
-import json
 import os
 from datetime import datetime
 
+from assessment_tracker import load_assessment_data
+from conversation_memory import load_session_data
+
+# Per-session side files in sessions/ that are not conversation sessions
+_SIDE_FILE_SUFFIXES = ('_assessment.json', '_mood.json', '.meta.json', 'learning_data.json')
+
 
 def list_sessions():
     """List all available sessions."""
@@ -13,9 +18,14 @@ def list_sessions():
         return []
     
     sessions = []
-    for file in os.listdir('sessions'):
-        if file.endswith('.json') and not file.endswith('_assessment.json'):
-            session_id = file.replace('.json', '')
+    for file in sorted(os.listdir('sessions')):
+        if file.endswith('.jsonl'):
+            session_id = file[:-len('.jsonl')]
+        elif file.endswith('.json') and not file.endswith(_SIDE_FILE_SUFFIXES):
+            session_id = file[:-len('.json')]  # Legacy single-file session
+        else:
+            continue
+        if session_id not in sessions:
             sessions.append(session_id)
     
     return sessions
@@ -23,17 +33,12 @@ def list_sessions():
 
 def view_session(session_id: str):
     """View detailed session information."""
-    session_file = f'sessions/{session_id}.json'
-    assessment_file = f'sessions/{session_id}_assessment.json'
-    
-    if not os.path.exists(session_file):
+    # Load session data
+    session_data = load_session_data(session_id, tail=10)
+    if session_data is None:
         print(f"Session {session_id} not found.")
         return
     
-    # Load session data
-    with open(session_file, 'r', encoding='utf-8') as f:
-        session_data = json.load(f)
-    
     print("=" * 80)
     print(f"SESSION: {session_id}")
     print("=" * 80)
@@ -53,17 +58,15 @@ def view_session(session_id: str):
     # Show recent messages
     print("RECENT MESSAGES")
     print("-" * 80)
-    messages = session_data['messages'][-10:]  # Last 10 messages
+    messages = session_data['messages']  # Last 10 messages
     for msg in messages:
         timestamp = datetime.fromisoformat(msg['timestamp']).strftime("%H:%M:%S")
         print(f"\n[{timestamp}] {msg['role']}:")
         print(f"{msg['content'][:200]}{'...' if len(msg['content']) > 200 else ''}")
     
     # Load assessment data if available
-    if os.path.exists(assessment_file):
-        with open(assessment_file, 'r', encoding='utf-8') as f:
-            assessment_data = json.load(f)
-        
+    assessment_data = load_assessment_data(session_id)
+    if assessment_data is not None:
         print("\n" + "=" * 80)
         print("PSYCHOLOGICAL ASSESSMENT")
         print("=" * 80)
@@ -81,7 +84,8 @@ def view_session(session_id: str):
         responses = assessment_data.get('responses', {})
         if responses:
             print(f"\nSymptoms Detected: {', '.join(responses.keys())}")
-            print(f"Total Symptom Mentions: {sum(len(v) for v in responses.values())}")
+            mentions = sum(v['count'] for v in responses.values())
+            print(f"Total Symptom Mentions: {mentions}")
     
     print("\n" + "=" * 80)
 